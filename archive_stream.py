@@ -0,0 +1,172 @@
+import os
+import math
+import gzip
+import shutil
+import tarfile
+import threading
+import concurrent.futures
+import oci
+
+MEBIBYTE = 1024 * 1024
+PART_SIZE = 128 * MEBIBYTE
+MAX_PARTS = 10000
+PARALLEL_PARTS = 4
+MAX_BUFFERED_PARTS = 2
+# Parts held in memory at once (uploading, queued and the one being filled)
+# never take more than this; enough for the ~1 GiB parts of a 10 TiB stream
+# (the largest object) with one part uploading and one being filled
+MEMORY_BUDGET = 3 * 1024 * MEBIBYTE
+READ_SIZE = 4 * MEBIBYTE
+
+
+# (part size, parallel parts, buffered parts) for a stream of at most
+# expected_size bytes. Parts are PART_SIZE, or larger when the stream would
+# not fit in MAX_PARTS parts. When the parts in memory would exceed
+# memory_budget, fewer parts are queued and then fewer uploaded at once, down
+# to one; a stream that does not fit even then is refused. Without
+# expected_size the stream is limited to MAX_PARTS parts of PART_SIZE, or
+# less if the budget cannot hold two of those.
+def stream_layout(expected_size=None, parallel_parts=PARALLEL_PARTS, max_buffered_parts=MAX_BUFFERED_PARTS,
+                  memory_budget=MEMORY_BUDGET):
+    part_size = max(PART_SIZE, math.ceil((expected_size or 0) / MAX_PARTS / MEBIBYTE) * MEBIBYTE)
+    if not expected_size:
+        part_size = min(part_size, memory_budget // 2 // MEBIBYTE * MEBIBYTE)
+    while part_size * (parallel_parts + max_buffered_parts + 1) > memory_budget:
+        if max_buffered_parts:
+            max_buffered_parts -= 1
+        elif parallel_parts > 1:
+            parallel_parts -= 1
+        else:
+            raise ValueError(f"A stream of {expected_size} bytes needs parts of {part_size} bytes, "
+                             f"more than a memory budget of {memory_budget} bytes allows")
+    return part_size, parallel_parts, max_buffered_parts
+
+
+# Writable stream that is uploaded to Object Storage as it is written: every
+# full part is sent as a multipart upload part from a small thread pool while
+# the writer carries on. At most parallel_parts + max_buffered_parts parts are
+# held in memory besides the one being filled; write() blocks when they are
+# all taken. The part size and parallelism are fixed up front from
+# expected_size (see stream_layout). close() sends the last part and commits the upload; on
+# error the upload is aborted.
+class MultipartStreamUpload:
+    def __init__(self, object_storage, namespace, bucket_name, object_name, expected_size=None, part_size=None,
+                 parallel_parts=PARALLEL_PARTS, max_buffered_parts=MAX_BUFFERED_PARTS, memory_budget=MEMORY_BUDGET):
+        self.object_storage = object_storage
+        self.namespace = namespace
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        if part_size is None:
+            part_size, parallel_parts, max_buffered_parts = stream_layout(expected_size, parallel_parts, max_buffered_parts,
+                                                                          memory_budget)
+        self.part_size = part_size
+        self.bytes = 0
+        self.upload_id = object_storage.create_multipart_upload(
+            namespace, bucket_name,
+            oci.object_storage.models.CreateMultipartUploadDetails(object=object_name)).data.upload_id
+        self._buffer = bytearray()
+        self._part_num = 0
+        self._etags = {}
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(parallel_parts + max_buffered_parts)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=parallel_parts, thread_name_prefix="part-upload")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _submit(self, data):
+        if self._part_num >= MAX_PARTS:
+            raise ValueError(f"{self.object_name} needs more than {MAX_PARTS} parts")
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+        self._slots.acquire()
+        self._part_num += 1
+        self._futures.append(self._executor.submit(self._upload_part, self._part_num, data))
+
+    def _upload_part(self, part_num, data):
+        try:
+            response = self.object_storage.upload_part(self.namespace, self.bucket_name, self.object_name,
+                                                       self.upload_id, part_num, data)
+            self._etags[part_num] = response.headers["etag"]
+        finally:
+            self._slots.release()
+
+    def close(self):
+        try:
+            if self._buffer or not self._part_num:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            for future in self._futures:
+                future.result()
+            self.object_storage.commit_multipart_upload(
+                self.namespace, self.bucket_name, self.object_name, self.upload_id,
+                oci.object_storage.models.CommitMultipartUploadDetails(parts_to_commit=[
+                    oci.object_storage.models.CommitMultipartUploadPartDetails(part_num=part_num, etag=etag)
+                    for part_num, etag in sorted(self._etags.items())]))
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+
+    def abort(self):
+        self._executor.shutdown(cancel_futures=True)
+        try:
+            self.object_storage.abort_multipart_upload(self.namespace, self.bucket_name, self.object_name, self.upload_id)
+        except oci.exceptions.ServiceError as e:
+            print(f"Failed to abort multipart upload of {self.object_name}: {e.message}")
+
+
+# Upload everything read from reader (a file, pipe or SSH channel) as one
+# object without staging it on disk; returns the number of bytes uploaded.
+# check() runs once the stream has ended and before the upload is committed:
+# it should raise if whatever produced the stream failed (e.g. a remote
+# command's exit status), and the upload is then aborted instead of leaving
+# a truncated object.
+def upload_stream(object_storage, namespace, bucket_name, object_name, reader, check=None, **kwargs):
+    with MultipartStreamUpload(object_storage, namespace, bucket_name, object_name, **kwargs) as upload:
+        while True:
+            data = reader.read(READ_SIZE)
+            if not data:
+                break
+            upload.write(data)
+        if check:
+            check()
+    return upload.bytes
+
+
+# Walk directory and upload it as a gzipped tar archive in one pipeline:
+# walk, archive, compress and upload run together with bounded buffers, so
+# the first part goes up while the walk is still running and no local disk
+# space is needed. The space used on the directory's filesystem bounds the
+# archive size the part size is chosen for. Returns the number of compressed
+# bytes uploaded.
+def upload_directory_archive(object_storage, namespace, bucket_name, object_name, directory, compresslevel=1, **kwargs):
+    usage = shutil.disk_usage(directory)
+    kwargs.setdefault("expected_size", usage.total - usage.free)
+    with MultipartStreamUpload(object_storage, namespace, bucket_name, object_name, **kwargs) as upload:
+        with gzip.GzipFile(fileobj=upload, mode="wb", compresslevel=compresslevel) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w|") as archive:
+                for root, dirs, files in os.walk(directory):
+                    for name in dirs + files:
+                        path = os.path.join(root, name)
+                        archive.add(path, arcname=os.path.relpath(path, directory), recursive=False)
+    return upload.bytes
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_API_CALLS = 16
+_END_OF_STREAM = object()
+
+
+# asyncio orchestration engine. Instance workflows are coroutines, so
+# thousands of them can be in flight while waiting; only the blocking OCI SDK
+# calls go through a small thread pool, which bounds the number of real API
+# calls in flight. Lifecycle waits are Futures from LifecycleWaiter and do
+# not hold a thread at all. With a RateLimiter, SDK client methods are called
+# under their operation's limit.
+class AsyncEngine:
+    def __init__(self, max_api_calls=DEFAULT_MAX_API_CALLS, limiter=None):
+        self.max_api_calls = max_api_calls
+        self.limiter = limiter
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_api_calls, thread_name_prefix="oci-api")
+
+    # Run a blocking SDK call (or any short blocking function) in the API executor
+    async def call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self.limiter and hasattr(getattr(func, "__self__", None), "base_client"):
+            return await loop.run_in_executor(self.executor, lambda: self.limiter.call(func, *args, **kwargs))
+        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+    # Await a concurrent.futures.Future, e.g. one returned by LifecycleWaiter.wait_for
+    async def wait(self, future):
+        return await asyncio.wrap_future(future)
+
+    # Turn a blocking generator (e.g. a paginated list call) into an async stream,
+    # fetching one item at a time in the executor
+    async def stream(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            item = await self.call(next, iterator, _END_OF_STREAM)
+            if item is _END_OF_STREAM:
+                return
+            yield item
+
+    # Start one workflow per item as items stream in and wait for all of them.
+    # Returns the exceptions raised by workflows that failed.
+    async def run(self, items, workflow):
+        tasks = []
+        async for item in self.stream(items):
+            tasks.append(asyncio.create_task(workflow(item)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [result for result in results if isinstance(result, BaseException)]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+# Run a command over an open paramiko SSHClient without holding a thread while
+# it runs: the channel is polled from the event loop and its output drained.
+async def ssh_exec(ssh, command, poll_interval=5):
+    channel = ssh.get_transport().open_session()
+    channel.exec_command(command)
+    stdout, stderr = [], []
+    while True:
+        while channel.recv_ready():
+            stdout.append(channel.recv(65536))
+        while channel.recv_stderr_ready():
+            stderr.append(channel.recv_stderr(65536))
+        if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+            break
+        await asyncio.sleep(poll_interval)
+    exit_status = channel.recv_exit_status()
+    channel.close()
+    return exit_status, b"".join(stdout).decode(), b"".join(stderr).decode()
@@ -1,46 +1,45 @@
 import subprocess
 import os
+import time
 import oci
 import sys
-from datetime import datetime, timezone
-import random
-from oci.loggingingestion import LoggingClient, models
+from oci.loggingingestion import LoggingClient
+from log_sink import LogSink
+from metrics import Metrics
+from upload_engine import UploadEngine
+from rate_limiter import RateLimiter, retry_strategy_without_throttles
+from segment_packer import SegmentPacker
+from chunk_store import ChunkStore
+from detect_block_changes import get_file_metadata, find_modified_files, find_deleted_files
+from snapshot_manifest import build_manifest, load_latest_manifest, save_manifest, needs_full_verify
+
+# Object Storage calls per second and in flight the worker starts from, per operation
+WORKER_API_RATE = 100
+WORKER_API_CONCURRENCY = 64
 
 # Global declarations
 signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-object_storage = oci.object_storage.ObjectStorageClient(config={}, signer=signer)
+# 429s are left to the limiter, which backs off for the whole process instead of each upload thread retrying on its own
+object_storage = oci.object_storage.ObjectStorageClient(config={}, signer=signer, retry_strategy=retry_strategy_without_throttles())
+limiter = RateLimiter(default_rate=WORKER_API_RATE, concurrency=WORKER_API_CONCURRENCY)
 logging_client = LoggingClient(config={}, signer=signer)
 
-# Global log_id (it will be initialized later)
-log_id = None
+# Global log sink (it will be initialized later with the log_id)
+log_sink = None
 
-# Function to send logs to OCI Logging service
-def send_log_to_oci(level, message):
-    global log_id  # Use the global log_id
-    log_entry = oci.loggingingestion.models.LogEntry(
-        data=f"{level}: {message}",
-        id=f"ID-{random.randint(100000, 999999)}",
-        time=datetime.now(timezone.utc).isoformat()
-    )
-    log_details = oci.loggingingestion.models.PutLogsDetails(
-        specversion="1.0",
-        log_entry_batches=[
-            oci.loggingingestion.models.LogEntryBatch(
-                entries=[log_entry],
-                source="python-script",
-                type="CUSTOM",
-                subject="block-volume-management"
-            )
-        ]
-    )
+# Incremental exports hash every file again once the chain has not been fully verified for this many days
+FULL_VERIFY_DAYS = 30
 
-    try:
-        logging_client.put_logs(
-            log_id=log_id,
-            put_logs_details=log_details
-        )
-    except oci.exceptions.ServiceError as e:
-        print(f"Failed to send log: {e}")
+# Upload metrics, written next to the script when the run ends
+METRICS_DIR = "/home/opc/metrics"
+metrics = Metrics()
+
+# Function to send logs to OCI Logging service; entries are batched and sent in the background
+def send_log_to_oci(level, message):
+    if log_sink is None:
+        print(f"{level}: {message}")
+        return
+    log_sink.log(level, message)
 
 # Function to run shell commands and capture output
 def run_command(command):
@@ -89,17 +88,36 @@ def mount_volume(device, mount_point, fs_type):
     result = run_command(command)
     if result is None:
         send_log_to_oci("ERROR", f"Failed to mount /dev/{device} to {mount_point}")
+        # Scanning the empty mount point would export the volume as if all its files were deleted
+        raise RuntimeError(f"Failed to mount /dev/{device} to {mount_point}")
+    send_log_to_oci("INFO", f"Mounted /dev/{device} to {mount_point}")
+
+# Function to unmount block volume so it can be detached from a pooled worker
+def unmount_volume(mount_point):
+    result = run_command(f"umount {mount_point}")
+    if result is None:
+        send_log_to_oci("ERROR", f"Failed to unmount {mount_point}")
     else:
-        send_log_to_oci("INFO", f"Mounted /dev/{device} to {mount_point}")
+        send_log_to_oci("INFO", f"Unmounted {mount_point}")
+
+# Function called by the upload engine for every uploaded object (a large file, a segment of small files or an index)
+def file_uploaded(file_path, object_name, file_size, seconds):
+    metrics.stage_finished("file_upload", seconds)
+    metrics.inc("uploaded_bytes_total", file_size)
+    send_log_to_oci("INFO", f"Uploaded {file_path or 'packed segment'} to {object_name}")
 
-# Function to upload file to OCI Object Storage
-def upload_file_to_object_storage(object_storage, namespace, bucket_name, object_name, file_path):
-    with open(file_path, 'rb') as file:
-        object_storage.put_object(namespace, bucket_name, object_name, file)
-    send_log_to_oci("INFO", f"Uploaded file: {file_path} to {object_name}")
+# Function called by the upload engine for every file that could not be uploaded
+def file_upload_failed(file_path, object_name, error):
+    metrics.inc("stages_total", stage="file_upload", outcome="failed")
+    send_log_to_oci("ERROR", f"Failed to upload file: {file_path} to {object_name}: {error}")
 
-# Main function to discover and mount block volumes, then upload files to OCI Object Storage
-def mount_and_upload_volumes(bucket_name, instance_name):
+# Main function to discover and mount block volumes, then upload files to OCI Object Storage.
+# When device is given (e.g. /dev/oracleoci/oraclevdb) only that volume is exported, and
+# volume_id (the source volume OCID) names its objects: device paths are reused on pooled
+# workers, so two volumes of one instance can show up under the same device name.
+# incremental uploads only the files new or changed since the last manifest of volume_id.
+def mount_and_upload_volumes(bucket_name, instance_name, device=None, volume_id=None, incremental=False,
+                             verify_days=FULL_VERIFY_DAYS):
     # Get the root volume
     root_volume = get_root_volume()
     if not root_volume:
@@ -112,6 +130,9 @@ def mount_and_upload_volumes(bucket_name, instance_name):
 
     # Get list of attached block volumes excluding the root volume
     volumes = get_attached_volumes(root_volume)
+    if device:
+        device_name = os.path.basename(os.path.realpath(device))
+        volumes = [volume for volume in volumes if volume == device_name]
     if not volumes:
         send_log_to_oci("INFO", "No block volumes attached.")
         return
@@ -123,6 +144,15 @@ def mount_and_upload_volumes(bucket_name, instance_name):
         send_log_to_oci("INFO", volume_info)
 
     namespace = object_storage.get_namespace().data  # Get the Object Storage namespace
+    upload_started = time.monotonic()
+    # Files are uploaded concurrently, large ones as parallel multipart uploads
+    upload_engine = UploadEngine(object_storage, namespace, bucket_name,
+                                 on_uploaded=file_uploaded, on_failed=file_upload_failed, limiter=limiter)
+    # Large files are split into content-defined chunks; only chunks not yet in the bucket are uploaded
+    chunk_store = ChunkStore(upload_engine)
+    uploaded_files = 0
+    uploaded_bytes = 0
+    unmounted_volumes = []
 
     for volume in volumes:
         # Get the filesystem type
@@ -136,21 +166,92 @@ def mount_and_upload_volumes(bucket_name, instance_name):
         # Define the mount point as /mnt/<volume_name>
         mount_point = f"/mnt/{volume}"
 
-        # Mount the volume
-        mount_volume(volume, mount_point, fs_type)
+        # Mount the volume; one that fails to mount is skipped and fails the run, and gets no manifest
+        try:
+            mount_volume(volume, mount_point, fs_type)
+        except RuntimeError:
+            unmounted_volumes.append(volume)
+            continue
+        volume_started = time.monotonic()
+        try:
+            # Loop over each file in the volume; small files are packed into segments
+            # listed in <instance_name>/<volume OCID>/index.jsonl.gz, large ones uploaded as they are
+            prefix = f"{instance_name}/{volume_id or volume}"
+            send_log_to_oci("INFO", f"Chunk index of {volume} lists {chunk_store.load(volume_id or prefix)} chunks")
+            packer = SegmentPacker(upload_engine, prefix, chunk_store=chunk_store)
+            manifest = None
+            if incremental and volume_id:
+                # The previous manifest is the baseline; the new one links to it and records deletions
+                previous = load_latest_manifest(object_storage, namespace, bucket_name, volume_id)
+                previous_metadata = previous["files"] if previous else {}
+                # Only files whose size, mtime, inode or ctime changed are hashed, unless the chain is due a full verify
+                verify = needs_full_verify(previous, verify_days)
+                scan_started = time.monotonic()
+                baseline = {os.path.join(mount_point, path): data for path, data in previous_metadata.items()}
+                file_metadata = get_file_metadata(mount_point, ignore_extensions=[], ignore_folders=[], verify=verify,
+                                                  baseline=baseline)[0]
+                current_metadata = {os.path.relpath(file_path, mount_point): data for file_path, data in file_metadata.items()}
+                metrics.stage_finished("change_scan", time.monotonic() - scan_started)
+                send_log_to_oci("INFO", f"Scanned {len(current_metadata)} files on {volume}{' with full verify' if verify else ''} "
+                                        f"in {time.monotonic() - scan_started:.1f}s")
+                modified_files = find_modified_files(previous_metadata, current_metadata)
+                deleted_files = find_deleted_files(previous_metadata, current_metadata)
+                for path in modified_files:
+                    packer.add(os.path.join(mount_point, path), path)
+                manifest = build_manifest(prefix, previous, current_metadata, modified_files, deleted_files, verified=verify)
+                send_log_to_oci("INFO", f"{len(modified_files)} new or changed files and {len(deleted_files)} deleted files "
+                                        f"on {volume} since {manifest['previous']}")
+            else:
+                for root, dirs, files in os.walk(mount_point):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        packer.add(file_path, os.path.relpath(file_path, mount_point))
+            packer.close()
+
+            # Wait for all of the volume's files to be up before it is unmounted
+            upload_engine.wait()
+            chunk_store.save(volume_id or prefix)
+            # A manifest is only published for a complete snapshot, so a failed run is never used as a baseline
+            if manifest and not upload_engine.failures:
+                save_manifest(object_storage, namespace, bucket_name, manifest, volume_id)
+            uploaded_files += packer.files
+            uploaded_bytes += packer.bytes
+            metrics.inc("uploaded_files_total", packer.files)
+            send_log_to_oci("INFO", f"Uploaded {packer.files} files of {volume}, {packer.segments} segments")
+        finally:
+            # Unmount the volume even if its upload failed, the worker stays up for the next volume
+            unmount_volume(mount_point)
+        metrics.stage_finished("volume_upload", time.monotonic() - volume_started)
+
+    upload_engine.close()
+    send_log_to_oci("INFO", f"Upload concurrency settled at {upload_engine.concurrency} files")
+    send_log_to_oci("INFO", f"Chunked {chunk_store.bytes} bytes into {chunk_store.chunks} chunks, "
+                            f"{chunk_store.new_chunks} of them ({chunk_store.new_bytes} bytes) not yet in their volume's chunk index")
 
-        # Loop over each file in the volume
-        for root, dirs, files in os.walk(mount_point):
-            for file in files:
-                file_path = os.path.join(root, file)
-                object_name = os.path.relpath(file_path, mount_point)
-                object_name = f"{instance_name}/{volume}/{object_name}"
-                send_log_to_oci("INFO", f"Uploading file: {file_path} to {object_name}")
-                upload_file_to_object_storage(object_storage, namespace, bucket_name, object_name, file_path)
+    # Summary line read by the orchestrator to learn the worker's throughput
+    print(f"UPLOAD SUMMARY files={uploaded_files} bytes={uploaded_bytes} seconds={time.monotonic() - upload_started:.1f} "
+          f"new_chunk_bytes={chunk_store.new_bytes}")
+    if unmounted_volumes:
+        raise RuntimeError(f"Volumes {', '.join(unmounted_volumes)} could not be mounted")
+    if upload_engine.failures:
+        raise RuntimeError(f"{len(upload_engine.failures)} files could not be uploaded")
 
 if __name__ == "__main__":
 
     bucket_name = sys.argv[1]
     instance_name = sys.argv[2]
     log_id = sys.argv[3]  # Assign log_id from command line arguments
-    mount_and_upload_volumes(bucket_name, instance_name)
+    device = sys.argv[4] if len(sys.argv) > 4 else None
+    volume_id = sys.argv[5] if len(sys.argv) > 5 else None
+    incremental = len(sys.argv) > 6 and sys.argv[6] == "incremental"
+    verify_days = int(sys.argv[7]) if len(sys.argv) > 7 else FULL_VERIFY_DAYS
+    log_sink = LogSink(logging_client, log_id, source="python-script", subject="block-volume-management")
+    # One textfile per exported volume, labelled so files from several runs on a pooled worker don't clash
+    device_name = os.path.basename(device) if device else "all"
+    metrics.labels = {"instance": instance_name, "device": device_name, "volume": volume_id or device_name}
+    metrics.textfile_path = f"{METRICS_DIR}/backup_upload_{instance_name}_{volume_id or device_name}.prom"
+    try:
+        mount_and_upload_volumes(bucket_name, instance_name, device, volume_id, incremental, verify_days)
+    finally:
+        metrics.close()
+        log_sink.close()
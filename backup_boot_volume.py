@@ -1,9 +1,20 @@
 import oci
 import os
-import time
 import logging
+import json
 from datetime import datetime
-import concurrent.futures
+import asyncio
+from lifecycle_waiter import LifecycleWaiter
+from polling_policy import PollingPolicy
+from async_engine import AsyncEngine
+from worker_scheduler import WorkerScheduler
+from worker_shape import WorkerShapeSelector
+from backup_catalog import BackupCatalog
+from inventory import Inventory
+from discovery import discovery_from_config
+from oci_clients import OciClientFactory
+from rate_limiter import RateLimiter, retry_strategy_without_throttles
+from metrics import Metrics
 
 current_datetime = datetime.now()
 datetime_string = current_datetime.strftime("%Y-%m-%d-%H-%M-%S")
@@ -26,13 +37,27 @@ console_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
-config = oci.config.from_file()
+# Worker concurrency limits (workerinfo), backup chain settings (backupinfo)
+# and API rate limits (ratelimitinfo) from configuration.json next to this script
+# (CRA_CONFIG_PATH overrides its location)
+config_path = os.environ.get('CRA_CONFIG_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configuration.json')
+with open(config_path, 'r') as config_file:
+    config_data = json.load(config_file)
 
-# Initialize OCI clients
+# Initialize OCI clients. Throttled calls are retried by the rate limiter, not the SDK.
 try:
-    compute_client = oci.core.ComputeClient(config)
-    blockstorage_client = oci.core.BlockstorageClient(config)
-    object_storage_client = oci.object_storage.ObjectStorageClient(config)
+    metrics = Metrics.from_config(config_data.get('metricsinfo'))
+    limiter = RateLimiter.from_config(config_data.get('ratelimitinfo'), metrics=metrics)
+    engine = AsyncEngine(limiter=limiter)
+    clients = OciClientFactory.from_file(pool_size=engine.max_api_calls + 2, retry_strategy=retry_strategy_without_throttles())
+    compute_client = clients.client(oci.core.ComputeClient)
+    blockstorage_client = clients.client(oci.core.BlockstorageClient)
+    object_storage_client = clients.client(oci.object_storage.ObjectStorageClient)
+    identity_client = clients.client(oci.identity.IdentityClient)
+    search_client = clients.client(oci.resource_search.ResourceSearchClient)
+    waiter = LifecycleWaiter(compute_client, blockstorage_client, policy=PollingPolicy(), limiter=limiter, metrics=metrics)
+    inventory = Inventory(compute_client, object_storage_client=object_storage_client, limiter=limiter)
+    waiter.add_listener(inventory.on_lifecycle_event)
     logger.info("OCI clients initialized successfully.")
 except Exception as e:
     logger.error(f"Failed to initialize OCI clients: {str(e)}")
@@ -48,20 +73,27 @@ temp_instance_subnet_ocid = "ocid1.subnet.oc1.iad.aaaaaaaavbogtxo5uxelricigx4jm6
 tag_key = 'CRA-Backup'
 tag_value = 'True'
 
-def list_instances_by_tag(compartment_id, tag_key, tag_value):
+workerinfo = config_data['workerinfo']
+catalog = BackupCatalog.from_backupinfo(config_data.get('backupinfo'))
+scheduler = WorkerScheduler.from_workerinfo(workerinfo)
+# The image-export instance uploads nothing itself, so it gets the baseline shape
+shape_selector = WorkerShapeSelector.from_workerinfo(workerinfo)
+discovery = discovery_from_config(config_data, search_client, identity_client, inventory, tag_key, tag_value)
+
+# Instances are yielded as discovery finds them across the configured
+# compartment subtrees, so workflows can start before it has finished
+def list_instances_by_tag():
     try:
-        instances = compute_client.list_instances(compartment_id).data
-        filtered_instances = [instance for instance in instances 
-                              if tag_key in instance.freeform_tags and 
-                              instance.freeform_tags[tag_key] == tag_value and 
-                              instance.lifecycle_state != 'TERMINATED']
-        logger.info(f"Found {len(filtered_instances)} instances with tag {tag_key}: {tag_value}")
-        return filtered_instances
+        found = 0
+        for instance in discovery.discover():
+            found += 1
+            yield instance
+        logger.info(f"Found {found} instances with tag {tag_key}: {tag_value}")
     except Exception as e:
         logger.error(f"Error listing instances by tag: {str(e)}")
         raise
 
-def process_instance(instance):
+async def process_instance(instance):
     try:
         logger.info(f"Processing instance {instance.display_name} (OCID: {instance.id})")        
         boot_volume_backup_name = instance.display_name + '_' + datetime_string
@@ -72,145 +104,141 @@ def process_instance(instance):
 
         # Step 1: Create a Boot Volume Backup
         availability_domain = instance.availability_domain
-        boot_volume_info = compute_client.list_boot_volume_attachments(
-            availability_domain, instance.compartment_id, instance_id=instance.id).data
+        boot_volume_info = await engine.call(
+            inventory.boot_volume_attachments, instance.compartment_id, availability_domain, instance.id)
         boot_volume_id = boot_volume_info[0].boot_volume_id
+        boot_volume_size = (await engine.call(blockstorage_client.get_boot_volume, boot_volume_id)).data.size_in_gbs
+        backup_type = catalog.backup_type(boot_volume_id)
 
-        boot_volume_backup_response = blockstorage_client.create_boot_volume_backup(
+        boot_volume_backup_response = (await engine.call(
+            blockstorage_client.create_boot_volume_backup,
             create_boot_volume_backup_details=oci.core.models.CreateBootVolumeBackupDetails(
                 boot_volume_id=boot_volume_id,
                 display_name=boot_volume_backup_name,
                 freeform_tags={'cra_boot_volume_backup': 'True'},
-                type="FULL")).data
+                type=backup_type))).data
 
-        logger.info(f"Boot volume backup created. Backup OCID: {boot_volume_backup_response.id}")
+        logger.info(f"Boot volume backup created ({backup_type}). Backup OCID: {boot_volume_backup_response.id}")
 
         # Wait for backup to complete
-        while True:
-            backup_status = blockstorage_client.get_boot_volume_backup(boot_volume_backup_response.id).data.lifecycle_state
-            logger.info(f"Waiting for Boot volume backup to become available...{boot_volume_backup_name}")
-            if backup_status == "AVAILABLE":
-                break
-            time.sleep(15)
+        logger.info(f"Waiting for Boot volume backup to become available...{boot_volume_backup_name}, ETA: {waiter.eta('boot_volume_backup', boot_volume_size)}")
+        await engine.wait(waiter.wait_for("boot_volume_backup", boot_volume_backup_response.id, "AVAILABLE", instance.compartment_id,
+                                          stage="boot_volume_backup", size_in_gbs=boot_volume_size))
 
         logger.info(f"Boot volume backup completed successfully.{boot_volume_backup_name},{boot_volume_backup_response.id}")
+        # Only incremental mode keeps chains; in full mode boot volume backups are never deleted here
+        if catalog.incremental:
+            for expired_backup_id in catalog.record(boot_volume_id, boot_volume_backup_response.id, backup_type):
+                await engine.call(blockstorage_client.delete_boot_volume_backup, expired_backup_id)
+                logger.info(f"Deleted boot volume backup {expired_backup_id} from an expired chain.")
 
         # Step 2: Restore the Boot Volume Backup
-        restored_volume = blockstorage_client.create_boot_volume(
+        restored_volume = (await engine.call(
+            blockstorage_client.create_boot_volume,
             create_boot_volume_details=oci.core.models.CreateBootVolumeDetails(
                 compartment_id=compartment_id,
                 source_details=oci.core.models.BootVolumeSourceFromBootVolumeReplicaDetails(
                     type="bootVolumeBackup",
                     id=boot_volume_backup_response.id),
                 availability_domain=availability_domain,
-                display_name=restored_volume_name)).data
+                display_name=restored_volume_name))).data
 
         logger.info(f"Restored volume from backup. Volume OCID: {restored_volume_name},{restored_volume.id}")
 
-        while True:
-            volume_status = blockstorage_client.get_boot_volume(restored_volume.id).data.lifecycle_state
-            if volume_status == "AVAILABLE":
-                break
-            logger.info(f"Waiting for volume to become available...{restored_volume_name}")
-            time.sleep(10)
+        logger.info(f"Waiting for volume to become available...{restored_volume_name}, ETA: {waiter.eta('boot_volume_restore', boot_volume_size)}")
+        await engine.wait(waiter.wait_for("boot_volume", restored_volume.id, "AVAILABLE", compartment_id,
+                                          stage="boot_volume_restore", size_in_gbs=boot_volume_size))
 
         logger.info(f"Volume restored successfully.{restored_volume_name}")
 
-        # Step 3: Launch temporary instance and create custom image
-        instance_details = oci.core.models.LaunchInstanceDetails(
-            compartment_id=compartment_id,
-            availability_domain=availability_domain,
-            display_name=temporary_instance_name,
-            shape="VM.Standard.E4.Flex",
-            shape_config=oci.core.models.LaunchInstanceShapeConfigDetails(
-                ocpus=2, memory_in_gbs=10),
-            create_vnic_details=oci.core.models.CreateVnicDetails(
-                assign_public_ip=False,
-                subnet_id=temp_instance_subnet_ocid),
-            source_details=oci.core.models.InstanceSourceViaBootVolumeDetails(
-                boot_volume_id=restored_volume.id)
-        )
-        temp_instance = compute_client.launch_instance(instance_details).data
-
-        logger.info(f"Temporary instance launched. Instance OCID: {temporary_instance_name},{temp_instance.id}")
-
-        while True:
-            instance_status = compute_client.get_instance(temp_instance.id).data.lifecycle_state
-            if instance_status == "RUNNING":
-                break
-            logger.info(f"Waiting for instance to become available...{temporary_instance_name}")
-            time.sleep(15)
-
-        logger.info(f"Temporary instance {temporary_instance_name} is running.")
-
-        # Step 4: Create a custom image from the instance
-        image_details = oci.core.models.CreateImageDetails(
-            compartment_id=compartment_id,
-            instance_id=temp_instance.id,
-            display_name=custom_image_name
-        )
-        custom_image = compute_client.create_image(image_details).data
-
-        logger.info(f"Custom image - {custom_image_name} created. Image OCID: {custom_image.id}")
-
-        while True:
-            image_status = compute_client.get_image(custom_image.id).data.lifecycle_state
-            if image_status == "AVAILABLE":
-                break
-            logger.info(f"Waiting for custom image - {custom_image_name} to become available...")
-            time.sleep(20)
-
-        logger.info(f"Custom image - {custom_image_name} created successfully.")
-
-        # Step 5: Export the custom image to Object Storage
-        export_details = compute_client.export_image(
-            image_id=custom_image.id,
-            export_image_details=oci.core.models.ExportImageViaObjectStorageTupleDetails(
-                destination_type="objectStorageTuple",
-                namespace_name=os_namespace,
-                bucket_name=bucket_name,
-                object_name=object_name
+        # Step 3: Launch temporary instance and create custom image, once a worker slot is free
+        await scheduler.acquire_worker()
+        try:
+            instance_details = oci.core.models.LaunchInstanceDetails(
+                compartment_id=compartment_id,
+                availability_domain=availability_domain,
+                display_name=temporary_instance_name,
+                shape=shape_selector.shape,
+                shape_config=shape_selector.select(),
+                create_vnic_details=oci.core.models.CreateVnicDetails(
+                    assign_public_ip=False,
+                    subnet_id=temp_instance_subnet_ocid),
+                source_details=oci.core.models.InstanceSourceViaBootVolumeDetails(
+                    boot_volume_id=restored_volume.id)
+            )
+            temp_instance = (await engine.call(compute_client.launch_instance, instance_details)).data
+
+            logger.info(f"Temporary instance launched. Instance OCID: {temporary_instance_name},{temp_instance.id}")
+
+            logger.info(f"Waiting for instance to become available...{temporary_instance_name}, ETA: {waiter.eta('instance_launch')}")
+            await engine.wait(waiter.wait_for("instance", temp_instance.id, "RUNNING", compartment_id, stage="instance_launch"))
+
+            logger.info(f"Temporary instance {temporary_instance_name} is running.")
+
+            # Step 4: Create a custom image from the instance
+            image_details = oci.core.models.CreateImageDetails(
+                compartment_id=compartment_id,
+                instance_id=temp_instance.id,
+                display_name=custom_image_name
+            )
+            custom_image = (await engine.call(compute_client.create_image, image_details)).data
+
+            logger.info(f"Custom image - {custom_image_name} created. Image OCID: {custom_image.id}")
+
+            logger.info(f"Waiting for custom image - {custom_image_name} to become available..., ETA: {waiter.eta('image_create', boot_volume_size)}")
+            await engine.wait(waiter.wait_for("image", custom_image.id, "AVAILABLE", compartment_id,
+                                              stage="image_create", size_in_gbs=boot_volume_size))
+
+            logger.info(f"Custom image - {custom_image_name} created successfully.")
+
+            # Step 5: Export the custom image to Object Storage
+            export_details = await engine.call(
+                compute_client.export_image,
+                image_id=custom_image.id,
+                export_image_details=oci.core.models.ExportImageViaObjectStorageTupleDetails(
+                    destination_type="objectStorageTuple",
+                    namespace_name=os_namespace,
+                    bucket_name=bucket_name,
+                    object_name=object_name
+                )
             )
-        )
-        logger.info(f"Exporting image to Object Storage... Bucket: {bucket_name}, Object: {object_name}")
-
-        while True:
-            image_export_status = compute_client.get_image(custom_image.id).data.lifecycle_state
-            if image_export_status == "AVAILABLE":
-                break
-            logger.info(f"Waiting for image - {object_name} export to complete...")
-            time.sleep(30)
-
-        logger.info("Image - {object_name} exported to Object Storage successfully.")
-
-        # Cleanup: Terminate the temporary instance and delete the restored volume
-        compute_client.terminate_instance(temp_instance.id, preserve_boot_volume=False)
-        logger.info(f"Terminating temporary instance... Instance OCID: {temp_instance.id}")
-
-        while True:
-            instance = compute_client.get_instance(temp_instance.id).data
-            if instance.lifecycle_state == 'TERMINATED':
-                logger.info(f"Temporary instance {temporary_instance_name} terminated.")
-                break
-            logger.info(f"Current state: {instance.lifecycle_state}. Waiting for termination...")
-            time.sleep(10)
-
-        blockstorage_client.delete_boot_volume(restored_volume.id)
+            logger.info(f"Exporting image to Object Storage... Bucket: {bucket_name}, Object: {object_name}")
+
+            logger.info(f"Waiting for image - {object_name} export to complete..., ETA: {waiter.eta('image_export', boot_volume_size)}")
+            await engine.wait(waiter.wait_for("image", custom_image.id, "AVAILABLE", compartment_id,
+                                              stage="image_export", size_in_gbs=boot_volume_size))
+
+            logger.info("Image - {object_name} exported to Object Storage successfully.")
+
+            # Cleanup: Terminate the temporary instance and delete the restored volume
+            await engine.call(compute_client.terminate_instance, temp_instance.id, preserve_boot_volume=False)
+            logger.info(f"Terminating temporary instance... Instance OCID: {temp_instance.id}")
+
+            await engine.wait(waiter.wait_for("instance", temp_instance.id, "TERMINATED", compartment_id, stage="instance_terminate"))
+            logger.info(f"Temporary instance {temporary_instance_name} terminated.")
+        finally:
+            scheduler.release_worker()
+
+        await engine.call(blockstorage_client.delete_boot_volume, restored_volume.id)
         logger.info(f"Deleted restored volume. Volume OCID: {restored_volume.id}")
 
     except Exception as e:
         logger.error(f"Error processing instance {instance.display_name}: {str(e)}")
         raise
 
-if __name__ == "__main__":
+def main():
+    metrics.serve()
     try:
-        instances = list_instances_by_tag(compartment_id, tag_key, tag_value)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(process_instance, instance) for instance in instances]
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+        errors = asyncio.run(engine.run(list_instances_by_tag(), process_instance))
+    finally:
+        engine.shutdown()
+        metrics.close()
+    if errors:
+        raise errors[0]
 
+if __name__ == "__main__":
+    try:
+        main()
         logger.info("Process completed successfully.")
     except Exception as e:
         logger.error(f"Error in main processing: {str(e)}")
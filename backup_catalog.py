@@ -0,0 +1,97 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone, timedelta
+
+DEFAULT_CATALOG_PATH = "backup_catalog.json"
+
+
+# Local catalog of backup chains, one per volume. A chain starts with a FULL
+# backup followed by INCREMENTAL ones. In incremental mode a new chain (a FULL
+# backup) is started every full_every runs, or when the chain reaches
+# max_chain_length backups or max_chain_age_days days. Finished chains are
+# kept for retained_chains generations so the previous restore points stay
+# available; older ones are handed back to the caller for deletion.
+class BackupCatalog:
+    def __init__(self, path=DEFAULT_CATALOG_PATH, mode="full", full_every=7, max_chain_length=14,
+                 max_chain_age_days=30, retained_chains=1):
+        self.path = path
+        self.mode = mode
+        self.full_every = full_every
+        self.max_chain_length = max_chain_length
+        self.max_chain_age_days = max_chain_age_days
+        self.retained_chains = retained_chains
+        self._lock = threading.Lock()
+        self.catalog = self._load()
+
+    @classmethod
+    def from_backupinfo(cls, backupinfo, path=DEFAULT_CATALOG_PATH):
+        backupinfo = backupinfo or {}
+        return cls(path=path,
+                   mode=(backupinfo.get("backupmode") or "full").lower(),
+                   full_every=int(backupinfo.get("fullbackupevery") or 7),
+                   max_chain_length=int(backupinfo.get("maxchainlength") or 14),
+                   max_chain_age_days=int(backupinfo.get("maxchainagedays") or 30),
+                   retained_chains=int(backupinfo.get("retainedchains") or 1))
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        with open(self.path, 'w') as f:
+            json.dump(self.catalog, f, indent=4)
+
+    @property
+    def incremental(self):
+        return self.mode == "incremental"
+
+    # Backup type ("FULL" or "INCREMENTAL") to request for the volume this run
+    def backup_type(self, volume_id):
+        if not self.incremental:
+            return "FULL"
+        with self._lock:
+            chain = self.catalog.get(volume_id, {}).get("current", [])
+        if not chain:
+            return "FULL"
+        started = datetime.fromisoformat(chain[0]["time_created"])
+        if (len(chain) >= min(self.full_every, self.max_chain_length) or
+                datetime.now(timezone.utc) - started >= timedelta(days=self.max_chain_age_days)):
+            return "FULL"
+        return "INCREMENTAL"
+
+    # Whether the volume needs a new durable backup: it has none, or the latest
+    # one is at least interval_hours old
+    def backup_due(self, volume_id, interval_hours=0):
+        with self._lock:
+            chain = self.catalog.get(volume_id, {}).get("current", [])
+        if not chain:
+            return True
+        latest = datetime.fromisoformat(chain[-1]["time_created"])
+        return datetime.now(timezone.utc) - latest >= timedelta(hours=interval_hours)
+
+    # Record a completed backup. Returns the OCIDs of backups in chains that
+    # fell out of retention and can now be deleted.
+    def record(self, volume_id, backup_id, backup_type):
+        with self._lock:
+            entry = self.catalog.setdefault(volume_id, {"current": [], "retained": []})
+            if backup_type == "FULL" and entry["current"]:
+                entry["retained"].insert(0, entry["current"])
+                entry["current"] = []
+            entry["current"].append({"backup_id": backup_id, "type": backup_type,
+                                     "time_created": datetime.now(timezone.utc).isoformat()})
+            expired = entry["retained"][self.retained_chains:]
+            del entry["retained"][self.retained_chains:]
+            self._save()
+        return [backup["backup_id"] for chain in expired for backup in chain]
+
+    # Whether a backup belongs to a chain and must not be deleted after the export
+    def in_chain(self, volume_id, backup_id):
+        with self._lock:
+            entry = self.catalog.get(volume_id, {})
+            chains = [entry.get("current", [])] + entry.get("retained", [])
+        return any(backup["backup_id"] == backup_id for chain in chains for backup in chain)
@@ -0,0 +1,215 @@
+import os
+import io
+import sys
+import json
+import time
+import runpy
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from polling_policy import PollingPolicy
+from fake_oci import FakeCloud, patched, DEFAULT_JITTER, DEFAULT_SIZE_SKEW
+
+# End-to-end makespan benchmark of the backup orchestrators against the
+# fake_oci simulator: runs main() of block_volume_back_cloud_init.py and/or
+# backup_boot_volume.py over synthetic fleets and reports the makespan (real
+# and simulated), API call counts and peak memory. Runs offline, e.g.
+#   python benchmark.py --fleets 10,100,1000 --scripts block
+# Every run gets a fresh simulated tenancy and a temporary working directory
+# for the scripts' local state (journal, catalog, history).
+
+SCRIPTS = {
+    "block": "block_volume_back_cloud_init.py",
+    "boot": "backup_boot_volume.py",
+}
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Make the scripts' own waits follow the simulated clock: asyncio and time
+# sleeps and the PollingPolicy delays are scaled, recorded durations unscaled
+@contextmanager
+def scaled_time(time_scale):
+    saved = (asyncio.sleep, time.sleep, PollingPolicy.first_delay, PollingPolicy.next_delay, PollingPolicy.record)
+    asyncio_sleep, time_sleep, first_delay, next_delay, record = saved
+
+    async def scaled_asyncio_sleep(delay, result=None):
+        return await asyncio_sleep(delay * time_scale, result)
+
+    asyncio.sleep = scaled_asyncio_sleep
+    time.sleep = lambda seconds: time_sleep(seconds * time_scale)
+    PollingPolicy.first_delay = lambda self, stage, size_in_gbs=None: first_delay(self, stage, size_in_gbs) * time_scale
+    PollingPolicy.next_delay = lambda self, stage, size_in_gbs, elapsed: \
+        next_delay(self, stage, size_in_gbs, elapsed / time_scale) * time_scale
+    PollingPolicy.record = lambda self, stage, size_in_gbs, duration, censored=False: \
+        record(self, stage, size_in_gbs, duration / time_scale, censored)
+    try:
+        yield
+    finally:
+        asyncio.sleep, time.sleep, PollingPolicy.first_delay, PollingPolicy.next_delay, PollingPolicy.record = saved
+
+
+# configuration.json of the repo pointed at the simulated tenancy. API rate
+# limits are per real second, so they are scaled like the latencies.
+def benchmark_config(work_dir, time_scale):
+    with open(os.path.join(REPO_DIR, "configuration.json"), "r") as config_file:
+        config_data = json.load(config_file)
+    ratelimitinfo = config_data.get("ratelimitinfo") or {}
+    config_data["ratelimitinfo"] = {
+        "defaultrate": str(float(ratelimitinfo.get("defaultrate") or 10) / time_scale),
+        "concurrency": ratelimitinfo.get("concurrency") or "8",
+        "operationrates": {operation: str(float(rate) / time_scale)
+                           for operation, rate in (ratelimitinfo.get("operationrates") or {}).items()},
+    }
+    config_data["metricsinfo"] = {"textfile": os.path.join(work_dir, "cra_backup.prom"), "port": ""}
+    config_data["regioninfo"] = [{"region": config_data["region"]}]
+    config_data["compartmentinfo"]["tenancyocid"] = "ocid1.tenancy.oc1..benchmark"
+    config_path = os.path.join(work_dir, "configuration.json")
+    with open(config_path, "w") as config_file:
+        json.dump(config_data, config_file, indent=4)
+    return config_data, config_path
+
+
+# Stop the background threads a script started so runs don't leak into each other
+def shutdown_script(script_globals):
+    if "waiter" in script_globals:
+        script_globals["waiter"].stop()
+    if "log_sink" in script_globals:
+        script_globals["log_sink"].close()
+    if "journal" in script_globals:
+        script_globals["journal"].close()
+    if "logger" in script_globals:
+        for handler in list(script_globals["logger"].handlers):
+            script_globals["logger"].removeHandler(handler)
+            handler.close()
+
+
+def make_cloud(args):
+    return FakeCloud(time_scale=args.time_scale, api_latency=args.api_latency, throttle_rates=args.throttle,
+                     default_failure_rate=args.failure_rate, failure_rates={"backup_script": args.worker_failure_rate},
+                     seed=args.seed, jitter=args.jitter, size_skew=args.size_skew)
+
+
+# Tagged fleet of fleet_size instances in the configured compartment; returns
+# the number of block volumes attached to it
+def add_fleet(cloud, config_data, fleet_size, args):
+    tagginginfo = config_data["cratagginginfo"]
+    cloud.add_compartment(config_data["compartmentinfo"]["tenancyocid"], config_data["compartmentinfo"]["parentocid"])
+    instances = cloud.add_fleet(fleet_size, config_data["compartmentinfo"]["parentocid"],
+                                volumes_per_instance=args.volumes, volume_sizes=args.sizes,
+                                freeform_tags={tagginginfo["backupenabledtagname"]: "True", "CRA-Backup": "True"})
+    instance_ids = {instance.id for instance in instances}
+    return len([attachment for attachment in cloud.list("volume_attachment") if attachment.instance_id in instance_ids])
+
+
+def run_once(script, fleet_size, args):
+    cloud = make_cloud(args)
+    with tempfile.TemporaryDirectory(prefix="cra-benchmark-") as work_dir:
+        config_data, config_path = benchmark_config(work_dir, args.time_scale)
+        volume_count = add_fleet(cloud, config_data, fleet_size, args)
+        return run_script(script, cloud, work_dir, config_data, config_path, fleet_size, volume_count, args)
+
+
+# One run of a script in work_dir, whose local state (journal, catalog,
+# history) is kept, so running it again in the same cloud and work_dir
+# behaves like the next scheduled run
+def run_script(script, cloud, work_dir, config_data, config_path, fleet_size, volume_count, args):
+    saved_cwd, saved_argv = os.getcwd(), sys.argv
+    saved_config_path = os.environ.get("CRA_CONFIG_PATH")
+    os.environ["CRA_CONFIG_PATH"] = config_path
+    os.chdir(work_dir)
+    sys.argv = [SCRIPTS[script], config_data["region"]]
+    if args.tracemalloc:
+        tracemalloc.start()
+    script_globals = {}
+    error = None
+    started = time.monotonic()
+    try:
+        with patched(cloud), scaled_time(args.time_scale), redirect_stdout(io.StringIO()):
+            script_globals = runpy.run_path(os.path.join(REPO_DIR, SCRIPTS[script]), run_name="benchmark")
+            if "console_handler" in script_globals:
+                script_globals["console_handler"].setLevel(logging.WARNING)
+            script_globals["main"]()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        makespan = time.monotonic() - started
+        shutdown_script(script_globals)
+        os.chdir(saved_cwd)
+        sys.argv = saved_argv
+        if saved_config_path is None:
+            os.environ.pop("CRA_CONFIG_PATH", None)
+        else:
+            os.environ["CRA_CONFIG_PATH"] = saved_config_path
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    report = script_globals.get("report") or {}
+    return {
+        "script": script,
+        "instances": fleet_size,
+        "volumes": volume_count,
+        "makespan_seconds": round(makespan, 2),
+        "simulated_makespan_hours": round(makespan / args.time_scale / 3600, 2),
+        "peak_traced_mb": round(peak_traced / 1024 ** 2, 1) if peak_traced is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "failures": len(report.get("volume_failures", [])) + len(report.get("instance_failures", [])),
+        "error": error,
+        **cloud.stats(),
+    }
+
+
+def parse_args(argv):
+    def pair(value):
+        low, high = value.split(",")
+        return int(low), int(high)
+
+    def rate(value):
+        operation, per_second = value.split("=")
+        return operation, float(per_second)
+
+    parser = argparse.ArgumentParser(description="Makespan benchmark of the backup orchestrators on a simulated OCI")
+    parser.add_argument("--scripts", default="block,boot", help="comma separated: block, boot")
+    parser.add_argument("--fleets", default="10,100,1000", help="comma separated fleet sizes (instances)")
+    parser.add_argument("--time-scale", type=float, default=0.001, help="real seconds per simulated second")
+    parser.add_argument("--api-latency", type=float, default=0.1, help="simulated seconds per API call")
+    parser.add_argument("--volumes", type=pair, default=(1, 3), help="block volumes per instance, min,max")
+    parser.add_argument("--sizes", type=pair, default=(50, 1024), help="block volume size in GB, min,max")
+    parser.add_argument("--throttle", type=rate, action="append", default=[],
+                        help="operation=calls per simulated second before the fake answers 429, repeatable")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability of a 500 on any API call")
+    parser.add_argument("--worker-failure-rate", type=float, default=0.0,
+                        help="probability that the backup script exits non-zero on a worker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="sigma of the log-normal factor on every simulated stage duration (0 for none)")
+    parser.add_argument("--size-skew", type=float, default=DEFAULT_SIZE_SKEW,
+                        help="exponent by which seconds per GB grow with volume size")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip tracing Python allocations (faster, peak RSS only)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    args.throttle = dict(args.throttle)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    results = []
+    print(f"{'script':<6} {'instances':>9} {'volumes':>7} {'makespan s':>10} {'sim hours':>9} {'API calls':>9} "
+          f"{'throttled':>9} {'failures':>8} {'peak MB':>8}")
+    for script in args.scripts.split(","):
+        for fleet_size in [int(size) for size in args.fleets.split(",")]:
+            result = run_once(script, fleet_size, args)
+            results.append(result)
+            print(f"{script:<6} {fleet_size:>9} {result['volumes']:>7} {result['makespan_seconds']:>10} "
+                  f"{result['simulated_makespan_hours']:>9} {result['api_calls']:>9} {result['throttled']:>9} "
+                  f"{result['failures']:>8} {result['peak_traced_mb'] or result['max_rss_mb']:>8}")
+            if result["error"]:
+                print(f"  run failed: {result['error']}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
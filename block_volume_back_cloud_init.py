@@ -1,67 +1,96 @@
 import oci
-from oci.loggingingestion import LoggingClient, models
+from oci.loggingingestion import LoggingClient
 import time
-from datetime import datetime,timezone
+from datetime import datetime
 import random
 import string
 import paramiko
-import concurrent.futures
+import asyncio
 import os
 import json
+import re
+import sys
+from lifecycle_waiter import LifecycleWaiter
+from polling_policy import PollingPolicy
+from async_engine import AsyncEngine, ssh_exec
+from worker_scheduler import WorkerScheduler
+from worker_pool import WorkerPool
+from worker_shape import WorkerShapeSelector
+from backup_catalog import BackupCatalog
+from run_journal import RunJournal, DEFAULT_MAX_RESUME_HOURS
+from inventory import Inventory
+from discovery import discovery_from_config
+from oci_clients import OciClientFactory
+from rate_limiter import RateLimiter, retry_strategy_without_throttles
+from log_sink import LogSink
+from metrics import Metrics
 
 
-# Load constants from the JSON configuration file
-with open('/home/opc/configuration.json', 'r') as config_file:
+# Load constants from the JSON configuration file (CRA_CONFIG_PATH overrides its location)
+with open(os.environ.get('CRA_CONFIG_PATH', '/home/opc/configuration.json'), 'r') as config_file:
     config_data = json.load(config_file)
 
+# Region this process protects: the first argument (multi_region_backup.py starts
+# one process per region), or the configured home region. The matching regioninfo
+# entry overrides compartments, worker subnet and worker limits for the region.
+region = sys.argv[1] if len(sys.argv) > 1 else config_data['region']
+regioninfo = next((entry for entry in config_data.get('regioninfo', []) if entry.get('region') == region), {})
+
+# Local state (history, catalog, journal, report) is kept per region
+def state_path(file_name):
+    return f"{region}_{file_name}"
+
 current_datetime = datetime.now()
 datetime_string = current_datetime.strftime("%Y-%m-%d-%H-%M-%S")
-# Initialize the default config and signer
-signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-logging_client = LoggingClient(config={}, signer=signer)
+# Per-stage durations, upload volume and API call counts, exported as a textfile and/or on a local port.
+# Each region process writes its own textfile; a port must be set per region in regioninfo.
+metricsinfo = {**(config_data.get('metricsinfo') or {}), **(regioninfo.get('metricsinfo') or {})}
+metrics = Metrics.from_config(metricsinfo, labels={"region": region})
+if metrics.textfile_path:
+    metrics.textfile_path = metrics.textfile_path.replace(".prom", f"_{region}.prom")
+limiter = RateLimiter.from_config(config_data.get('ratelimitinfo'), metrics=metrics)
+engine = AsyncEngine(limiter=limiter)
 
-# Initialize OCI clients
-compute_client = oci.core.ComputeClient(config={}, signer=signer)
-blockstorage_client = oci.core.BlockstorageClient(config={}, signer=signer)
-object_storage_client = oci.object_storage.ObjectStorageClient(config={}, signer=signer)
-network_client = oci.core.VirtualNetworkClient(config={}, signer=signer)
+# Initialize OCI clients with instance principals. Logs go to the home region,
+# everything else to the region being protected. Connection pools cover the
+# engine's API threads plus the lifecycle waiter. Throttled calls are retried
+# by the rate limiter, not the SDK.
+home_clients = OciClientFactory.instance_principals(pool_size=engine.max_api_calls + 2,
+                                                    retry_strategy=retry_strategy_without_throttles())
+region_clients = home_clients.with_region(region)
+logging_client = home_clients.client(LoggingClient)
+compute_client = region_clients.client(oci.core.ComputeClient)
+blockstorage_client = region_clients.client(oci.core.BlockstorageClient)
+object_storage_client = region_clients.client(oci.object_storage.ObjectStorageClient)
+network_client = region_clients.client(oci.core.VirtualNetworkClient)
+identity_client = region_clients.client(oci.identity.IdentityClient)
+search_client = region_clients.client(oci.resource_search.ResourceSearchClient)
+waiter = LifecycleWaiter(compute_client, blockstorage_client, policy=PollingPolicy(history_path=state_path("stage_history.json")),
+                         limiter=limiter, metrics=metrics)
+inventory = Inventory(compute_client, object_storage_client=object_storage_client, limiter=limiter)
+waiter.add_listener(inventory.on_lifecycle_event)
 
 # Extract the necessary constants
 craserverinfo = config_data['craserverinfo']
-compartmentinfo = config_data['compartmentinfo']
+compartmentinfo = {**config_data['compartmentinfo'], **(regioninfo.get('compartmentinfo') or {})}
 cratagginginfo = config_data['cratagginginfo']
 objectstorageinfo = config_data['objectstorageinfo']
-networkinfo = config_data['networkinfo']
+networkinfo = {**config_data['networkinfo'], **(regioninfo.get('networkinfo') or {})}
 logginginfo=config_data['logging']
+workerinfo = {**config_data['workerinfo'], **(regioninfo.get('workerinfo') or {})}
+scheduler = WorkerScheduler.from_workerinfo(workerinfo)
+shape_selector = WorkerShapeSelector.from_workerinfo(workerinfo, history_path=state_path("worker_throughput.json"))
+backupinfo = config_data.get('backupinfo') or {}
+catalog = BackupCatalog.from_backupinfo(backupinfo, path=state_path("backup_catalog.json"))
+journal = RunJournal(state_path("run_journal.db"), max_resume_hours=float(backupinfo.get('maxresumehours') or DEFAULT_MAX_RESUME_HOURS))
+report = {"region": region, "instances": 0, "volumes_exported": 0, "volume_failures": [], "instance_failures": []}
+clone_export = (backupinfo.get('exportsource') or 'backup').lower() == 'clone'
+durable_backup_interval_hours = float(backupinfo.get('durablebackupintervalhours') or 0)
 
 
-# Function to send logs to OCI Logging service
+# Function to send logs to OCI Logging service; entries are batched and sent in the background
 def send_log_to_oci(level, message):
-    log_entry = models.LogEntry(
-        data=f"{level}: {message}",
-        id=f"ID-{random.randint(100000, 999999)}",
-        time=datetime.now(timezone.utc).isoformat()
-    )
-    log_details = models.PutLogsDetails(
-         specversion="1.0",
-        log_entry_batches=[
-            models.LogEntryBatch(
-                entries=[log_entry],
-                source="cra-script",
-                type="CUSTOM",
-                subject="block-volume-backup",
-                defaultlogentrytime=datetime.now(timezone.utc).isoformat()
-            )
-        ]
-    )
-    
-    try:
-        logging_client.put_logs(
-            log_id=log_id,
-            put_logs_details=log_details
-        )
-    except oci.exceptions.ServiceError as e:
-        print(f"Failed to send log: {e}")
+    log_sink.log(level, message)
 
 
 
@@ -69,6 +98,10 @@ def send_log_to_oci(level, message):
 compartment_id = compartmentinfo["parentocid"]
 os_namespace = objectstorageinfo["namespace"]
 bucket_name = objectstorageinfo["immutablebucketname"]
+# "incremental" uploads only the files changed since the volume's previous file-level export
+export_mode = (objectstorageinfo.get("exportmode") or "full").lower()
+# Incremental exports re-hash every file after this many days (0 never does), otherwise only files whose stat changed
+full_verify_days = int(objectstorageinfo.get("fullverifydays") or 30)
 temp_instance_subnet_ocid = networkinfo["subnetocid"]
 tag_key = cratagginginfo["backupenabledtagname"]
 tag_value = "True"
@@ -77,213 +110,403 @@ public_key = 'ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQDlJruyiWi7+sDGmKvYR0i1Oj9Eea
 oci_objectstorage_preauthrequest = objectstorageinfo["scriptsbucketpar"]
 log_group_id = logginginfo["loggroupocid"]
 log_id = logginginfo["logocid"]
+log_sink = LogSink(logging_client, log_id, source="cra-script", subject="block-volume-backup")
+# Modules the worker script imports, fetched with the same pre-authenticated request
+worker_modules = ["log_sink.py", "metrics.py", "upload_engine.py", "rate_limiter.py", "segment_packer.py", "chunk_store.py", "detect_block_changes.py", "snapshot_manifest.py"] + [name.strip() for name in (objectstorageinfo.get("filestodownload") or "").split(",") if name.strip()]
+discovery = discovery_from_config({**config_data, 'compartmentinfo': compartmentinfo},
+                                  search_client, identity_client, inventory, tag_key, tag_value)
 
-# Function to list instances by tag
-def list_instances_by_tag(compartment_id, tag_key, tag_value):
+# Function to list instances by tag across the configured compartment subtrees.
+# Instances are yielded as they are found so workflows can start before
+# discovery has finished.
+def list_instances_by_tag():
     try:
-        instances = compute_client.list_instances(compartment_id).data
-        filtered_instances = [instance for instance in instances 
-                              if instance.freeform_tags.get(tag_key) == tag_value 
-                              and instance.lifecycle_state != 'TERMINATED']
-        return filtered_instances
+        yield from discovery.discover()
     except oci.exceptions.ServiceError as e:
         send_log_to_oci("ERROR", f"Error listing instances: {e.message}")
-        return []
 
-# Function to process a single instance
-def process_instance(instance):
+# Function to launch a pooled worker instance and download the backup script to it.
+# The worker is sized for the bytes and files it is expected to upload.
+async def launch_worker(availability_domain, total_bytes=0, file_count=0):
+    temporary_instance_name = f"temporary_instance_worker_{datetime_string}_{''.join(random.choices(string.ascii_letters, k=3))}"
+    shape_config = shape_selector.select(total_bytes, file_count)
+    instance_details = oci.core.models.LaunchInstanceDetails(
+        compartment_id=compartment_id,
+        availability_domain=availability_domain,
+        display_name=temporary_instance_name,
+        shape=shape_selector.shape,
+        shape_config=shape_config,
+        create_vnic_details=oci.core.models.CreateVnicDetails(
+            assign_public_ip=True,
+            subnet_id=temp_instance_subnet_ocid
+        ),
+        source_details=oci.core.models.InstanceSourceViaImageDetails(
+            image_id=workerinfo['linuxworkerimageocid']
+        ),
+        metadata={
+            "ssh_authorized_keys": public_key
+        }
+    )
+
+    # Launch the instance once a worker slot is free
+    await scheduler.acquire_worker()
     try:
-        send_log_to_oci("INFO", f"Processing Instance: {instance.display_name}, OCID: {instance.id}")
-        availability_domain = instance.availability_domain
-        block_volume_info = compute_client.list_volume_attachments(
-            availability_domain=availability_domain,
-            compartment_id=compartment_id,
-            instance_id=instance.id
-        ).data
-        attached_volume_ids = [vol_info.volume_id for vol_info in block_volume_info if vol_info.lifecycle_state == 'ATTACHED']
+        new_instance = (await engine.call(compute_client.launch_instance, instance_details)).data
+    except Exception:
+        scheduler.release_worker()
+        raise
+    scheduler.register_worker(new_instance.id)
+    journal.started(new_instance.id, "worker", new_instance.id)
+    send_log_to_oci("INFO",f"Launching new instance... Instance OCID:{new_instance.display_name}, {new_instance.id}, "
+                           f"{shape_config.ocpus} OCPUs / {shape_config.memory_in_gbs} GB for {total_bytes} bytes in {file_count} files")
+    try:
+        ssh = await bootstrap_worker(new_instance)
+    except Exception:
+        await terminate_worker(new_instance)
+        raise
+    return new_instance, ssh
 
-        # Create Block Volume Backups
-        attached_vol_backup_ocids = []
-        if attached_volume_ids:
-            for attached_vol_id in attached_volume_ids:
-                volume_backup_name = f"{instance.display_name}_{datetime_string}_{''.join(random.choices(string.ascii_letters, k=3))}"
-                volume_backup_response = blockstorage_client.create_volume_backup(
-                    create_volume_backup_details=oci.core.models.CreateVolumeBackupDetails(
-                        volume_id=attached_vol_id,
-                        display_name=volume_backup_name,
-                        freeform_tags={'cra_volume_backup': 'True'},
-                        type="FULL"
-                    )
-                ).data
-                attached_vol_backup_ocids.append(volume_backup_response.id)
-                send_log_to_oci("INFO", f"Creating volume backup {volume_backup_name}... Backup OCID: {volume_backup_response.id}")
-
-            # Wait for backups to complete
-            while True:
-                block_vol_backup = all(
-                    blockstorage_client.get_volume_backup(vol_backup_id).data.lifecycle_state == "AVAILABLE"
-                    for vol_backup_id in attached_vol_backup_ocids
-                )
-                if block_vol_backup:
-                    break
-                send_log_to_oci("INFO", f"Waiting for block volume backups to complete...{volume_backup_name}")
-                time.sleep(15)
-
-            send_log_to_oci("INFO", "Attached volume backups created successfully.")
-            # Restore Block Volumes from Backups
-            restored_volumes = []
-            for attached_vol_backup_id in attached_vol_backup_ocids:
-                restored_block_volume = blockstorage_client.create_volume(
-                    create_volume_details=oci.core.models.CreateVolumeDetails(
-                        compartment_id=compartment_id,
-                        source_details=oci.core.models.VolumeSourceFromVolumeBackupDetails(
-                            type="volumeBackup",
-                            id=attached_vol_backup_id
-                        ),
-                        availability_domain=availability_domain,
-                        display_name=f"restored_block_volume_{datetime_string}"
-                    )
-                ).data
-                restored_volumes.append({
-                    'volume_id': restored_block_volume.id,
-                    'instance_name': instance.display_name,
-                    'instance_ocid': instance.id,
-                    'availability_domain': availability_domain
-                })
-                send_log_to_oci("INFO", f"Restoring block volume from backup {restored_block_volume.display_name}... Volume OCID: {restored_block_volume.id}")
-            # Wait for restored volumes to become available
-            while True:
-                block_volume_statuses = [
-                    blockstorage_client.get_volume(vol['volume_id']).data.lifecycle_state
-                    for vol in restored_volumes
-                ]
-                if all(status == "AVAILABLE" for status in block_volume_statuses):
-                    break
-                send_log_to_oci("INFO","Waiting for restored block volumes to become available...")
-                time.sleep(10)
-            send_log_to_oci("INFO","Volumes restored successfully.")
-            
-
-            temporary_instance_name = f'temporary_instance_{instance.display_name}_{datetime_string}'
-            if restored_volumes:
-                instance_details = oci.core.models.LaunchInstanceDetails(
+# Function to wait for a launched worker and download the backup script to it over SSH
+async def bootstrap_worker(new_instance):
+    # Wait until the instance is running
+    send_log_to_oci("INFO",f"Waiting for instance to become available...{new_instance.display_name}, ETA: {waiter.eta('instance_launch')}")
+    await engine.wait(waiter.wait_for("instance", new_instance.id, "RUNNING", compartment_id, stage="instance_launch"))
+
+    print("New instance is running.")
+    send_log_to_oci("INFO",f"New instance: {new_instance.display_name}, OCID: {new_instance.id}")
+
+    list_vnic_attachments_response = (await engine.call(
+        compute_client.list_vnic_attachments,
+        compartment_id=compartment_id,
+        instance_id=new_instance.id)).data
+    response_get_vnic = (await engine.call(network_client.get_vnic, list_vnic_attachments_response[0].vnic_id)).data
+    with metrics.time_stage("ssh_bootstrap"):
+        await asyncio.sleep(30)
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        private_key = paramiko.RSAKey.from_private_key_file(private_key_path)
+        await engine.call(ssh.connect, response_get_vnic.public_ip, username='opc', pkey=private_key)
+        exit_status, output1, error1 = await ssh_exec(ssh, f"sudo curl '{oci_objectstorage_preauthrequest}' > /home/opc/backup_script.py")
+        par_prefix = oci_objectstorage_preauthrequest[:oci_objectstorage_preauthrequest.rindex('/o/') + 3]
+        for module_name in worker_modules:
+            await ssh_exec(ssh, f"sudo curl '{par_prefix}{module_name}' > /home/opc/{module_name}")
+    send_log_to_oci("INFO",f"Download PY script - SSH output {new_instance.display_name}, {output1}")
+    send_log_to_oci("INFO",f"Download PY script - SSH error {new_instance.display_name}, {error1}")
+    return ssh
+
+# Function to terminate a worker and hand its slot back to the scheduler
+async def terminate_worker(new_instance):
+    try:
+        await engine.call(compute_client.terminate_instance, new_instance.id, preserve_boot_volume=False)
+        send_log_to_oci("INFO",f"Terminating temporary instance... Instance OCID: {new_instance.id}")
+        await engine.wait(waiter.wait_for("instance", new_instance.id, "TERMINATED", compartment_id, stage="instance_terminate"))
+        journal.done(new_instance.id, "worker")
+        print("Instance is terminated.")
+    finally:
+        scheduler.release_worker(new_instance.id)
+
+# Function to terminate workers left running by a run that died; their SSH
+# sessions are gone, so volumes still attached to them are released this way
+async def terminate_orphaned_workers():
+    for run_id, workflow, worker_id in journal.unfinished("worker"):
+        try:
+            await engine.call(compute_client.terminate_instance, worker_id, preserve_boot_volume=False)
+            send_log_to_oci("INFO",f"Terminating worker left by a previous run... Instance OCID: {worker_id}")
+            await engine.wait(waiter.wait_for("instance", worker_id, "TERMINATED", compartment_id, stage="instance_terminate"))
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                raise
+        journal.done(workflow, "worker", run_id=run_id)
+
+# Function to delete export volumes and volume backups that failed volumes of
+# an earlier run kept for a retry, when that run was closed instead of resumed
+async def delete_leftover_resources():
+    leftovers = [("export_volume", "delete_export_volume", blockstorage_client.delete_volume),
+                 ("volume_backup", "delete_volume_backup", blockstorage_client.delete_volume_backup)]
+    for stage, cleanup_stage, delete in leftovers:
+        for run_id, attached_vol_id, resource_id in journal.leftovers(stage, cleanup_stage):
+            # Backups in an incremental chain or kept as the durable copy stay
+            if stage == "volume_backup" and catalog.in_chain(attached_vol_id, resource_id):
+                continue
+            try:
+                await engine.call(delete, resource_id)
+                send_log_to_oci("INFO", f"Deleted {resource_id} left by an earlier run of {attached_vol_id}.")
+            except oci.exceptions.ServiceError as e:
+                if e.status != 404:
+                    send_log_to_oci("ERROR", f"Failed to delete {resource_id} left by an earlier run: {e.message}")
+                    continue
+            journal.done(attached_vol_id, cleanup_stage, resource_id, run_id=run_id)
+
+# Function to take the durable backup of a volume, FULL or INCREMENTAL as the volume's chain requires
+async def backup_volume(instance, attached_vol_id, volume_size, volume_compartment_id, volume_record):
+    journaled = journal.stage(attached_vol_id, "volume_backup")
+    if journaled:
+        # Requested by the run being resumed: never create it twice
+        volume_backup_id = journaled["resource_id"]
+        backup_type = journaled["data"]["backup_type"]
+        volume_record['backup_id'] = volume_backup_id
+        if catalog.incremental or clone_export:
+            volume_record['source_volume_id'] = attached_vol_id
+        if journaled["state"] == "done":
+            return volume_backup_id
+        send_log_to_oci("INFO", f"Resuming wait for volume backup {volume_backup_id}")
+    else:
+        backup_type = catalog.backup_type(attached_vol_id)
+        volume_backup_name = f"{instance.display_name}_{datetime_string}_{''.join(random.choices(string.ascii_letters, k=3))}"
+        volume_backup_id = (await engine.call(
+            blockstorage_client.create_volume_backup,
+            create_volume_backup_details=oci.core.models.CreateVolumeBackupDetails(
+                volume_id=attached_vol_id,
+                display_name=volume_backup_name,
+                freeform_tags={'cra_volume_backup': 'True'},
+                type=backup_type
+            )
+        )).data.id
+        journal.started(attached_vol_id, "volume_backup", volume_backup_id, backup_type=backup_type)
+        volume_record['backup_id'] = volume_backup_id
+        send_log_to_oci("INFO", f"Creating {backup_type} volume backup {volume_backup_name} ({volume_size} GB)... Backup OCID: {volume_backup_id}, ETA: {waiter.eta('volume_backup', volume_size)}")
+    # Backups are created in the source volume's compartment
+    await engine.wait(waiter.wait_for("volume_backup", volume_backup_id, "AVAILABLE", volume_compartment_id,
+                                      stage="volume_backup", size_in_gbs=volume_size))
+    send_log_to_oci("INFO", f"Volume backup {volume_backup_id} created successfully.")
+    # In clone mode the backup is the durable copy, so it is always kept in the catalog
+    if (catalog.incremental or clone_export) and not catalog.in_chain(attached_vol_id, volume_backup_id):
+        volume_record['source_volume_id'] = attached_vol_id
+        for expired_backup_id in catalog.record(attached_vol_id, volume_backup_id, backup_type):
+            await engine.call(blockstorage_client.delete_volume_backup, expired_backup_id)
+            send_log_to_oci("INFO", f"Deleted volume backup {expired_backup_id} from an expired chain.")
+    journal.done(attached_vol_id, "volume_backup", backup_type=backup_type)
+    return volume_backup_id
+
+# Function to move a single volume through backup -> restore -> attach -> upload.
+# Each volume runs its own pipeline so a large volume does not hold back the small ones.
+# With backupinfo.exportsource set to clone, the export copy is cloned straight from the
+# source volume and the durable backup (when due) runs alongside the export.
+async def process_volume(instance, attached_vol_id, availability_domain, volume_record):
+    source_volume = (await engine.call(blockstorage_client.get_volume, attached_vol_id)).data
+    volume_size = source_volume.size_in_gbs
+
+    backup_task = None
+    try:
+        if clone_export:
+            if journal.stage(attached_vol_id, "volume_backup") or catalog.backup_due(attached_vol_id, durable_backup_interval_hours):
+                backup_task = asyncio.create_task(backup_volume(instance, attached_vol_id, volume_size, source_volume.compartment_id, volume_record))
+            source_details = oci.core.models.VolumeSourceFromVolumeDetails(
+                type="volume",
+                id=attached_vol_id
+            )
+            copy_stage = "volume_clone"
+        else:
+            volume_backup_id = await backup_volume(instance, attached_vol_id, volume_size, source_volume.compartment_id, volume_record)
+            source_details = oci.core.models.VolumeSourceFromVolumeBackupDetails(
+                type="volumeBackup",
+                id=volume_backup_id
+            )
+            copy_stage = "volume_restore"
+
+        # Restore (or clone) the block volume that is exported
+        journaled = journal.stage(attached_vol_id, "export_volume")
+        if journaled:
+            restored_volume_id = journaled["resource_id"]
+        else:
+            restored_volume_id = (await engine.call(
+                blockstorage_client.create_volume,
+                create_volume_details=oci.core.models.CreateVolumeDetails(
                     compartment_id=compartment_id,
+                    source_details=source_details,
                     availability_domain=availability_domain,
-                    display_name=temporary_instance_name,
-                    shape="VM.Standard.E4.Flex",
-                    shape_config=oci.core.models.LaunchInstanceShapeConfigDetails(
-                        ocpus=2, #read from config file
-                        memory_in_gbs=10
-                    ),
-                    create_vnic_details=oci.core.models.CreateVnicDetails(
-                        assign_public_ip=True,
-                        subnet_id=temp_instance_subnet_ocid
-                    ),
-                    source_details=oci.core.models.InstanceSourceViaImageDetails(
-                        image_id='ocid1.image.oc1.iad.aaaaaaaa32s2htizwbsi5q2tnbrzii5n67tqmki7en7hkrvxzfww556qggxq'
-                        #read from config file
-                    ),
-                    metadata={
-                        "ssh_authorized_keys": public_key
-                    }
+                    display_name=f"restored_block_volume_{datetime_string}"
                 )
+            )).data.id
+            journal.started(attached_vol_id, "export_volume", restored_volume_id)
+            send_log_to_oci("INFO", f"Creating export volume from {source_details.type}... Volume OCID: {restored_volume_id}, ETA: {waiter.eta(copy_stage, volume_size)}")
+        volume_record['volume_id'] = restored_volume_id
+        if not journaled or journaled["state"] != "done":
+            await engine.wait(waiter.wait_for("volume", restored_volume_id, "AVAILABLE", compartment_id,
+                                              stage=copy_stage, size_in_gbs=volume_size))
+            journal.done(attached_vol_id, "export_volume")
+            send_log_to_oci("INFO", f"Volume {restored_volume_id} restored successfully.")
 
-                # Launch the instance
-                new_instance = compute_client.launch_instance(instance_details).data     
-                send_log_to_oci("INFO",f"Launching new instance... Instance OCID:{new_instance.display_name}, {new_instance.id}")
-
-
-                # Wait until the instance is running
-                while True:
-                    instance_status = compute_client.get_instance(new_instance.id).data.lifecycle_state
-                    if instance_status == "RUNNING":
-                        break
-                    send_log_to_oci("INFO",f"Waiting for instance to become available...{new_instance.display_name}")   
-                    time.sleep(15)
-
-                print("New instance is running.")
-                send_log_to_oci("INFO",f"New instance: {new_instance.display_name}, OCID: {new_instance.id}")
-                # Step 4: Attach all restored block volumes to the new instance
-                for volume_data in restored_volumes:  
-                    attach_details = oci.core.models.AttachParavirtualizedVolumeDetails(
-                        instance_id=new_instance.id,
-                        volume_id=volume_data['volume_id'],
-                        display_name=f"{volume_data['instance_name']}_attached_volume_{datetime_string}"
-                    )
-                    attach_response = compute_client.attach_volume(attach_details).data
-                    send_log_to_oci("INFO",f"Attaching volume {volume_data['volume_id']} from instance {volume_data['instance_name']} to new instance {new_instance.display_name}")
-                    # Wait for attachment to complete
-                    while True:
-                        attachment_status = compute_client.get_volume_attachment(attach_response.id).data.lifecycle_state
-                        if attachment_status == "ATTACHED":
-                            break
-                        time.sleep(10)
-                    send_log_to_oci("INFO",f"Volume {volume_data['volume_id']} attached successfully.")
-
-                list_vnic_attachments_response = compute_client.list_vnic_attachments(
-                    compartment_id=compartment_id,
-                    instance_id=new_instance.id).data
-                response_get_vnic = network_client.get_vnic(list_vnic_attachments_response[0].vnic_id).data
-                instance_status = compute_client.get_instance(new_instance.id).data.lifecycle_state
-                time.sleep(30)
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-                private_key = paramiko.RSAKey.from_private_key_file(private_key_path)
-                ssh.connect(response_get_vnic.public_ip, username='opc', pkey=private_key)
-                stdin, stdout1, stderr1 = ssh.exec_command(f"sudo curl '{oci_objectstorage_preauthrequest}' > /home/opc/backup_script.py")
-                output1 = stdout1.read().decode()
-                error1 = stderr1.read().decode()
-                send_log_to_oci("INFO",f"Download PY script - SSH output {new_instance.display_name}, {output1}")
-                send_log_to_oci("INFO",f"Download PY script - SSH error {new_instance.display_name}, {error1}")
-
-                # Command 2: Run script
-                stdin, stdout2, stderr2 = ssh.exec_command(f"sudo python /home/opc/backup_script.py {bucket_name} {instance.display_name}_{datetime_string} {log_id}")
-                output2 = stdout2.read().decode()
-                error2 = stderr2.read().decode()
-                send_log_to_oci("INFO",f"SSH output - backupscript {new_instance.display_name}, {output2}")
-                send_log_to_oci("INFO",f"SSH error {new_instance.display_name}, {error2}")
-                send_log_to_oci("INFO",f"Processing Instance Name: {instance.display_name}, OCID: {instance.id}")
-                ssh.close()
-                # Cleanup: Terminate the temporary instance and delete the restored volume
-                compute_client.terminate_instance(new_instance.id, preserve_boot_volume=False)
-                send_log_to_oci("INFO",f"Terminating temporary instance... Instance OCID: {new_instance.id}")
-                while True:
-                    instance = compute_client.get_instance(new_instance.id).data
-                    if instance.lifecycle_state == 'TERMINATED':
-                        print("Instance is terminated.")
-                        break
-                    else:
-                        send_log_to_oci("INFO",f"Processing Instance Name: {instance.display_name}, OCID: {instance.id}")
-                        time.sleep(10)  
-                # Delete the attached volume backups
-                for volume_data in restored_volumes:
-                    blockstorage_client.delete_volume(volume_data['volume_id'])
-                print("Restored volumes are terminated.")
-                for vol_backup_id in attached_vol_backup_ocids:
-                    blockstorage_client.delete_volume_backup(vol_backup_id)
-                print("Volume backups are terminated.")
+        if journal.is_done(attached_vol_id, "upload"):
+            send_log_to_oci("INFO", f"Files of volume {attached_vol_id} were already uploaded in this run.")
         else:
+            await export_volume(instance, attached_vol_id, availability_domain, volume_size, restored_volume_id)
+            journal.done(attached_vol_id, "upload")
+    finally:
+        if backup_task:
+            await backup_task
+
+# Function to attach an export volume to a pooled worker and upload its files
+async def export_volume(instance, attached_vol_id, availability_domain, volume_size, restored_volume_id):
+    # Place the volume on the warm worker in the same availability domain that
+    # finishes it earliest; the pool also hands out a free device path on it
+    expected_bytes, expected_files = shape_selector.last_export(attached_vol_id)
+    worker, device = await worker_pool.acquire(availability_domain, volume_size, expected_bytes, expected_files or 0)
+    attachment_id = None
+    device_free = True
+    upload_seconds = None
+    try:
+        attach_details = oci.core.models.AttachParavirtualizedVolumeDetails(
+            instance_id=worker.instance.id,
+            volume_id=restored_volume_id,
+            device=device,
+            display_name=f"{instance.display_name}_attached_volume_{datetime_string}"
+        )
+        attach_response = (await engine.call(compute_client.attach_volume, attach_details)).data
+        attachment_id = attach_response.id
+        device_free = False
+        send_log_to_oci("INFO",f"Attaching volume {restored_volume_id} from instance {instance.display_name} to worker {worker.instance.display_name} as {device}")
+        await engine.wait(waiter.wait_for("volume_attachment", attachment_id, "ATTACHED", compartment_id, stage="volume_attach"))
+        send_log_to_oci("INFO",f"Volume {restored_volume_id} attached successfully.")
+
+        # Run the backup script on the worker for this device only
+        upload_started = time.monotonic()
+        # Objects are named after the source volume OCID, not the worker's device path, which is
+        # reused; in incremental export mode the OCID also keys the chain of file-level manifests
+        exit_status, output2, error2 = await ssh_exec(worker.ssh, f"sudo python /home/opc/backup_script.py {bucket_name} {instance.display_name}_{datetime_string} {log_id} {device} {attached_vol_id} {export_mode} {full_verify_days}")
+        send_log_to_oci("INFO",f"SSH output - backupscript {worker.instance.display_name}, {device}, {output2}")
+        send_log_to_oci("INFO",f"SSH error {worker.instance.display_name}, {device}, {error2}")
+        metrics.stage_finished("volume_upload", time.monotonic() - upload_started, volume_size, failed=exit_status != 0)
+        # A failed upload leaves the upload stage open, so a resumed run retries it
+        if exit_status != 0:
+            raise RuntimeError(f"Backup script for volume {attached_vol_id} on {worker.instance.display_name} exited with status {exit_status}: {error2}")
+        upload_seconds = time.monotonic() - upload_started
+        waiter.policy.record("volume_upload", volume_size, upload_seconds)
+        summary = re.search(r"UPLOAD SUMMARY files=(\d+) bytes=(\d+) seconds=([\d.]+)", output2)
+        if summary:
+            metrics.inc("uploaded_files_total", int(summary.group(1)))
+            metrics.inc("uploaded_bytes_total", int(summary.group(2)))
+            shape_selector.record(worker.instance.shape_config.ocpus, int(summary.group(2)), int(summary.group(1)),
+                                  float(summary.group(3)), worker.active_tasks, volume_id=attached_vol_id)
+    finally:
+        # Detach the volume so the worker can take the next one
+        if attachment_id:
+            await engine.call(compute_client.detach_volume, attachment_id)
+            await engine.wait(waiter.wait_for("volume_attachment", attachment_id, "DETACHED", compartment_id, stage="volume_detach"))
+            device_free = True
+        # A device whose detach did not complete is not handed out again
+        await worker_pool.release(worker, device if device_free else None, volume_size, upload_seconds)
+
+# Function to process a single instance
+async def process_instance(instance):
+    try:
+        if journal.is_done(instance.id, "instance"):
+            send_log_to_oci("INFO", f"Instance {instance.display_name} was already backed up in this run, skipping.")
+            return
+        send_log_to_oci("INFO", f"Processing Instance: {instance.display_name}, OCID: {instance.id}")
+        availability_domain = instance.availability_domain
+        block_volume_info = await engine.call(inventory.volume_attachments, instance.compartment_id, instance.id)
+        attached_volume_ids = [vol_info.volume_id for vol_info in block_volume_info if vol_info.lifecycle_state == 'ATTACHED']
+        if not attached_volume_ids:
             send_log_to_oci("INFO", f"No block volumes attached to {instance.display_name}, OCID: {instance.id}")
+            return
+
+        volume_records = [{} for _ in attached_volume_ids]
+        results = await asyncio.gather(*[
+            process_volume(instance, attached_vol_id, availability_domain, volume_record)
+            for attached_vol_id, volume_record in zip(attached_volume_ids, volume_records)
+        ], return_exceptions=True)
+        for attached_vol_id, result in zip(attached_volume_ids, results):
+            if isinstance(result, oci.exceptions.ServiceError):
+                send_log_to_oci("ERROR", f"Service error while processing volume {attached_vol_id} of {instance.display_name}: {result.message}")
+                report["volume_failures"].append({"volume_id": attached_vol_id, "instance": instance.display_name, "error": result.message})
+            elif isinstance(result, Exception):
+                send_log_to_oci("ERROR", f"Unexpected error while processing volume {attached_vol_id} of {instance.display_name}: {str(result)}")
+                report["volume_failures"].append({"volume_id": attached_vol_id, "instance": instance.display_name, "error": str(result)})
+            else:
+                send_log_to_oci("INFO", f"Volume {attached_vol_id} of {instance.display_name} exported successfully.")
+                report["volumes_exported"] += 1
+
+        # Cleanup: delete the restored volumes and backups, the workers stay in the pool.
+        # Those of failed volumes are kept so a resumed run can retry their export.
+        cleanup_started = time.monotonic()
+        for attached_vol_id, volume_record, result in zip(attached_volume_ids, volume_records, results):
+            if isinstance(result, Exception):
+                if 'volume_id' in volume_record:
+                    send_log_to_oci("INFO", f"Keeping export volume {volume_record['volume_id']} of {attached_vol_id} for a retry.")
+                continue
+            if 'volume_id' in volume_record and not journal.is_done(attached_vol_id, "delete_export_volume"):
+                await engine.call(blockstorage_client.delete_volume, volume_record['volume_id'])
+                journal.done(attached_vol_id, "delete_export_volume", volume_record['volume_id'])
+        print("Restored volumes are terminated.")
+        for attached_vol_id, volume_record, result in zip(attached_volume_ids, volume_records, results):
+            # Backups that are part of an incremental chain are kept
+            if (not isinstance(result, Exception) and 'backup_id' in volume_record and not catalog.in_chain(volume_record.get('source_volume_id'), volume_record['backup_id'])
+                    and not journal.is_done(attached_vol_id, "delete_volume_backup")):
+                await engine.call(blockstorage_client.delete_volume_backup, volume_record['backup_id'])
+                journal.done(attached_vol_id, "delete_volume_backup", volume_record['backup_id'])
+        print("Volume backups are terminated.")
+        metrics.stage_finished("cleanup", time.monotonic() - cleanup_started)
+        if not any(isinstance(result, Exception) for result in results):
+            journal.done(instance.id, "instance")
     except oci.exceptions.ServiceError as e:
         send_log_to_oci("ERROR", f"Service error while processing instance {instance.display_name}: {e.message}")
+        report["instance_failures"].append({"instance": instance.display_name, "error": e.message})
     except Exception as e:
         send_log_to_oci("ERROR", f"Unexpected error while processing instance {instance.display_name}: {str(e)}")
+        report["instance_failures"].append({"instance": instance.display_name, "error": str(e)})
 
-# Main function to handle concurrent instance processing
-def main():
-    instances = list_instances_by_tag(compartment_id, tag_key, tag_value)
-    if instances:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(process_instance, instance) for instance in instances]
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    send_log_to_oci("ERROR", f"Error in processing instance: {str(e)}")
-    else:
+# Function to list the device paths a worker can still attach volumes on
+async def list_free_devices(worker_instance):
+    devices = (await engine.call(compute_client.list_instance_devices, instance_id=worker_instance.id, is_available=True)).data
+    return [device.name for device in devices]
+
+worker_pool = WorkerPool.from_workerinfo(scheduler, launch_worker, terminate_worker, workerinfo,
+                                         list_free_devices=list_free_devices, policy=waiter.policy)
+
+# Main function to handle concurrent instance processing. Instances stream in
+# from discovery and every instance workflow runs as a coroutine on the engine.
+async def run_backups():
+    processed = 0
+
+    async def process_counted(instance):
+        nonlocal processed
+        processed += 1
+        try:
+            await process_instance(instance)
+        finally:
+            metrics.write_textfile()
+
+    await terminate_orphaned_workers()
+    await delete_leftover_resources()
+    try:
+        errors = await engine.run(list_instances_by_tag(), process_counted)
+    finally:
+        await worker_pool.close()
+    for error in errors:
+        send_log_to_oci("ERROR", f"Error in processing instance: {str(error)}")
+        report["instance_failures"].append({"instance": None, "error": str(error)})
+    report["instances"] = processed
+    if not processed:
         send_log_to_oci("INFO", "No compute instances with matching tags found")
 
+# The run journal resumes an interrupted run with its original datetime_string,
+# so resumed workflows keep their names and object prefixes. A run with failed
+# volumes is left unfinished, so the next run resumes it and retries their
+# exports on the resources they kept.
+def main():
+    global datetime_string
+    datetime_string = journal.begin_run(datetime_string)
+    if journal.resumed:
+        send_log_to_oci("INFO", f"Resuming interrupted run {datetime_string}")
+    report["started"] = datetime.now().isoformat()
+    metrics.serve()
+    try:
+        asyncio.run(run_backups())
+        if report["volume_failures"] or report["instance_failures"]:
+            send_log_to_oci("INFO", f"Leaving run {datetime_string} unfinished so the next run retries its failed volumes.")
+        else:
+            journal.finish_run()
+    finally:
+        engine.shutdown()
+        metrics.close()
+        # Run report read back by multi_region_backup.py
+        report["finished"] = datetime.now().isoformat()
+        report["rate_limits"] = limiter.snapshot()
+        with open(state_path("run_report.json"), 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
 if __name__ == "__main__":
     try:
         main()
@@ -293,3 +516,4 @@ if __name__ == "__main__":
     finally:
         end_time = datetime.now()
         send_log_to_oci("INFO", f"End time: {end_time}")
+        log_sink.close()
\ No newline at end of file
@@ -1,6 +1,6 @@
 import oci
 import os
-import shutil
+from archive_stream import upload_directory_archive
 
 import subprocess
 
@@ -10,16 +10,8 @@ os_namespace = object_storage_client.get_namespace().data  # Get the Object Stor
 bucket_name = 'meeting_recording'  # Replace with your bucket name
 
 def upload_directory_to_object_storage(object_storage_client, directory_path,object_name, bucket_name):
-    source_dir = directory_path
-    output_zip_file = f'/home/opc/{object_name}'
-    shutil.make_archive(output_zip_file, 'zip', source_dir)
-    #[things to do] - what will happen when you run out of space
-    upload_manager = oci.object_storage.UploadManager(object_storage_client, allow_parallel_uploads=True)
-    upload_manager.upload_file(
-        namespace_name=os_namespace,
-        bucket_name=bucket_name,
-        object_name=f'{object_name}.zip',
-        file_path=f'{output_zip_file}.zip')
+    # Walk, archive, compress and upload as one stream, so no local copy of the volume is needed
+    upload_directory_archive(object_storage_client, os_namespace, bucket_name, f'{object_name}.tar.gz', directory_path)
 
 
 # Create the /mnt_blocks directory if it doesn't exist
@@ -0,0 +1,136 @@
+import gzip
+import threading
+from datetime import datetime, timezone
+import xxhash
+from rate_limiter import paginate
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+READ_SIZE = 8 * 1024 * 1024
+CHUNK_PREFIX = "chunks/"
+CHUNK_INDEX_PREFIX = "chunk-index/"
+
+# Chunk boundaries come from a rolling hash over the last BOUNDARY_BITS bytes:
+# every byte is mapped to one bit by _BIT_TABLE and a chunk ends wherever the
+# bits of the window spell _BOUNDARY, so boundaries follow the content and an
+# insertion only changes the chunks around it. Chunks average
+# 2 ** BOUNDARY_BITS bytes past MIN_CHUNK_SIZE. The table and pattern are
+# derived from xxhash so they never change between runs or Python versions,
+# and the window is matched with bytes.translate/find so chunking runs at
+# memory speed instead of a Python loop per byte.
+BOUNDARY_BITS = 20
+_BIT_TABLE = bytes(xxhash.xxh64_intdigest(bytes([value])) & 1 for value in range(256))
+_BOUNDARY = bytes((xxhash.xxh64_intdigest(b"cra-chunk-boundary") >> bit) & 1 for bit in range(BOUNDARY_BITS))
+
+
+# Split a readable binary stream into content-defined chunks
+def chunks(reader):
+    data = marks = b""
+    position = 0
+    eof = False
+    while True:
+        if not eof and len(data) - position < MAX_CHUNK_SIZE:
+            block = reader.read(READ_SIZE)
+            eof = not block
+            data = data[position:] + block
+            marks = marks[position:] + block.translate(_BIT_TABLE)
+            position = 0
+            continue
+        if position == len(data):
+            return
+        end = min(len(data), position + MAX_CHUNK_SIZE)
+        match = marks.find(_BOUNDARY, position + MIN_CHUNK_SIZE - BOUNDARY_BITS, end)
+        cut = end if match < 0 else match + BOUNDARY_BITS
+        yield data[position:cut]
+        position = cut
+
+
+# Fingerprint of a chunk, also the name of its object in the chunk store
+def chunk_id(chunk):
+    return xxhash.xxh3_128_hexdigest(chunk)
+
+
+# Deduplicated chunk store shared by every snapshot in the bucket: each
+# chunk is stored once as chunks/<fingerprint>, and a file is recorded as
+# the list of its chunk fingerprints. Every volume keeps a chunk index of
+# the fingerprints its snapshots reference, written as a new
+# chunk-index/<volume key>/<UTC time>.gz object after each export (objects
+# are never overwritten in the immutable bucket). load() reads the newest
+# index of the volume, so add() skips the chunks the volume already stored
+# and an unchanged file costs no upload at all. Other chunks are put with
+# If-None-Match, so a chunk some other volume stored is not sent twice.
+class ChunkStore:
+    def __init__(self, upload_engine, prefix=CHUNK_PREFIX, index_prefix=CHUNK_INDEX_PREFIX):
+        self.upload_engine = upload_engine
+        self.prefix = prefix
+        self.index_prefix = index_prefix
+        self.known = set()
+        self.chunks = 0
+        self.bytes = 0
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self._failed = set()
+        self._added = 0
+        self._lock = threading.Lock()
+
+    # Read the newest chunk index of a volume; returns the number of chunks it lists
+    def load(self, volume_key):
+        engine = self.upload_engine
+        self.known = set()
+        self._failed = set()
+        self._added = 0
+        names = [summary.name for summary in paginate(engine.object_storage.list_objects, engine.namespace,
+                                                      engine.bucket_name, prefix=f"{self.index_prefix}{volume_key}/",
+                                                      fields="name", limiter=engine.limiter)]
+        if names:
+            content = engine.object_storage.get_object(engine.namespace, engine.bucket_name, max(names)).data.content
+            self.known = set(gzip.decompress(content).decode("ascii").split())
+        return len(self.known)
+
+    # Write the volume's new chunk index: every chunk loaded or added since
+    # load() that is in the bucket. Call once the volume's uploads are done;
+    # nothing is written when no chunk was added.
+    def save(self, volume_key):
+        if not self._added:
+            return len(self.known)
+        with self._lock:
+            fingerprints = sorted(self.known - self._failed)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        content = gzip.compress("\n".join(fingerprints).encode("ascii"))
+        self.upload_engine.object_storage.put_object(self.upload_engine.namespace, self.upload_engine.bucket_name,
+                                                     f"{self.index_prefix}{volume_key}/{stamp}.gz", content)
+        return len(fingerprints)
+
+    def _uploaded(self, fingerprint, succeeded):
+        if not succeeded:
+            with self._lock:
+                self._failed.add(fingerprint)
+
+    # Chunk a file, upload its new chunks and return its chunk fingerprints
+    def add(self, file_path):
+        chunk_ids = []
+        with open(file_path, 'rb') as file:
+            for chunk in chunks(file):
+                fingerprint = chunk_id(chunk)
+                chunk_ids.append(fingerprint)
+                self.chunks += 1
+                self.bytes += len(chunk)
+                if fingerprint not in self.known:
+                    self.known.add(fingerprint)
+                    self._added += 1
+                    self.new_chunks += 1
+                    self.new_bytes += len(chunk)
+                    self.upload_engine.submit_data(self.prefix + fingerprint, chunk, if_absent=True,
+                                                   callback=lambda succeeded, fingerprint=fingerprint: self._uploaded(fingerprint, succeeded))
+        return chunk_ids
+
+
+# Rebuild a file from its chunks, checking every chunk against its fingerprint
+def restore_chunks(object_storage, namespace, bucket_name, chunk_ids, destination, prefix=CHUNK_PREFIX):
+    with open(destination, 'wb') as file:
+        for fingerprint in chunk_ids:
+            chunk = object_storage.get_object(namespace, bucket_name, prefix + fingerprint).data.content
+            if chunk_id(chunk) != fingerprint:
+                raise ValueError(f"Chunk {fingerprint} of {destination} is corrupt")
+            file.write(chunk)
+    return destination
@@ -4,6 +4,10 @@ import paramiko
 import time
 from datetime import datetime
 import random, string
+from lifecycle_waiter import LifecycleWaiter
+from polling_policy import PollingPolicy
+from inventory import Inventory
+from oci_clients import OciClientFactory
 
 # Get the arguments passed from the main script
 instance_id = sys.argv[1]
@@ -11,11 +15,14 @@ instance_name = sys.argv[2]
 compartment_id = sys.argv[3]
 constants = sys.argv[4:]
 
-signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-compute_client = oci.core.ComputeClient(config={}, signer=signer)
-blockstorage_client = oci.core.BlockstorageClient(config={}, signer=signer)
-object_storage_client = oci.object_storage.ObjectStorageClient(config={}, signer=signer)
-network_client = oci.core.VirtualNetworkClient(config={}, signer=signer)
+clients = OciClientFactory.instance_principals()
+compute_client = clients.client(oci.core.ComputeClient)
+blockstorage_client = clients.client(oci.core.BlockstorageClient)
+object_storage_client = clients.client(oci.object_storage.ObjectStorageClient)
+network_client = clients.client(oci.core.VirtualNetworkClient)
+waiter = LifecycleWaiter(compute_client, blockstorage_client, policy=PollingPolicy())
+inventory = Inventory(compute_client, object_storage_client=object_storage_client)
+waiter.add_listener(inventory.on_lifecycle_event)
 
 # Parse the constants
 constants_dict = {}
@@ -28,20 +35,17 @@ current_datetime = datetime.now()
 datetime_string = current_datetime.strftime("%Y-%m-%d-%H-%M-%S")
 
 # Get the availability domain of the instance
-availability_domain = compute_client.get_instance(instance_id).data.availability_domain
+availability_domain = inventory.availability_domain(instance_id)
 
 # Get the block volume attachments of the instance
-block_volume_info = compute_client.list_volume_attachments(
-    availability_domain=availability_domain, 
-    compartment_id=compartment_id, 
-    instance_id=instance_id
-).data
+block_volume_info = inventory.volume_attachments(compartment_id, instance_id)
 
 # Get the attached volume IDs
 attached_volume_ids = [vol_info.volume_id for vol_info in block_volume_info if vol_info.lifecycle_state == 'ATTACHED']
 
 # Step 1: Create Block Volume Backups
 attached_vol_backup_ocids = []
+backup_sizes = {}
 for attached_vol_id in attached_volume_ids:
     volume_backup_name = f"{instance_name}_{datetime_string}_{''.join(random.choices(string.ascii_letters, k=3))}"
     volume_backup_response = blockstorage_client.create_volume_backup(
@@ -53,18 +57,18 @@ for attached_vol_id in attached_volume_ids:
         )
     ).data
     attached_vol_backup_ocids.append(volume_backup_response.id)
-    print(f"Creating volume backup... Backup OCID: {volume_backup_response.id}")
+    backup_sizes[volume_backup_response.id] = blockstorage_client.get_volume(attached_vol_id).data.size_in_gbs
+    print(f"Creating volume backup... Backup OCID: {volume_backup_response.id}, ETA: {waiter.eta('volume_backup', backup_sizes[volume_backup_response.id])}")
 
 # Wait for backups to complete
-while True:
-    block_vol_backup = all(
-        blockstorage_client.get_volume_backup(vol_backup_id).data.lifecycle_state == "AVAILABLE"
-        for vol_backup_id in attached_vol_backup_ocids
-    )
-    if block_vol_backup:
-        break
-    print("Waiting for block volume backups to complete...")
-    time.sleep(15)
+print("Waiting for block volume backups to complete...")
+backup_futures = [
+    waiter.wait_for("volume_backup", vol_backup_id, "AVAILABLE", compartment_id,
+                    stage="volume_backup", size_in_gbs=backup_sizes[vol_backup_id])
+    for vol_backup_id in attached_vol_backup_ocids
+]
+for backup_future in backup_futures:
+    backup_future.result()
 
 print("Attached volume backups created successfully.")
 
@@ -86,20 +90,20 @@ for attached_vol_backup_id in attached_vol_backup_ocids:
         'volume_id': restored_block_volume.id,
         'instance_name': instance_name,
         'instance_ocid': instance_id,
-        'availability_domain': availability_domain
+        'availability_domain': availability_domain,
+        'size_in_gbs': backup_sizes[attached_vol_backup_id]
     })
     print(f"Restoring block volume from backup... Volume OCID: {restored_block_volume.id}")
 
 # Wait until the volumes are available
-while True:
-    block_volume_statuses = [
-        blockstorage_client.get_volume(vol['volume_id']).data.lifecycle_state
-        for vol in restored_volumes
-    ]
-    if all(status == "AVAILABLE" for status in block_volume_statuses):
-        break
-    print("Waiting for restored block volumes to become available...")
-    time.sleep(10)
+print("Waiting for restored block volumes to become available...")
+volume_futures = [
+    waiter.wait_for("volume", vol['volume_id'], "AVAILABLE", compartment_id,
+                    stage="volume_restore", size_in_gbs=vol['size_in_gbs'])
+    for vol in restored_volumes
+]
+for volume_future in volume_futures:
+    volume_future.result()
 
 print("Volumes restored successfully.")
 
@@ -132,12 +136,8 @@ new_instance = compute_client.launch_instance(instance_details).data
 print(f"Launching new instance... Instance OCID: {new_instance.id}")
 
 # Wait until the instance is running
-while True:
-    instance_status = compute_client.get_instance(new_instance.id).data.lifecycle_state
-    if instance_status == "RUNNING":
-        break
-    print("Waiting for instance to become available...")
-    time.sleep(15)
+print(f"Waiting for instance to become available... ETA: {waiter.eta('instance_launch')}")
+waiter.wait("instance", new_instance.id, "RUNNING", compartment_id, stage="instance_launch")
 
 print("New instance is running.")
 
@@ -152,12 +152,8 @@ for volume_data in restored_volumes:
     print(f"Attaching volume {volume_data['volume_id']} from instance {volume_data['instance_name']} to new instance {new_instance.display_name}")
 
     # Wait for attachment to complete
-    while True:
-        attachment_status = compute_client.get_volume_attachment(attach_response.id).data.lifecycle_state
-        if attachment_status == "ATTACHED":
-            break
-        print(f"Waiting for volume {volume_data['volume_id']} to attach...")
-        time.sleep(10)
+    print(f"Waiting for volume {volume_data['volume_id']} to attach...")
+    waiter.wait("volume_attachment", attach_response.id, "ATTACHED", compartment_id, stage="volume_attach")
 
     print(f"Volume {volume_data['volume_id']} attached successfully.")
 
@@ -201,14 +197,8 @@ ssh.close()
 # Cleanup: Terminate the temporary instance and delete the restored volume
 compute_client.terminate_instance(new_instance.id, preserve_boot_volume=False)
 print(f"Terminating temporary instance... Instance OCID: {new_instance.id}")
-while True:
-    instance = compute_client.get_instance(new_instance.id).data
-    if instance.lifecycle_state == 'TERMINATED':
-        print("Instance is terminated.")
-        break
-    else:
-        print(f"Current state: {instance.lifecycle_state}. Waiting for termination...")
-        time.sleep(10)  # Wait for 10 seconds before checking again
+waiter.wait("instance", new_instance.id, "TERMINATED", compartment_id, stage="instance_terminate")
+print("Instance is terminated.")
 
 # Delete the attached volume backups
 for volume_data in restored_volumes:
@@ -2,6 +2,9 @@ import oci
 import time
 from datetime import datetime
 import random, string
+from lifecycle_waiter import LifecycleWaiter
+from polling_policy import PollingPolicy
+from inventory import Inventory
 
 # Initialize the default config
 compartment_id = "ocid1.compartment.oc1..aaaaaaaafklcekq7wnwrt4zxeizcrmvhltz6wxaqzwksbhbs73yz6mtpi5za"
@@ -12,6 +15,9 @@ object_storage_client = oci.object_storage.ObjectStorageClient(config)
 compute_client = oci.core.ComputeClient(config)
 blockstorage_client = oci.core.BlockstorageClient(config)
 network_client = oci.core.VirtualNetworkClient(config)
+waiter = LifecycleWaiter(compute_client, blockstorage_client, policy=PollingPolicy())
+inventory = Inventory(compute_client, object_storage_client=object_storage_client)
+waiter.add_listener(inventory.on_lifecycle_event)
 
 '''
 signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
@@ -79,14 +85,7 @@ def upload_file_to_object_storage(file_path, object_name):
     print(f"File {object_name} uploaded to Object Storage")
 
 def list_instances_by_tag(compartment_id, tag_key, tag_value):
-    instances = compute_client.list_instances(compartment_id).data
-    filtered_instances = []
-    for instance in instances:
-        instance_tags = instance.freeform_tags
-        if tag_key in instance_tags and instance_tags[tag_key] == tag_value:
-            filtered_instances.append(instance)
-
-    return filtered_instances
+    return list(inventory.instances_by_tag(compartment_id, tag_key, tag_value))
 
 instances = list_instances_by_tag(compartment_id, tag_key, tag_value)
 
@@ -102,10 +101,12 @@ for instance in instances:
 
     # Step 1: Create Boot Volume and Block Volume Backups
     availability_domain = instance.availability_domain
-    boot_volume_info = compute_client.list_boot_volume_attachments(availability_domain, instance.compartment_id, instance_id=instance.id).data
-    block_volume_info = compute_client.list_volume_attachments(availability_domain=availability_domain, compartment_id=compartment_id, instance_id=instance.id).data
+    boot_volume_info = inventory.boot_volume_attachments(instance.compartment_id, availability_domain, instance.id)
+    block_volume_info = inventory.volume_attachments(compartment_id, instance.id)
     boot_volume_id = boot_volume_info[0].boot_volume_id
     attached_volume_ids = [vol_info.volume_id for vol_info in block_volume_info if vol_info.lifecycle_state == 'ATTACHED']
+    boot_volume_size = blockstorage_client.get_boot_volume(boot_volume_id).data.size_in_gbs
+    backup_sizes = {}
 
     boot_volume_backup_response = blockstorage_client.create_boot_volume_backup(
         create_boot_volume_backup_details=oci.core.models.CreateBootVolumeBackupDetails(
@@ -129,19 +130,20 @@ for instance in instances:
             )
         ).data       
         attached_vol_backup_ocid.append(Attached_volume_backup_response.id)
+        backup_sizes[Attached_volume_backup_response.id] = blockstorage_client.get_volume(attached_vol_id).data.size_in_gbs
         print(f"Creating volume backup... Backup OCID: {Attached_volume_backup_response.id}")
 
     # Wait until the boot volume backup and block volume backups are available
-    while True:
-        backup_status = blockstorage_client.get_boot_volume_backup(boot_volume_backup_response.id).data.lifecycle_state
-        block_vol_backup = all(
-            blockstorage_client.get_volume_backup(vol_backup_id).data.lifecycle_state == "AVAILABLE"
-            for vol_backup_id in attached_vol_backup_ocid
-        )
-        if backup_status == "AVAILABLE" and block_vol_backup:
-            break
-        print("Waiting for boot volume and block volume backups to complete...")
-        time.sleep(15)
+    print(f"Waiting for boot volume and block volume backups to complete... ETA: {waiter.eta('boot_volume_backup', boot_volume_size)}")
+    backup_futures = [waiter.wait_for("boot_volume_backup", boot_volume_backup_response.id, "AVAILABLE", instance.compartment_id,
+                                      stage="boot_volume_backup", size_in_gbs=boot_volume_size)]
+    backup_futures += [
+        waiter.wait_for("volume_backup", vol_backup_id, "AVAILABLE", compartment_id,
+                        stage="volume_backup", size_in_gbs=backup_sizes[vol_backup_id])
+        for vol_backup_id in attached_vol_backup_ocid
+    ]
+    for backup_future in backup_futures:
+        backup_future.result()
 
     print("Boot volume and attached volume backups created successfully.")
 
@@ -176,16 +178,16 @@ for instance in instances:
         print(f"Restoring block volume from backup... Volume OCID: {restored_block_volume.id}")
 
     # Wait until the volumes are available
-    while True:
-        boot_volume_status = blockstorage_client.get_boot_volume(restored_boot_volume.id).data.lifecycle_state
-        block_volume_statuses = [
-            blockstorage_client.get_volume(vol.id).data.lifecycle_state
-            for vol in restored_block_volumes
-        ]
-        if boot_volume_status == "AVAILABLE" and all(status == "AVAILABLE" for status in block_volume_statuses):
-            break
-        print("Waiting for all volumes to become available...")
-        time.sleep(10)
+    print(f"Waiting for all volumes to become available... ETA: {waiter.eta('boot_volume_restore', boot_volume_size)}")
+    volume_futures = [waiter.wait_for("boot_volume", restored_boot_volume.id, "AVAILABLE", compartment_id,
+                                      stage="boot_volume_restore", size_in_gbs=boot_volume_size)]
+    volume_futures += [
+        waiter.wait_for("volume", vol.id, "AVAILABLE", compartment_id,
+                        stage="volume_restore", size_in_gbs=vol.size_in_gbs)
+        for vol in restored_block_volumes
+    ]
+    for volume_future in volume_futures:
+        volume_future.result()
 
     print("Volumes restored successfully.")
 
@@ -215,12 +217,8 @@ for instance in instances:
     print(f"Launching temporary instance... Instance OCID: {instance.id}")
 
     # Wait until the instance is running
-    while True:
-        instance_status = compute_client.get_instance(instance.id).data.lifecycle_state
-        if instance_status == "RUNNING":
-            break
-        print("Waiting for instance to become available...")
-        time.sleep(15)
+    print(f"Waiting for instance to become available... ETA: {waiter.eta('instance_launch')}")
+    waiter.wait("instance", instance.id, "RUNNING", compartment_id, stage="instance_launch")
 
     print("Instance is running.")
     # Step 4: Attach Restored Block Volumes to the Temporary Instance
@@ -234,12 +232,8 @@ for instance in instances:
         print(f"Attaching block volume... Volume OCID: {restored_block_volume.id}")
 
         # Wait for attachment to complete
-        while True:
-            attachment_status = compute_client.get_volume_attachment(attach_response.id).data.lifecycle_state
-            if attachment_status == "ATTACHED":
-                break
-            print("Waiting for block volume to attach...")
-            time.sleep(10)
+        print("Waiting for block volume to attach...")
+        waiter.wait("volume_attachment", attach_response.id, "ATTACHED", compartment_id, stage="volume_attach")
 
         print("Block volume attached successfully.")    
 
@@ -257,12 +251,8 @@ for instance in instances:
     print(f"Creating custom image... Image OCID: {custom_image.id}")
 
     # Wait until the image is available
-    while True:
-        image_status = compute_client.get_image(custom_image.id).data.lifecycle_state
-        if image_status == "AVAILABLE":
-            break
-        print("Waiting for custom image to become available...")
-        time.sleep(20)
+    print(f"Waiting for custom image to become available... ETA: {waiter.eta('image_create', boot_volume_size)}")
+    waiter.wait("image", custom_image.id, "AVAILABLE", compartment_id, stage="image_create", size_in_gbs=boot_volume_size)
 
     print("Custom image created successfully.")
     time.sleep(60)
@@ -280,12 +270,8 @@ for instance in instances:
     print(f"Exporting image to Object Storage... Bucket: {bucket_name}, Object: {object_name}")
 
     # Wait for the export to complete (this can take some time depending on the image size)
-    while True:
-        image_export_status = compute_client.get_image(custom_image.id).data.lifecycle_state
-        if image_export_status == "AVAILABLE":
-            break
-        print("Waiting for image export to complete...")
-        time.sleep(30)
+    print(f"Waiting for image export to complete... ETA: {waiter.eta('image_export', boot_volume_size)}")
+    waiter.wait("image", custom_image.id, "AVAILABLE", compartment_id, stage="image_export", size_in_gbs=boot_volume_size)
 
     print("Image exported to Object Storage successfully.")
 
@@ -306,14 +292,8 @@ for instance in instances:
     compute_client.terminate_instance(instance.id, preserve_boot_volume=False)
     print(f"Terminating temporary instance... Instance OCID: {instance.id}")
     # Wait for the instance to be terminated
-    while True:
-        instance = compute_client.get_instance(instance.id).data
-        if instance.lifecycle_state == 'TERMINATED':
-            print("Instance is terminated.")
-            break
-        else:
-            print(f"Current state: {instance.lifecycle_state}. Waiting for termination...")
-            time.sleep(10)  # Wait for 10 seconds before checking again
+    waiter.wait("instance", instance.id, "TERMINATED", compartment_id, stage="instance_terminate")
+    print("Instance is terminated.")
 
     # Delete the custom image
     compute_client.delete_image(custom_image.id)
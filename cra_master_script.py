@@ -1,6 +1,7 @@
 import oci
 import sys
 import subprocess
+from inventory import Inventory
 
 # Define constants
 constants = [
@@ -19,16 +20,11 @@ signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
 object_storage = oci.object_storage.ObjectStorageClient(config={}, signer=signer) 
 compute_client = oci.core.ComputeClient(config={}, signer=signer)
 blockstorage_client = oci.core.BlockstorageClient(config={}, signer=signer)
+inventory = Inventory(compute_client, object_storage_client=object_storage)
 
 # Function to list instances by tag
 def list_instances_by_tag(compartment_id, tag_key, tag_value):
-    instances = compute_client.list_instances(compartment_id).data
-    filtered_instances = []
-    for instance in instances:
-        instance_tags = instance.freeform_tags
-        if tag_key in instance_tags and instance_tags[tag_key] == tag_value and instance.lifecycle_state != 'TERMINATED':
-            filtered_instances.append(instance)
-    return filtered_instances
+    return list(inventory.instances_by_tag(compartment_id, tag_key, tag_value))
 
 # List instances by tag
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import time
 import json
 import xxhash  # make sure XX hash is installed
@@ -11,14 +12,21 @@ metadata_file = "/home/opc/file_metadata.json"
 ignore_extensions = [".tmp", ".log"]  # Add extensions you want to ignore
 ignore_folders = ["ignoredir", "testmt^Cgnoredir"]  # Add folder names to ignore
 
+# Stat fields that must all match the baseline for a file to be taken as unchanged without hashing it
+STAT_FIELDS = ("size", "mtime_ns", "inode", "ctime_ns")
+
 def calculate_xxhash(file_path):
     hash_xx = xxhash.xxh64()  
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
             hash_xx.update(chunk)
     return hash_xx.hexdigest()
 
-def get_file_metadata(path):
+# Walk path and collect the stat fields and xxhash of every file. A file whose
+# stat fields match its baseline entry keeps the baseline xxhash, so only new
+# and touched files are read; verify=True hashes every file regardless.
+def get_file_metadata(path, ignore_extensions=ignore_extensions, ignore_folders=ignore_folders, baseline=None, verify=False):
+    baseline = baseline or {}
     file_metadata = {}
     ignored_files = []
     ignored_dirs = []
@@ -35,9 +43,15 @@ def get_file_metadata(path):
                 continue
             
             file_path = os.path.join(root, name)
-            timestamp = os.path.getmtime(file_path)
-            xxhash_value = calculate_xxhash(file_path)
-            file_metadata[file_path] = {"timestamp": timestamp, "xxhash": xxhash_value}
+            stat = os.stat(file_path)
+            current_data = {"timestamp": stat.st_mtime, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                            "inode": stat.st_ino, "ctime_ns": stat.st_ctime_ns}
+            prev_data = baseline.get(file_path)
+            if not verify and prev_data and all(prev_data.get(field) == current_data[field] for field in STAT_FIELDS):
+                current_data["xxhash"] = prev_data["xxhash"]
+            else:
+                current_data["xxhash"] = calculate_xxhash(file_path)
+            file_metadata[file_path] = current_data
     
     return file_metadata, ignored_files, ignored_dirs
 
@@ -56,27 +70,44 @@ def load_metadata(file_path):
             return json.load(f)
     return {}
 
-# Step 1: Load previous metadata or create a new baseline
-previous_metadata = load_metadata(metadata_file).get("file_metadata", {})
-current_metadata, ignored_files, ignored_dirs = get_file_metadata(volume_mount_path)
-
-# Step 2: Check for changes
-modified_files = []
-for file_path, current_data in current_metadata.items():
-    prev_data = previous_metadata.get(file_path)
-    if not prev_data:
-        # New file
-        modified_files.append(file_path)
-    elif prev_data["timestamp"] != current_data["timestamp"]:
-        # Check xxhash if timestamp differs
-        if prev_data["xxhash"] != current_data["xxhash"]:
+# New files, and files whose xxhash differs from the baseline
+def find_modified_files(previous_metadata, current_metadata):
+    modified_files = []
+    for file_path, current_data in current_metadata.items():
+        prev_data = previous_metadata.get(file_path)
+        if not prev_data:
+            # New file
             modified_files.append(file_path)
+        elif prev_data["xxhash"] != current_data["xxhash"]:
+            # Files with unchanged stat fields carry the baseline xxhash, so only
+            # hashed files (or all of them when verifying) can differ here
+            modified_files.append(file_path)
+    return modified_files
+
+# Files in the baseline that are gone from the volume
+def find_deleted_files(previous_metadata, current_metadata):
+    return [file_path for file_path in previous_metadata if file_path not in current_metadata]
+
+def main(verify=False):
+    # Step 1: Load previous metadata or create a new baseline; only files whose stat changed are hashed
+    previous_metadata = load_metadata(metadata_file).get("file_metadata", {})
+    current_metadata, ignored_files, ignored_dirs = get_file_metadata(volume_mount_path, baseline=previous_metadata, verify=verify)
+
+    # Step 2: Check for changes
+    modified_files = find_modified_files(previous_metadata, current_metadata)
+    deleted_files = find_deleted_files(previous_metadata, current_metadata)
+
+    # Step 3: Output modified files
+    if modified_files:
+        print("Modified files:", modified_files)
+    else:
+        print("No files modified.")
+    if deleted_files:
+        print("Deleted files:", deleted_files)
 
-# Step 3: Output modified files
-if modified_files:
-    print("Modified files:", modified_files)
-else:
-    print("No files modified.")
+    # Step 4: Update metadata baseline including ignored files and directories
+    save_metadata(current_metadata, ignored_files, ignored_dirs, metadata_file)
 
-# Step 4: Update metadata baseline including ignored files and directories
-save_metadata(current_metadata, ignored_files, ignored_dirs, metadata_file)
+if __name__ == "__main__":
+    # --verify re-hashes every file, e.g. from a weekly job, to catch changes that kept their stat fields
+    main(verify="--verify" in sys.argv[1:])
@@ -0,0 +1,171 @@
+import logging
+import oci
+from rate_limiter import paginate
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_STATES = ("TERMINATING", "TERMINATED")
+
+
+# Compartment OCIDs from compartmentinfo that discovery should start from.
+# Unset entries in configuration.json are left as the bare "ocid1.compartment.oc1.."
+# prefix and are skipped.
+def discovery_roots(compartmentinfo):
+    roots = []
+    for key in ("parentocid", "appsocids", "vaultocid", "cleanroomocid"):
+        for ocid in (compartmentinfo.get(key) or "").split(","):
+            ocid = ocid.strip()
+            if ocid and not ocid.endswith("..") and ocid not in roots:
+                roots.append(ocid)
+    return roots
+
+
+# All active compartments under the given roots, roots included. With the
+# tenancy OCID this is one paginated list of every compartment of the tenancy,
+# narrowed down by ancestry. ListCompartments only accepts
+# compartment_id_in_subtree on the tenancy, so without it the subtrees are
+# walked with one list call per compartment.
+def subtree_compartments(identity_client, root_compartment_ids, limiter=None, tenancy_id=None):
+    if tenancy_id:
+        compartments = paginate(identity_client.list_compartments, tenancy_id, compartment_id_in_subtree=True,
+                                access_level="ANY", lifecycle_state="ACTIVE", limiter=limiter)
+        parents = {compartment.id: compartment.compartment_id for compartment in compartments}
+        roots = set(root_compartment_ids)
+        found = list(root_compartment_ids)
+        for compartment_id in parents:
+            ancestor = parents[compartment_id]
+            while ancestor is not None and ancestor not in roots:
+                ancestor = parents.get(ancestor)
+            if ancestor is not None and compartment_id not in roots:
+                found.append(compartment_id)
+        return found
+
+    found = list(root_compartment_ids)
+    queue = list(root_compartment_ids)
+    while queue:
+        parent_id = queue.pop(0)
+        children = paginate(identity_client.list_compartments, parent_id, lifecycle_state="ACTIVE", limiter=limiter)
+        for child in children:
+            if child.id not in found:
+                found.append(child.id)
+                queue.append(child.id)
+    return found
+
+
+# Interface of the instance discovery used by the orchestrators. An instance
+# is selected for backup if it carries the freeform tag tag_key=tag_value or
+# the defined tag tag_namespace.tag_name set to true, anywhere in the
+# compartment subtrees under root_compartment_ids (listed in one call when
+# tenancy_id is known, see subtree_compartments). discover() yields
+# oci.core.models.Instance objects (with at least id, display_name,
+# compartment_id, availability_domain, lifecycle_state and tags set).
+class InstanceDiscovery:
+    def __init__(self, root_compartment_ids, tag_key, tag_value, tag_namespace=None, tag_name=None, tenancy_id=None):
+        self.root_compartment_ids = root_compartment_ids
+        self.tenancy_id = tenancy_id
+        self.tag_key = tag_key
+        self.tag_value = tag_value
+        self.tag_namespace = tag_namespace
+        self.tag_name = tag_name
+
+    def discover(self):
+        raise NotImplementedError
+
+    def is_selected(self, freeform_tags, defined_tags):
+        if (freeform_tags or {}).get(self.tag_key) == self.tag_value:
+            return True
+        if self.tag_namespace and self.tag_name:
+            value = (defined_tags or {}).get(self.tag_namespace, {}).get(self.tag_name)
+            return str(value).lower() == "true"
+        return False
+
+
+# Discovery through the Resource Search service: one paginated structured
+# query covers every compartment the principal can read, and the results are
+# narrowed down to the configured compartment subtrees.
+class SearchDiscovery(InstanceDiscovery):
+    def __init__(self, search_client, identity_client, root_compartment_ids, tag_key, tag_value,
+                 tag_namespace=None, tag_name=None, limiter=None, tenancy_id=None):
+        super().__init__(root_compartment_ids, tag_key, tag_value, tag_namespace, tag_name, tenancy_id)
+        self.search_client = search_client
+        self.identity_client = identity_client
+        self.limiter = limiter
+
+    def query(self):
+        conditions = [f"(freeformTags.key = '{self.tag_key}' && freeformTags.value = '{self.tag_value}')"]
+        if self.tag_namespace and self.tag_name:
+            conditions.append(f"(definedTags.namespace = '{self.tag_namespace}' && definedTags.key = '{self.tag_name}')")
+        return f"query instance resources where {' || '.join(conditions)}"
+
+    def discover(self):
+        compartments = set(subtree_compartments(self.identity_client, self.root_compartment_ids, self.limiter,
+                                                self.tenancy_id))
+        details = oci.resource_search.models.StructuredSearchDetails(type="Structured", query=self.query())
+        for resource in paginate(self.search_client.search_resources, details, limiter=self.limiter):
+            if (resource.compartment_id in compartments and
+                    resource.lifecycle_state not in SKIPPED_STATES and
+                    self.is_selected(resource.freeform_tags, resource.defined_tags)):
+                yield oci.core.models.Instance(
+                    id=resource.identifier,
+                    display_name=resource.display_name,
+                    compartment_id=resource.compartment_id,
+                    availability_domain=resource.availability_domain,
+                    lifecycle_state=resource.lifecycle_state,
+                    freeform_tags=resource.freeform_tags,
+                    defined_tags=resource.defined_tags)
+
+
+# Discovery by listing the instances of every compartment in the subtrees,
+# for principals that cannot use Resource Search
+class CompartmentScanDiscovery(InstanceDiscovery):
+    def __init__(self, inventory, identity_client, root_compartment_ids, tag_key, tag_value,
+                 tag_namespace=None, tag_name=None, tenancy_id=None):
+        super().__init__(root_compartment_ids, tag_key, tag_value, tag_namespace, tag_name, tenancy_id)
+        self.inventory = inventory
+        self.identity_client = identity_client
+
+    def discover(self):
+        for compartment_id in subtree_compartments(self.identity_client, self.root_compartment_ids, self.inventory.limiter,
+                                                   self.tenancy_id):
+            for instance in self.inventory.iter_instances(compartment_id):
+                if (instance.lifecycle_state not in SKIPPED_STATES and
+                        self.is_selected(instance.freeform_tags, instance.defined_tags)):
+                    yield instance
+
+
+# Use the primary discovery, switching to the fallback if the primary fails
+# before it has produced any instance
+class FallbackDiscovery(InstanceDiscovery):
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def discover(self):
+        produced = False
+        try:
+            for instance in self.primary.discover():
+                produced = True
+                yield instance
+        except oci.exceptions.ServiceError as e:
+            if produced:
+                raise
+            logger.warning(f"{type(self.primary).__name__} failed ({e.message}), falling back to {type(self.fallback).__name__}")
+            yield from self.fallback.discover()
+
+
+# Search-based discovery with a compartment-scan fallback, configured from
+# compartmentinfo and cratagginginfo. compartmentinfo.tenancyocid is optional,
+# left unset the compartment subtrees are walked.
+def discovery_from_config(config_data, search_client, identity_client, inventory, tag_key, tag_value):
+    roots = discovery_roots(config_data["compartmentinfo"])
+    tenancy_id = (config_data["compartmentinfo"].get("tenancyocid") or "").strip()
+    if tenancy_id.endswith(".."):
+        tenancy_id = None
+    tagginginfo = config_data.get("cratagginginfo") or {}
+    tag_namespace = tagginginfo.get("namespace") or None
+    tag_name = tagginginfo.get("backupenabledtagname") or None
+    return FallbackDiscovery(
+        SearchDiscovery(search_client, identity_client, roots, tag_key, tag_value, tag_namespace, tag_name,
+                        limiter=inventory.limiter, tenancy_id=tenancy_id or None),
+        CompartmentScanDiscovery(inventory, identity_client, roots, tag_key, tag_value, tag_namespace, tag_name,
+                                 tenancy_id=tenancy_id or None))
@@ -0,0 +1,754 @@
+import time
+import random
+import hashlib
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import oci
+from oci._vendor import requests
+import paramiko
+import oci_clients
+
+# In-process stand-in for the OCI services the backup scripts use, for
+# benchmarking orchestration changes offline. Resources move through their
+# lifecycle states after latencies drawn per resource: a (fixed seconds,
+# seconds per GB) model of its own, deliberately not the one PollingPolicy
+# starts from, skewed so large volumes take longer per GB and scaled by
+# log-normal jitter. API calls can be throttled or fail at configurable
+# rates, and Object Storage keeps what is uploaded so restores and
+# incremental exports can run against it. All latencies are in simulated
+# seconds; time_scale converts them to real seconds, so with time_scale=0.001
+# a one hour backup finishes in 3.6 real seconds.
+
+# (fixed seconds, seconds per GB) of every simulated stage at REFERENCE_GBS
+STAGE_LATENCIES = {
+    "volume_backup": (90, 4.0),
+    "boot_volume_backup": (90, 4.5),
+    "volume_restore": (45, 0.3),
+    "boot_volume_restore": (45, 0.3),
+    "volume_clone": (20, 0.1),
+    "instance_launch": (75, 0.0),
+    "volume_attach": (15, 0.0),
+    "volume_detach": (25, 0.0),
+    "image_create": (150, 8.0),
+    "image_export": (100, 18.0),
+    "instance_terminate": (45, 0.0),
+    "volume_upload": (20, 24.0),
+}
+REFERENCE_GBS = 100
+# Sigma of the log-normal factor every duration is multiplied by
+DEFAULT_JITTER = 0.25
+# Seconds per GB grow with (size / REFERENCE_GBS) ** size_skew
+DEFAULT_SIZE_SKEW = 0.15
+DEFAULT_API_LATENCY = 0.1
+DEFAULT_PAGE_SIZE = 100
+GB = 1024 ** 3
+DEVICE_NAMES = [f"/dev/oracleoci/oraclevd{letter}" for letter in "bcdefghijklmnopqrstuvwxyz"] + \
+               [f"/dev/oracleoci/oraclevda{letter}" for letter in "abcdefg"]
+# Sleeps of the simulator itself; callers may patch time.sleep
+_sleep = time.sleep
+
+
+# Model of the given class with the attributes it supports, so one set of
+# attributes can build volumes, backups and boot volumes alike
+def _model(model_class, **attributes):
+    supported = model_class().swagger_types
+    return model_class(**{name: value for name, value in attributes.items() if name in supported})
+
+
+class _Response:
+    def __init__(self, data, next_page=None, headers=None):
+        self.data = data
+        self.next_page = next_page
+        self.has_next_page = next_page is not None
+        self.headers = headers or {}
+        self.status = 200
+        self.request = None
+        self.request_id = None
+
+
+# A simulated resource: its model plus the lifecycle transitions still to come,
+# as (simulated time, state) pairs applied whenever the resource is read
+class _Resource:
+    def __init__(self, kind, model, transitions=()):
+        self.kind = kind
+        self.model = model
+        self.transitions = list(transitions)
+
+    def refresh(self, now):
+        while self.transitions and self.transitions[0][0] <= now:
+            self.model.lifecycle_state = self.transitions.pop(0)[1]
+        return self.model
+
+
+# State of the simulated tenancy shared by all fake clients
+class FakeCloud:
+    def __init__(self, time_scale=0.001, latencies=None, api_latency=DEFAULT_API_LATENCY, throttle_rates=None,
+                 failure_rates=None, default_failure_rate=0.0, page_size=DEFAULT_PAGE_SIZE, seed=0,
+                 jitter=DEFAULT_JITTER, size_skew=DEFAULT_SIZE_SKEW, immutable_buckets=()):
+        self.time_scale = time_scale
+        self.latencies = {**STAGE_LATENCIES, **(latencies or {})}
+        self.jitter = jitter
+        self.size_skew = size_skew
+        self.api_latency = api_latency
+        self.throttle_rates = throttle_rates or {}
+        self.failure_rates = failure_rates or {}
+        self.default_failure_rate = default_failure_rate
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        # put_object calls made by the simulated workers, kept apart from the orchestrator's calls
+        self.worker_uploads = 0
+        self.throttled = Counter()
+        self.failed = Counter()
+        self.uploaded_bytes = 0
+        self.resources = {}
+        self._by_kind = {}
+        # Object Storage contents: {(bucket, object name): bytes}; overwriting
+        # an object in one of immutable_buckets fails like a retention rule
+        self.objects = {}
+        self.immutable_buckets = set(immutable_buckets)
+        self.multipart_uploads = {}
+        self._buckets = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._started = time.monotonic()
+
+    # Simulated seconds since the cloud was created
+    def now(self):
+        return (time.monotonic() - self._started) / self.time_scale
+
+    # A fresh draw of how long stage takes for a resource of size_in_gbs
+    def duration(self, stage, size_in_gbs=0):
+        fixed, per_gb = self.latencies.get(stage, (0, 0))
+        size = size_in_gbs or 0
+        with self._lock:
+            noise = self.random.lognormvariate(0, self.jitter) if self.jitter else 1.0
+        return (fixed + per_gb * size * (max(size, 1) / REFERENCE_GBS) ** self.size_skew) * noise
+
+    def new_id(self, kind):
+        return f"ocid1.{kind}.oc1.fake.{next(self._ids):08d}"
+
+    # Account for one API call: latency, throttling and injected failures
+    def api(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            rate = self.throttle_rates.get(operation)
+            if rate:
+                now = self.now()
+                tokens, refilled = self._buckets.get(operation, (max(1.0, rate), now))
+                tokens = min(max(1.0, rate), tokens + (now - refilled) * rate)
+                if tokens < 1:
+                    self._buckets[operation] = (tokens, now)
+                    self.throttled[operation] += 1
+                    raise oci.exceptions.ServiceError(429, "TooManyRequests", {}, f"{operation} throttled by fake OCI")
+                self._buckets[operation] = (tokens - 1, now)
+            if self.random.random() < self.failure_rates.get(operation, self.default_failure_rate):
+                self.failed[operation] += 1
+                raise oci.exceptions.ServiceError(500, "InternalServerError", {}, f"{operation} failed in fake OCI")
+        if self.api_latency:
+            _sleep(self.api_latency * self.time_scale)
+
+    def add(self, kind, model, transitions=()):
+        resource = _Resource(kind, model, transitions)
+        with self._lock:
+            self.resources[model.id] = resource
+            self._by_kind.setdefault(kind, []).append(resource)
+        return model
+
+    # Schedule state changes of an existing resource, starting now
+    def transition(self, resource_id, *steps):
+        with self._lock:
+            resource = self.get(resource_id)
+            at = self.now()
+            resource.transitions = []
+            for state, seconds in steps:
+                at += seconds
+                resource.transitions.append((at, state))
+            return resource.refresh(self.now())
+
+    def get(self, resource_id, kind=None):
+        with self._lock:
+            resource = self.resources.get(resource_id)
+            if resource is None or (kind and resource.kind != kind):
+                raise oci.exceptions.ServiceError(404, "NotAuthorizedOrNotFound", {}, f"{resource_id} not found")
+            resource.refresh(self.now())
+            return resource
+
+    def model(self, resource_id, kind=None):
+        return self.get(resource_id, kind).model
+
+    def list(self, kind, **filters):
+        with self._lock:
+            now = self.now()
+            models = [resource.refresh(now) for resource in self._by_kind.get(kind, [])]
+        return [model for model in models
+                if all(value is None or getattr(model, name) == value for name, value in filters.items())]
+
+    def page(self, items, page=None, limit=None):
+        start = int(page or 0)
+        size = limit or self.page_size
+        next_page = str(start + size) if start + size < len(items) else None
+        return _Response(items[start:start + size], next_page)
+
+    # Active compartment under parent_id (a compartment or the tenancy)
+    def add_compartment(self, parent_id, compartment_id=None, name=None):
+        compartment_id = compartment_id or self.new_id("compartment")
+        return self.add("compartment", oci.identity.models.Compartment(
+            id=compartment_id, compartment_id=parent_id, name=name or compartment_id, lifecycle_state="ACTIVE"))
+
+    # Synthetic fleet: running instances tagged for backup, each with a boot
+    # volume and volumes_per_instance attached block volumes of random size
+    def add_fleet(self, instance_count, compartment_id, availability_domains=("FAKE:AD-1", "FAKE:AD-2", "FAKE:AD-3"),
+                  volumes_per_instance=(1, 3), volume_sizes=(50, 1024), boot_volume_size=50, freeform_tags=None):
+        instances = []
+        for index in range(instance_count):
+            availability_domain = availability_domains[index % len(availability_domains)]
+            instance = self.add("instance", oci.core.models.Instance(
+                id=self.new_id("instance"), display_name=f"fleet-{index:05d}", compartment_id=compartment_id,
+                availability_domain=availability_domain, lifecycle_state="RUNNING", shape="VM.Standard.E4.Flex",
+                freeform_tags=dict(freeform_tags or {}), defined_tags={}))
+            boot_volume = self.add("boot_volume", oci.core.models.BootVolume(
+                id=self.new_id("bootvolume"), display_name=f"fleet-{index:05d}-boot", compartment_id=compartment_id,
+                availability_domain=availability_domain, size_in_gbs=boot_volume_size, lifecycle_state="AVAILABLE"))
+            self.add("boot_volume_attachment", oci.core.models.BootVolumeAttachment(
+                id=self.new_id("bootvolumeattachment"), instance_id=instance.id, boot_volume_id=boot_volume.id,
+                compartment_id=compartment_id, availability_domain=availability_domain, lifecycle_state="ATTACHED"))
+            for device in DEVICE_NAMES[:self.random.randint(*volumes_per_instance)]:
+                volume = self.add("volume", oci.core.models.Volume(
+                    id=self.new_id("volume"), display_name=f"fleet-{index:05d}-{device[-1]}", compartment_id=compartment_id,
+                    availability_domain=availability_domain, size_in_gbs=self.random.randint(*volume_sizes),
+                    lifecycle_state="AVAILABLE"))
+                self.add("volume_attachment", oci.core.models.ParavirtualizedVolumeAttachment(
+                    id=self.new_id("volumeattachment"), instance_id=instance.id, volume_id=volume.id, device=device,
+                    compartment_id=compartment_id, availability_domain=availability_domain, lifecycle_state="ATTACHED",
+                    attachment_type="paravirtualized"))
+            self.add_vnic(instance)
+            instances.append(instance)
+        return instances
+
+    def add_vnic(self, instance):
+        vnic = self.add("vnic", oci.core.models.Vnic(
+            id=self.new_id("vnic"), compartment_id=instance.compartment_id, lifecycle_state="AVAILABLE",
+            public_ip=f"10.{(len(self.resources) >> 16) & 255}.{(len(self.resources) >> 8) & 255}.{len(self.resources) & 255}",
+            private_ip="10.0.0.1"))
+        self.add("vnic_attachment", oci.core.models.VnicAttachment(
+            id=self.new_id("vnicattachment"), instance_id=instance.id, vnic_id=vnic.id,
+            compartment_id=instance.compartment_id, availability_domain=instance.availability_domain,
+            lifecycle_state="ATTACHED"))
+        return vnic
+
+    # Calls, throttles and failures per operation, for benchmark reports
+    def stats(self):
+        return {"api_calls": sum(self.calls.values()), "throttled": sum(self.throttled.values()),
+                "failed": sum(self.failed.values()), "uploaded_bytes": self.uploaded_bytes,
+                "worker_uploads": self.worker_uploads,
+                "calls_by_operation": dict(self.calls.most_common())}
+
+
+class _FakeClient:
+    def __init__(self, cloud):
+        self.cloud = cloud
+        # AsyncEngine and RateLimiter recognise SDK clients by this attribute
+        self.base_client = self
+
+
+class FakeComputeClient(_FakeClient):
+    def list_instances(self, compartment_id, lifecycle_state=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_instances")
+        return self.cloud.page(self.cloud.list("instance", compartment_id=compartment_id, lifecycle_state=lifecycle_state),
+                               page, limit)
+
+    def get_instance(self, instance_id, **kwargs):
+        self.cloud.api("get_instance")
+        return _Response(self.cloud.model(instance_id, "instance"))
+
+    def launch_instance(self, launch_instance_details, **kwargs):
+        self.cloud.api("launch_instance")
+        details = launch_instance_details
+        shape_config = details.shape_config
+        instance = self.cloud.add("instance", oci.core.models.Instance(
+            id=self.cloud.new_id("instance"), display_name=details.display_name, compartment_id=details.compartment_id,
+            availability_domain=details.availability_domain, shape=details.shape, lifecycle_state="PROVISIONING",
+            shape_config=oci.core.models.InstanceShapeConfig(
+                ocpus=getattr(shape_config, "ocpus", None), memory_in_gbs=getattr(shape_config, "memory_in_gbs", None)),
+            freeform_tags={}, defined_tags={}))
+        self.cloud.add_vnic(instance)
+        self.cloud.transition(instance.id, ("RUNNING", self.cloud.duration("instance_launch")))
+        return _Response(instance)
+
+    def terminate_instance(self, instance_id, **kwargs):
+        self.cloud.api("terminate_instance")
+        self.cloud.model(instance_id, "instance")
+        for attachment in self.cloud.list("volume_attachment", instance_id=instance_id, lifecycle_state="ATTACHED"):
+            attachment.lifecycle_state = "DETACHED"
+        self.cloud.transition(instance_id, ("TERMINATING", 0), ("TERMINATED", self.cloud.duration("instance_terminate")))
+        return _Response(None)
+
+    def list_vnic_attachments(self, compartment_id, instance_id=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_vnic_attachments")
+        return self.cloud.page(self.cloud.list("vnic_attachment", compartment_id=compartment_id, instance_id=instance_id),
+                               page, limit)
+
+    def list_volume_attachments(self, compartment_id, instance_id=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_volume_attachments")
+        return self.cloud.page(self.cloud.list("volume_attachment", compartment_id=compartment_id, instance_id=instance_id),
+                               page, limit)
+
+    def list_boot_volume_attachments(self, availability_domain, compartment_id, instance_id=None, page=None, limit=None,
+                                     **kwargs):
+        self.cloud.api("list_boot_volume_attachments")
+        return self.cloud.page(self.cloud.list("boot_volume_attachment", compartment_id=compartment_id,
+                                               availability_domain=availability_domain, instance_id=instance_id),
+                               page, limit)
+
+    def attach_volume(self, attach_volume_details, **kwargs):
+        self.cloud.api("attach_volume")
+        details = attach_volume_details
+        instance = self.cloud.model(details.instance_id, "instance")
+        volume = self.cloud.model(details.volume_id, "volume")
+        attachment = self.cloud.add("volume_attachment", oci.core.models.ParavirtualizedVolumeAttachment(
+            id=self.cloud.new_id("volumeattachment"), instance_id=instance.id, volume_id=volume.id,
+            device=details.device, display_name=details.display_name, compartment_id=instance.compartment_id,
+            availability_domain=instance.availability_domain, lifecycle_state="ATTACHING",
+            attachment_type="paravirtualized"))
+        self.cloud.transition(attachment.id, ("ATTACHED", self.cloud.duration("volume_attach")))
+        return _Response(attachment)
+
+    def detach_volume(self, volume_attachment_id, **kwargs):
+        self.cloud.api("detach_volume")
+        self.cloud.transition(volume_attachment_id, ("DETACHING", 0), ("DETACHED", self.cloud.duration("volume_detach")))
+        return _Response(None)
+
+    def list_instance_devices(self, instance_id, is_available=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_instance_devices")
+        used = {attachment.device for attachment in self.cloud.list("volume_attachment", instance_id=instance_id)
+                if attachment.lifecycle_state in ("ATTACHING", "ATTACHED", "DETACHING")}
+        devices = [oci.core.models.Device(name=name, is_available=name not in used) for name in DEVICE_NAMES]
+        if is_available is not None:
+            devices = [device for device in devices if device.is_available == is_available]
+        return self.cloud.page(devices, page, limit)
+
+    def create_image(self, create_image_details, **kwargs):
+        self.cloud.api("create_image")
+        details = create_image_details
+        size = self._boot_volume_size(details.instance_id)
+        image = self.cloud.add("image", oci.core.models.Image(
+            id=self.cloud.new_id("image"), display_name=details.display_name, compartment_id=details.compartment_id,
+            size_in_mbs=size * 1024, lifecycle_state="PROVISIONING"))
+        self.cloud.transition(image.id, ("AVAILABLE", self.cloud.duration("image_create", size)))
+        return _Response(image)
+
+    def export_image(self, image_id, export_image_details, **kwargs):
+        self.cloud.api("export_image")
+        image = self.cloud.model(image_id, "image")
+        size = (image.size_in_mbs or 0) / 1024
+        self.cloud.transition(image_id, ("EXPORTING", 0), ("AVAILABLE", self.cloud.duration("image_export", size)))
+        with self.cloud._lock:
+            self.cloud.uploaded_bytes += int(size * GB)
+        return _Response(image)
+
+    def list_images(self, compartment_id, lifecycle_state=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_images")
+        return self.cloud.page(self.cloud.list("image", compartment_id=compartment_id, lifecycle_state=lifecycle_state),
+                               page, limit)
+
+    # Size of the boot volume an instance was launched from, for image timings
+    def _boot_volume_size(self, instance_id):
+        attachments = self.cloud.list("boot_volume_attachment", instance_id=instance_id)
+        if attachments:
+            return self.cloud.model(attachments[0].boot_volume_id).size_in_gbs
+        return 50
+
+
+class FakeBlockstorageClient(_FakeClient):
+    def _create(self, kind, model_class, details, source, stage, operation):
+        self.cloud.api(operation)
+        size = source.size_in_gbs
+        model = self.cloud.add(kind, _model(
+            model_class, id=self.cloud.new_id(kind.replace("_", "")), display_name=details.display_name, size_in_gbs=size,
+            compartment_id=getattr(details, "compartment_id", None) or source.compartment_id,
+            availability_domain=getattr(details, "availability_domain", None) or source.availability_domain,
+            lifecycle_state="PROVISIONING" if "backup" not in kind else "CREATING"))
+        self.cloud.transition(model.id, ("AVAILABLE", self.cloud.duration(stage, size)))
+        return _Response(model)
+
+    def _delete(self, resource_id, kind, operation):
+        self.cloud.api(operation)
+        self.cloud.model(resource_id, kind)
+        self.cloud.transition(resource_id, ("TERMINATED", 0))
+        return _Response(None)
+
+    def _list(self, kind, operation, compartment_id, lifecycle_state=None, page=None, limit=None):
+        self.cloud.api(operation)
+        return self.cloud.page(self.cloud.list(kind, compartment_id=compartment_id, lifecycle_state=lifecycle_state),
+                               page, limit)
+
+    def get_volume(self, volume_id, **kwargs):
+        self.cloud.api("get_volume")
+        return _Response(self.cloud.model(volume_id, "volume"))
+
+    def list_volumes(self, compartment_id=None, lifecycle_state=None, page=None, limit=None, **kwargs):
+        return self._list("volume", "list_volumes", compartment_id, lifecycle_state, page, limit)
+
+    def create_volume(self, create_volume_details, **kwargs):
+        source_details = create_volume_details.source_details
+        source = self.cloud.model(source_details.id)
+        stage = "volume_clone" if source_details.type == "volume" else "volume_restore"
+        return self._create("volume", oci.core.models.Volume, create_volume_details, source, stage, "create_volume")
+
+    def delete_volume(self, volume_id, **kwargs):
+        return self._delete(volume_id, "volume", "delete_volume")
+
+    def create_volume_backup(self, create_volume_backup_details, **kwargs):
+        source = self.cloud.model(create_volume_backup_details.volume_id, "volume")
+        return self._create("volume_backup", oci.core.models.VolumeBackup, create_volume_backup_details, source,
+                            "volume_backup", "create_volume_backup")
+
+    def list_volume_backups(self, compartment_id, lifecycle_state=None, page=None, limit=None, **kwargs):
+        return self._list("volume_backup", "list_volume_backups", compartment_id, lifecycle_state, page, limit)
+
+    def delete_volume_backup(self, volume_backup_id, **kwargs):
+        return self._delete(volume_backup_id, "volume_backup", "delete_volume_backup")
+
+    def get_boot_volume(self, boot_volume_id, **kwargs):
+        self.cloud.api("get_boot_volume")
+        return _Response(self.cloud.model(boot_volume_id, "boot_volume"))
+
+    def list_boot_volumes(self, availability_domain=None, compartment_id=None, page=None, limit=None, **kwargs):
+        self.cloud.api("list_boot_volumes")
+        return self.cloud.page(self.cloud.list("boot_volume", compartment_id=compartment_id,
+                                               availability_domain=availability_domain), page, limit)
+
+    def create_boot_volume(self, create_boot_volume_details, **kwargs):
+        source = self.cloud.model(create_boot_volume_details.source_details.id, "boot_volume_backup")
+        return self._create("boot_volume", oci.core.models.BootVolume, create_boot_volume_details, source,
+                            "boot_volume_restore", "create_boot_volume")
+
+    def delete_boot_volume(self, boot_volume_id, **kwargs):
+        return self._delete(boot_volume_id, "boot_volume", "delete_boot_volume")
+
+    def create_boot_volume_backup(self, create_boot_volume_backup_details, **kwargs):
+        source = self.cloud.model(create_boot_volume_backup_details.boot_volume_id, "boot_volume")
+        return self._create("boot_volume_backup", oci.core.models.BootVolumeBackup, create_boot_volume_backup_details,
+                            source, "boot_volume_backup", "create_boot_volume_backup")
+
+    def list_boot_volume_backups(self, compartment_id, lifecycle_state=None, page=None, limit=None, **kwargs):
+        return self._list("boot_volume_backup", "list_boot_volume_backups", compartment_id, lifecycle_state, page, limit)
+
+    def delete_boot_volume_backup(self, boot_volume_backup_id, **kwargs):
+        return self._delete(boot_volume_backup_id, "boot_volume_backup", "delete_boot_volume_backup")
+
+
+class FakeVirtualNetworkClient(_FakeClient):
+    def get_vnic(self, vnic_id, **kwargs):
+        self.cloud.api("get_vnic")
+        return _Response(self.cloud.model(vnic_id, "vnic"))
+
+
+class FakeObjectStorageClient(_FakeClient):
+    def __init__(self, cloud):
+        super().__init__(cloud)
+        # Enough of the SDK client for UploadManager and UploadEngine to mount their connection pools
+        self.base_client = type("BaseClient", (), {"session": requests.Session(), "endpoint": "https://objectstorage.fake"})()
+
+    def get_namespace(self, **kwargs):
+        self.cloud.api("get_namespace")
+        return _Response("fakenamespace")
+
+    def _store(self, bucket_name, object_name, body, if_none_match=None):
+        with self.cloud._lock:
+            if if_none_match == "*" and (bucket_name, object_name) in self.cloud.objects:
+                raise oci.exceptions.ServiceError(412, "IfNoneMatchFailed", {}, f"{object_name} already exists in fake OCI")
+            if bucket_name in self.cloud.immutable_buckets and (bucket_name, object_name) in self.cloud.objects:
+                raise oci.exceptions.ServiceError(409, "ObjectAlreadyExists", {},
+                                                  f"{object_name} is protected by a retention rule in fake OCI")
+            self.cloud.objects[(bucket_name, object_name)] = body
+        return _Response(None, headers={"etag": hashlib.md5(body).hexdigest()})
+
+    def _object(self, bucket_name, object_name):
+        with self.cloud._lock:
+            body = self.cloud.objects.get((bucket_name, object_name))
+        if body is None:
+            raise oci.exceptions.ServiceError(404, "ObjectNotFound", {}, f"{object_name} not found in fake OCI")
+        return body
+
+    def put_object(self, namespace_name, bucket_name, object_name, put_object_body, if_none_match=None, **kwargs):
+        self.cloud.api("put_object")
+        body = put_object_body.read() if hasattr(put_object_body, "read") else put_object_body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        body = bytes(body or b"")
+        response = self._store(bucket_name, object_name, body, if_none_match)
+        with self.cloud._lock:
+            self.cloud.uploaded_bytes += len(body)
+        return response
+
+    # Supports range="bytes=<first>-<last>" like the service
+    def get_object(self, namespace_name, bucket_name, object_name, range=None, **kwargs):
+        self.cloud.api("get_object")
+        body = self._object(bucket_name, object_name)
+        if range:
+            first, last = range.split("=")[1].split("-")
+            body = body[int(first):int(last) + 1]
+        return _Response(type("ObjectData", (), {"content": body})(), headers={"content-length": str(len(body))})
+
+    def head_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self.cloud.api("head_object")
+        body = self._object(bucket_name, object_name)
+        return _Response(None, headers={"content-length": str(len(body)), "etag": hashlib.md5(body).hexdigest()})
+
+    def list_objects(self, namespace_name, bucket_name, prefix=None, start=None, limit=None, fields=None, **kwargs):
+        self.cloud.api("list_objects")
+        with self.cloud._lock:
+            names = sorted(name for bucket, name in self.cloud.objects
+                           if bucket == bucket_name and name.startswith(prefix or "") and name >= (start or ""))
+        size = limit or self.cloud.page_size
+        return _Response(oci.object_storage.models.ListObjects(
+            objects=[oci.object_storage.models.ObjectSummary(name=name, size=len(self.cloud.objects[(bucket_name, name)]))
+                     for name in names[:size]],
+            next_start_with=names[size] if len(names) > size else None))
+
+    def delete_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self.cloud.api("delete_object")
+        self._object(bucket_name, object_name)
+        with self.cloud._lock:
+            if bucket_name in self.cloud.immutable_buckets:
+                raise oci.exceptions.ServiceError(409, "RetentionRuleViolation", {},
+                                                  f"{object_name} is protected by a retention rule in fake OCI")
+            del self.cloud.objects[(bucket_name, object_name)]
+        return _Response(None)
+
+    def create_multipart_upload(self, namespace_name, bucket_name, create_multipart_upload_details, **kwargs):
+        self.cloud.api("create_multipart_upload")
+        upload_id = self.cloud.new_id("multipartupload")
+        with self.cloud._lock:
+            self.cloud.multipart_uploads[upload_id] = {}
+        return _Response(oci.object_storage.models.MultipartUpload(
+            upload_id=upload_id, bucket=bucket_name, object=create_multipart_upload_details.object))
+
+    def upload_part(self, namespace_name, bucket_name, object_name, upload_id, upload_part_num, upload_part_body, **kwargs):
+        self.cloud.api("upload_part")
+        body = upload_part_body.read() if hasattr(upload_part_body, "read") else upload_part_body
+        etag = hashlib.md5(body).hexdigest()
+        with self.cloud._lock:
+            self.cloud.multipart_uploads[upload_id][upload_part_num] = (etag, bytes(body))
+            self.cloud.uploaded_bytes += len(body)
+        return _Response(None, headers={"etag": etag})
+
+    def commit_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, commit_multipart_upload_details,
+                                **kwargs):
+        self.cloud.api("commit_multipart_upload")
+        with self.cloud._lock:
+            parts = self.cloud.multipart_uploads.pop(upload_id)
+        body = b""
+        for part in sorted(commit_multipart_upload_details.parts_to_commit, key=lambda part: part.part_num):
+            etag, data = parts[part.part_num]
+            if etag != part.etag:
+                raise oci.exceptions.ServiceError(400, "InvalidPart", {}, f"Part {part.part_num} has another etag")
+            body += data
+        return self._store(bucket_name, object_name, body)
+
+    def abort_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, **kwargs):
+        self.cloud.api("abort_multipart_upload")
+        with self.cloud._lock:
+            self.cloud.multipart_uploads.pop(upload_id, None)
+        return _Response(None)
+
+
+class FakeLoggingClient(_FakeClient):
+    def put_logs(self, log_id, put_logs_details, **kwargs):
+        self.cloud.api("put_logs")
+        return _Response(None)
+
+
+class FakeIdentityClient(_FakeClient):
+    def list_availability_domains(self, compartment_id, **kwargs):
+        self.cloud.api("list_availability_domains")
+        names = sorted({instance.availability_domain for instance in self.cloud.list("instance")})
+        return _Response([oci.identity.models.AvailabilityDomain(name=name, compartment_id=compartment_id) for name in names])
+
+    # Children of compartment_id, or with compartment_id_in_subtree every
+    # compartment below it (the real service allows that on the tenancy only)
+    def list_compartments(self, compartment_id, compartment_id_in_subtree=False, lifecycle_state=None, page=None,
+                          limit=None, **kwargs):
+        self.cloud.api("list_compartments")
+        compartments = self.cloud.list("compartment", lifecycle_state=lifecycle_state)
+        if compartment_id_in_subtree:
+            parents = {compartment.id: compartment.compartment_id for compartment in self.cloud.list("compartment")}
+            found = []
+            for compartment in compartments:
+                ancestor = compartment.compartment_id
+                while ancestor is not None and ancestor != compartment_id:
+                    ancestor = parents.get(ancestor)
+                if ancestor is not None:
+                    found.append(compartment)
+            compartments = found
+        else:
+            compartments = [compartment for compartment in compartments if compartment.compartment_id == compartment_id]
+        return self.cloud.page(compartments, page, limit)
+
+
+class FakeResourceSearchClient(_FakeClient):
+    # Every instance of the tenancy is returned; InstanceDiscovery applies the tag filter
+    def search_resources(self, search_details, page=None, limit=None, **kwargs):
+        self.cloud.api("search_resources")
+        summaries = [oci.resource_search.models.ResourceSummary(
+            resource_type="Instance", identifier=instance.id, display_name=instance.display_name,
+            compartment_id=instance.compartment_id, availability_domain=instance.availability_domain,
+            lifecycle_state=instance.lifecycle_state, freeform_tags=instance.freeform_tags,
+            defined_tags=instance.defined_tags)
+            for instance in self.cloud.list("instance")]
+        response = self.cloud.page(summaries, page, limit)
+        response.data = oci.resource_search.models.ResourceSummaryCollection(items=response.data)
+        return response
+
+
+FAKE_CLIENTS = {
+    oci.core.ComputeClient: FakeComputeClient,
+    oci.core.BlockstorageClient: FakeBlockstorageClient,
+    oci.core.VirtualNetworkClient: FakeVirtualNetworkClient,
+    oci.object_storage.ObjectStorageClient: FakeObjectStorageClient,
+    oci.loggingingestion.LoggingClient: FakeLoggingClient,
+    oci.identity.IdentityClient: FakeIdentityClient,
+    oci.resource_search.ResourceSearchClient: FakeResourceSearchClient,
+}
+
+
+# Drop-in for OciClientFactory handing out fake clients of one FakeCloud
+class FakeClientFactory:
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self._clients = {}
+
+    def with_region(self, region):
+        return self
+
+    def client(self, client_class):
+        if client_class not in self._clients:
+            self._clients[client_class] = FAKE_CLIENTS[client_class](self.cloud)
+        return self._clients[client_class]
+
+    def thread_client(self, client_class):
+        return self.client(client_class)
+
+
+# Remote command on a simulated worker. The backup script takes the upload
+# time of the volume attached on the given device and prints the same
+# summary line as backup_block_volume.py, or exits with status 1 at the
+# failure rate given for "backup_script"; other commands finish after one
+# API latency.
+class _FakeChannel:
+    def __init__(self, ssh):
+        self.ssh = ssh
+        self.output = b""
+        self.error = b""
+        self.exit_status = 0
+        self.finished_at = 0
+
+    def exec_command(self, command):
+        cloud = self.ssh.cloud
+        seconds = cloud.api_latency
+        if "backup_script.py" in command:
+            # sudo python backup_script.py <bucket> <instance> <log id> <device> <volume OCID> <mode> <verify days>, or its download
+            arguments = command.split()
+            device = arguments[6] if len(arguments) > 6 else arguments[-1]
+            attachments = [attachment for attachment in cloud.list("volume_attachment", instance_id=self.ssh.instance_id,
+                                                                   device=device)
+                           if attachment.lifecycle_state == "ATTACHED"]
+            size = cloud.model(attachments[-1].volume_id).size_in_gbs if attachments else 0
+            seconds = cloud.duration("volume_upload", size)
+            files = size * 100
+            uploaded_bytes = size * GB // 2
+            with cloud._lock:
+                failed = len(arguments) > 6 and cloud.random.random() < cloud.failure_rates.get("backup_script", 0)
+                if failed:
+                    cloud.failed["backup_script"] += 1
+                else:
+                    cloud.worker_uploads += files
+                    cloud.uploaded_bytes += uploaded_bytes
+            if failed:
+                self.exit_status = 1
+                self.error = f"Upload of {device} failed in fake OCI\n".encode()
+            else:
+                self.output = f"UPLOAD SUMMARY files={files} bytes={uploaded_bytes} seconds={seconds:.1f}\n".encode()
+        self.finished_at = time.monotonic() + seconds * cloud.time_scale
+
+    def recv_ready(self):
+        return bool(self.output) and self.exit_status_ready()
+
+    def recv(self, size):
+        data, self.output = self.output[:size], self.output[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return bool(self.error) and self.exit_status_ready()
+
+    def recv_stderr(self, size):
+        data, self.error = self.error[:size], self.error[size:]
+        return data
+
+    def exit_status_ready(self):
+        return time.monotonic() >= self.finished_at
+
+    def recv_exit_status(self):
+        while not self.exit_status_ready():
+            _sleep(max(0, self.finished_at - time.monotonic()))
+        return self.exit_status
+
+    def close(self):
+        pass
+
+
+class FakeSSHClient:
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self.instance_id = None
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, **kwargs):
+        vnics = [vnic.id for vnic in self.cloud.list("vnic", public_ip=hostname)]
+        attachments = [attachment for attachment in self.cloud.list("vnic_attachment") if attachment.vnic_id in vnics]
+        if not attachments:
+            raise paramiko.SSHException(f"No fake instance at {hostname}")
+        self.instance_id = attachments[0].instance_id
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return _FakeChannel(self)
+
+    def exec_command(self, command):
+        channel = _FakeChannel(self)
+        channel.exec_command(command)
+        return None, channel, channel
+
+    def close(self):
+        pass
+
+
+# Route the backup scripts' OCI clients and SSH sessions to a FakeCloud
+@contextmanager
+def patched(cloud):
+    factory = FakeClientFactory(cloud)
+    patches = [
+        (oci_clients.OciClientFactory, "from_file", classmethod(lambda cls, *args, **kwargs: factory)),
+        (oci_clients.OciClientFactory, "instance_principals", classmethod(lambda cls, *args, **kwargs: factory)),
+        (paramiko, "SSHClient", lambda: FakeSSHClient(cloud)),
+        (paramiko.RSAKey, "from_private_key_file", classmethod(lambda cls, *args, **kwargs: None)),
+    ]
+    saved = [(target, name, vars(target).get(name)) for target, name, _ in patches]
+    for target, name, replacement in patches:
+        setattr(target, name, replacement)
+    try:
+        yield factory
+    finally:
+        for target, name, original in saved:
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
@@ -0,0 +1,139 @@
+import time
+import threading
+from rate_limiter import paginate
+
+DEFAULT_TTL = 300
+
+
+# Shared, paginated and cached view of the tenancy resources the backup
+# scripts look up over and over: instances, volume and boot volume
+# attachments, availability domains and the Object Storage namespace.
+# Every list goes through full pagination, results are cached for ttl
+# seconds, and entries are dropped as soon as a LifecycleWaiter reports a
+# change to a matching resource (see on_lifecycle_event). With a RateLimiter
+# every API call goes through it.
+class Inventory:
+    def __init__(self, compute_client, identity_client=None, object_storage_client=None, ttl=DEFAULT_TTL, limiter=None):
+        self.compute_client = compute_client
+        self.identity_client = identity_client
+        self.object_storage_client = object_storage_client
+        self.ttl = ttl
+        self.limiter = limiter
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    # Return the cached value for key, loading it with loader() on a miss.
+    # Concurrent misses on the same key share one load.
+    def _cached(self, key, loader, ttl=None):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry and entry[0] > time.monotonic():
+                    return entry[1]
+            value = loader()
+            self._store(key, value, ttl)
+            return value
+
+    def _call(self, func, *args, **kwargs):
+        if self.limiter:
+            return self.limiter.call(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def _store(self, key, value, ttl=None):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+
+    # Put resource in place of the item with the same id in the cached list
+    # at key (or add it), keeping the entry's expiry; no-op if nothing is cached
+    def _update_item(self, key, resource):
+        with self._lock:
+            entry = self._cache.get(key)
+            if not entry or entry[0] <= time.monotonic():
+                return
+            items = [item for item in entry[1] if item.id != resource.id]
+            items.append(resource)
+            self._cache[key] = (entry[0], items)
+
+    # Drop cached entries whose key starts with any of the given prefixes
+    def invalidate(self, *prefixes):
+        with self._lock:
+            for key in list(self._cache):
+                if not prefixes or key[0] in prefixes or key[:2] in prefixes:
+                    del self._cache[key]
+
+    # All instances of a compartment (any state)
+    def instances(self, compartment_id):
+        return self._cached(("instances", compartment_id), lambda: list(paginate(
+            self.compute_client.list_instances, compartment_id, limiter=self.limiter)))
+
+    # Instances of a compartment page by page, so callers can start on the
+    # first page while the rest is listed; the full list is cached at the end
+    def iter_instances(self, compartment_id):
+        key = ("instances", compartment_id)
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            yield from entry[1]
+            return
+        instances = []
+        for instance in paginate(self.compute_client.list_instances, compartment_id, limiter=self.limiter):
+            instances.append(instance)
+            yield instance
+        self._store(key, instances)
+
+    # Instances carrying freeform tag tag_key=tag_value that are not terminated
+    def instances_by_tag(self, compartment_id, tag_key, tag_value):
+        for instance in self.iter_instances(compartment_id):
+            if (instance.freeform_tags.get(tag_key) == tag_value and
+                    instance.lifecycle_state != 'TERMINATED'):
+                yield instance
+
+    def instance(self, instance_id):
+        return self._cached(("instance", instance_id), lambda: self._call(self.compute_client.get_instance, instance_id).data)
+
+    def availability_domain(self, instance_id):
+        return self.instance(instance_id).availability_domain
+
+    # Volume attachments of the compartment, listed once and filtered per instance
+    def volume_attachments(self, compartment_id, instance_id=None):
+        attachments = self._cached(("volume_attachments", compartment_id), lambda: list(paginate(
+            self.compute_client.list_volume_attachments, compartment_id=compartment_id, limiter=self.limiter)))
+        if instance_id is None:
+            return attachments
+        return [attachment for attachment in attachments if attachment.instance_id == instance_id]
+
+    # Boot volume attachments of the compartment in one availability domain
+    def boot_volume_attachments(self, compartment_id, availability_domain, instance_id=None):
+        attachments = self._cached(("boot_volume_attachments", compartment_id, availability_domain),
+                                   lambda: list(paginate(
+                                       self.compute_client.list_boot_volume_attachments,
+                                       availability_domain, compartment_id, limiter=self.limiter)))
+        if instance_id is None:
+            return attachments
+        return [attachment for attachment in attachments if attachment.instance_id == instance_id]
+
+    def availability_domains(self, compartment_id):
+        return self._cached(("availability_domains", compartment_id),
+                            lambda: self._call(self.identity_client.list_availability_domains, compartment_id).data,
+                            ttl=float("inf"))
+
+    def namespace(self):
+        return self._cached(("namespace",), lambda: self._call(self.object_storage_client.get_namespace).data, ttl=float("inf"))
+
+    # LifecycleWaiter listener: a resource changed state, so the cached views
+    # of it are updated with the new version; the rest of the compartment's
+    # lists stay cached. Attachments are only ever read per source instance,
+    # so a worker's attachments need not be added to the lists by hand.
+    def on_lifecycle_event(self, resource_type, resource):
+        compartment_id = getattr(resource, "compartment_id", None)
+        if resource_type == "instance":
+            self._store(("instance", resource.id), resource)
+            self._update_item(("instances", compartment_id), resource)
+        elif resource_type == "volume_attachment":
+            self._update_item(("volume_attachments", compartment_id), resource)
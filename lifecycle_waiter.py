@@ -0,0 +1,215 @@
+import threading
+import time
+import logging
+import concurrent.futures
+import oci
+from rate_limiter import paginate
+
+logger = logging.getLogger(__name__)
+
+# Batched list call used to resolve waits for each resource type:
+# (client, list method, whether the list call accepts a lifecycle_state filter)
+RESOURCE_LIST_CALLS = {
+    "volume_backup": ("blockstorage", "list_volume_backups", True),
+    "boot_volume_backup": ("blockstorage", "list_boot_volume_backups", True),
+    "volume": ("blockstorage", "list_volumes", True),
+    "boot_volume": ("blockstorage", "list_boot_volumes", False),
+    "instance": ("compute", "list_instances", True),
+    "image": ("compute", "list_images", True),
+    "volume_attachment": ("compute", "list_volume_attachments", False),
+}
+
+# States a resource of each type does not leave for the one being waited
+# on; a wait that sees one of them fails at once, unless it waits for one of
+# them itself (e.g. TERMINATED, which goes through TERMINATING)
+FAILED_STATES = {
+    "volume_backup": ("FAULTY", "TERMINATING", "TERMINATED"),
+    "boot_volume_backup": ("FAULTY", "TERMINATING", "TERMINATED"),
+    "volume": ("FAULTY", "TERMINATING", "TERMINATED"),
+    "boot_volume": ("FAULTY", "TERMINATING", "TERMINATED"),
+    "instance": ("TERMINATING", "TERMINATED"),
+    "image": ("DISABLED", "DELETED"),
+    "volume_attachment": ("DETACHING", "DETACHED"),
+}
+
+DEFAULT_POLL_INTERVAL = 15
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+
+# A single registration: wait for resource_id to reach target_state
+class _Wait:
+    def __init__(self, resource_type, resource_id, target_state, compartment_id, timeout, stage, size_in_gbs):
+        self.resource_type = resource_type
+        self.resource_id = resource_id
+        self.target_state = target_state
+        self.compartment_id = compartment_id
+        self.stage = stage
+        self.size_in_gbs = size_in_gbs
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.delay = 0
+        self.next_check = self.started
+        self.checks = 0
+        self.future = concurrent.futures.Future()
+
+
+# Central waiter shared by all in-flight workflows. Workflows register
+# "wait for OCID X to reach state Y" and get a Future back; one background
+# thread resolves every registration with one paginated, compartment-level
+# list call per (resource type, compartment, target state) per round instead
+# of one get_* call per resource. With a PollingPolicy, each registration
+# that names its stage is first checked near its predicted completion time
+# and then with backoff; without one every registration is checked every
+# poll_interval seconds. List calls filter on the target state while waits
+# are on time; once a wait of the group has been checked before without
+# finishing, the group is listed unfiltered so a resource that ended up in a
+# failed state (e.g. FAULTY or TERMINATED) fails its wait at once. A wait
+# also times out if its list call keeps failing. With Metrics, the duration
+# of every staged wait is recorded per stage and volume size.
+class LifecycleWaiter:
+    def __init__(self, compute_client, blockstorage_client, poll_interval=DEFAULT_POLL_INTERVAL, policy=None, limiter=None,
+                 metrics=None):
+        self.clients = {"compute": compute_client, "blockstorage": blockstorage_client}
+        self.poll_interval = poll_interval
+        self.policy = policy
+        self.limiter = limiter
+        self.metrics = metrics
+        self.listeners = []
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    # Register a wait and return a Future resolved with the resource model
+    def wait_for(self, resource_type, resource_id, target_state, compartment_id, timeout=DEFAULT_TIMEOUT, callback=None,
+                 stage=None, size_in_gbs=None):
+        if resource_type not in RESOURCE_LIST_CALLS:
+            raise ValueError(f"Unsupported resource type for waiter: {resource_type}")
+        wait = _Wait(resource_type, resource_id, target_state, compartment_id, timeout, stage, size_in_gbs)
+        if self.policy and stage:
+            wait.delay = self.policy.first_delay(stage, size_in_gbs)
+            wait.next_check = wait.started + wait.delay
+            logger.info(f"Waiting for {stage} of {resource_id}, ETA {self.policy.eta(stage, size_in_gbs):%Y-%m-%d %H:%M:%S}")
+        if callback:
+            wait.future.add_done_callback(callback)
+        with self._condition:
+            self._pending.append(wait)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="lifecycle-waiter", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return wait.future
+
+    # Register listener(resource_type, resource), called whenever a wait
+    # resolves, e.g. so a cache can drop what the state change made stale
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # Blocking convenience wrapper around wait_for
+    def wait(self, resource_type, resource_id, target_state, compartment_id, timeout=DEFAULT_TIMEOUT, stage=None, size_in_gbs=None):
+        return self.wait_for(resource_type, resource_id, target_state, compartment_id, timeout,
+                             stage=stage, size_in_gbs=size_in_gbs).result()
+
+    # Human readable ETA for a stage, used in the scripts' progress messages
+    def eta(self, stage, size_in_gbs=None):
+        if not self.policy:
+            return "unknown"
+        return f"{self.policy.eta(stage, size_in_gbs):%Y-%m-%d %H:%M:%S}"
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [wait for wait in self._pending if wait.next_check <= now]
+            if due:
+                self._poll(due)
+                self._reschedule(due)
+            with self._condition:
+                self._pending = [wait for wait in self._pending if not wait.future.done()]
+                if self._pending and not self._stopped:
+                    next_check = min(wait.next_check for wait in self._pending)
+                    self._condition.wait(max(0, next_check - time.monotonic()))
+
+    # Work out when each unresolved registration should be checked again
+    def _reschedule(self, waits):
+        now = time.monotonic()
+        for wait in waits:
+            if wait.future.done():
+                if self.policy and wait.stage and not wait.future.exception():
+                    # Found finished at the first check: the stage took at most this long
+                    self.policy.record(wait.stage, wait.size_in_gbs, now - wait.started, censored=wait.checks == 1)
+                if self.metrics and wait.stage:
+                    self.metrics.stage_finished(wait.stage, now - wait.started, wait.size_in_gbs,
+                                                failed=wait.future.exception() is not None)
+                continue
+            if self.policy and wait.stage:
+                wait.delay = self.policy.next_delay(wait.stage, wait.size_in_gbs, now - wait.started)
+            else:
+                wait.delay = self.poll_interval
+            wait.next_check = now + wait.delay
+
+    # Resolve pending waits, grouped so each group costs one list call
+    def _poll(self, pending):
+        groups = {}
+        for wait in pending:
+            key = (wait.resource_type, wait.compartment_id, wait.target_state)
+            groups.setdefault(key, []).append(wait)
+
+        for (resource_type, compartment_id, target_state), waits in groups.items():
+            overdue = any(wait.checks for wait in waits)
+            try:
+                states = self._list_states(resource_type, compartment_id, target_state, filtered=not overdue)
+            except Exception as e:
+                message = e.message if isinstance(e, oci.exceptions.ServiceError) else str(e)
+                logger.warning(f"Waiter list call for {resource_type} in {compartment_id} failed: {message}")
+                for wait in waits:
+                    wait.checks += 1
+                    self._check_deadline(wait, f"last list call failed: {message}")
+                continue
+
+            failed_states = FAILED_STATES.get(resource_type, ())
+            if target_state in failed_states:
+                failed_states = ()
+            for wait in waits:
+                wait.checks += 1
+                resource = states.get(wait.resource_id)
+                current_state = resource.lifecycle_state if resource is not None else None
+                if current_state == target_state:
+                    self._notify(resource_type, resource)
+                    wait.future.set_result(resource)
+                elif current_state in failed_states:
+                    self._notify(resource_type, resource)
+                    wait.future.set_exception(RuntimeError(
+                        f"{resource_type} {wait.resource_id} is {current_state} while waiting for {target_state}"))
+                else:
+                    self._check_deadline(wait, f"current state: {current_state or 'UNKNOWN'}")
+
+    # Fail a wait that has run past its timeout
+    def _check_deadline(self, wait, detail):
+        if time.monotonic() > wait.deadline:
+            wait.future.set_exception(TimeoutError(
+                f"Timed out waiting for {wait.resource_type} {wait.resource_id} to reach {wait.target_state} ({detail})"))
+
+    def _notify(self, resource_type, resource):
+        for listener in self.listeners:
+            try:
+                listener(resource_type, resource)
+            except Exception as e:
+                logger.warning(f"Waiter listener failed for {resource_type} {resource.id}: {str(e)}")
+
+    def _list_states(self, resource_type, compartment_id, target_state, filtered=True):
+        client_name, method_name, supports_state_filter = RESOURCE_LIST_CALLS[resource_type]
+        list_method = getattr(self.clients[client_name], method_name)
+        kwargs = {"lifecycle_state": target_state} if supports_state_filter and filtered else {}
+        resources = paginate(list_method, compartment_id=compartment_id, limiter=self.limiter, operation=method_name, **kwargs)
+        return {resource.id: resource for resource in resources}
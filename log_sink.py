@@ -0,0 +1,123 @@
+import queue
+import atexit
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+import oci
+from oci.loggingingestion import models
+
+FLUSH_INTERVAL = 2.0
+MAX_BATCH_ENTRIES = 500
+# PutLogs accepts up to 10 MB per request; stay well below it
+MAX_BATCH_BYTES = 1024 * 1024
+MAX_QUEUE_SIZE = 10000
+# Once the queue is this full, only one in SAMPLE_EVERY INFO entries is kept
+SAMPLE_WATERMARK = 0.8
+SAMPLE_EVERY = 10
+ALWAYS_KEPT_LEVELS = ("WARNING", "ERROR")
+
+
+# Background sender for the OCI Logging service. log() only queues the entry;
+# a daemon thread sends the queue as one LogEntryBatch per PutLogs call when
+# the batch is full or FLUSH_INTERVAL seconds old, and close() (also run at
+# exit) sends whatever is left. When the service can't keep up, INFO entries
+# are sampled and then dropped so logging never blocks the backup work;
+# dropped entries are counted and reported in the next batch.
+class LogSink:
+    def __init__(self, logging_client, log_id, source, subject, flush_interval=FLUSH_INTERVAL,
+                 max_batch_entries=MAX_BATCH_ENTRIES, max_batch_bytes=MAX_BATCH_BYTES, max_queue_size=MAX_QUEUE_SIZE):
+        self.logging_client = logging_client
+        self.log_id = log_id
+        self.source = source
+        self.subject = subject
+        self.flush_interval = flush_interval
+        self.max_batch_entries = max_batch_entries
+        self.max_batch_bytes = max_batch_bytes
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self.sampled = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, level, message):
+        if self._closed.is_set():
+            print(f"{level}: {message}")
+            return
+        if level not in ALWAYS_KEPT_LEVELS and self._queue.qsize() >= self.max_queue_size * SAMPLE_WATERMARK:
+            with self._lock:
+                self.sampled += 1
+                if self.sampled % SAMPLE_EVERY:
+                    self.dropped += 1
+                    return
+        entry = models.LogEntry(data=f"{level}: {message}", id=str(uuid.uuid4()),
+                                time=datetime.now(timezone.utc).isoformat())
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _take_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return []
+        return [models.LogEntry(data=f"WARNING: {dropped} log entries dropped by the log sink", id=str(uuid.uuid4()),
+                                time=datetime.now(timezone.utc).isoformat())]
+
+    def _send(self, entries):
+        entries = self._take_dropped() + entries
+        if not entries:
+            return
+        log_details = models.PutLogsDetails(
+            specversion="1.0",
+            log_entry_batches=[
+                models.LogEntryBatch(
+                    entries=entries,
+                    source=self.source,
+                    type="CUSTOM",
+                    subject=self.subject,
+                    defaultlogentrytime=datetime.now(timezone.utc).isoformat()
+                )
+            ]
+        )
+        try:
+            self.logging_client.put_logs(log_id=self.log_id, put_logs_details=log_details)
+        except oci.exceptions.ServiceError as e:
+            print(f"Failed to send {len(entries)} log entries: {e}")
+
+    # Collect entries until the batch is full, FLUSH_INTERVAL has passed or the sink is closed
+    def _next_batch(self):
+        entries = []
+        batch_bytes = 0
+        deadline = time.monotonic() + self.flush_interval
+        while len(entries) < self.max_batch_entries and batch_bytes < self.max_batch_bytes:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=timeout if not self._closed.is_set() else 0.01)
+            except queue.Empty:
+                if self._closed.is_set():
+                    break
+                continue
+            entries.append(entry)
+            batch_bytes += len(entry.data) + len(entry.id) + len(entry.time)
+        return entries
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            self._send(self._next_batch())
+        self._send([])
+
+    # Send everything still queued and stop the sender thread
+    def close(self, timeout=30):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join(timeout)
@@ -4,6 +4,8 @@ from datetime import datetime
 import random, string
 import paramiko
 import os
+from inventory import Inventory
+from archive_stream import upload_stream
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
@@ -53,6 +55,7 @@ compute_client = oci.core.ComputeClient(config)
 blockstorage_client = oci.core.BlockstorageClient(config)
 object_storage_client = oci.object_storage.ObjectStorageClient(config)
 network_client = oci.core.VirtualNetworkClient(config)
+inventory = Inventory(compute_client, object_storage_client=object_storage_client)
 
 # Parameters - replace these with your specific values
 current_datetime = datetime.now()
@@ -76,49 +79,34 @@ def zip_and_upload_block_volumes(instance_id, restored_block_volumes, instance_i
 
         for volume in restored_block_volumes:
             volume_mount_path = f"/mnt/{volume.display_name}"
-            zip_file_name = f"/tmp/{volume.display_name}.zip"
-            
-            # Create a directory for the volume if it does not exist, then zip its contents
-            zip_command = f"sudo mkdir -p {volume_mount_path} && sudo zip -r {zip_file_name} {volume_mount_path}"
-            print(f"Zipping volume {volume.display_name} on instance {instance_id}")
-            stdin, stdout, stderr = ssh.exec_command(zip_command)
-
-            # Wait for the zip operation to complete
-            stdout.channel.recv_exit_status()
-            print(f"Zip command output: {stdout.read().decode()}")
-            print(f"Zip command error (if any): {stderr.read().decode()}")
-
-            # Upload the zipped file to Object Storage
-            object_name = f"exported_{volume.display_name}_{datetime_string}.zip"
-            upload_file_to_object_storage(zip_file_name, object_name)
+
+            # Create a directory for the volume if it does not exist, then archive its contents to stdout;
+            # the archive is streamed from the SSH channel into a multipart upload, nothing is staged on disk.
+            # pipefail makes a failed tar fail the command, not just a failed gzip.
+            archive_command = (f"sudo mkdir -p {volume_mount_path} && "
+                               f"sudo bash -c 'set -o pipefail; tar -C {volume_mount_path} -cf - . | gzip -1'")
+            print(f"Archiving volume {volume.display_name} on instance {instance_id}")
+            stdin, stdout, stderr = ssh.exec_command(archive_command)
+
+            # Runs once the stream has ended: a failed archive aborts the upload instead of committing it
+            def check_archive():
+                exit_status = stdout.channel.recv_exit_status()
+                print(f"Archive command error (if any): {stderr.read().decode()}")
+                if exit_status != 0:
+                    raise RuntimeError(f"Archiving {volume.display_name} failed with exit status {exit_status}")
+
+            object_name = f"exported_{volume.display_name}_{datetime_string}.tar.gz"
+            print(f"Streaming {volume.display_name} to Object Storage as {object_name}")
+            uploaded_bytes = upload_stream(object_storage_client, os_namespace, bucket_name, object_name, stdout,
+                                           check=check_archive, expected_size=volume.size_in_gbs * 1024 ** 3)
+            print(f"File {object_name} uploaded to Object Storage ({uploaded_bytes} bytes)")
 
     finally:
         # Close the SSH connection
         ssh.close()
 
-def upload_file_to_object_storage(file_path, object_name):
-    print(f"Uploading {file_path} to Object Storage as {object_name}")
-    
-    # Upload the file to Object Storage
-    with open(file_path, 'rb') as file:
-        upload_manager = oci.object_storage.UploadManager(object_storage_client, allow_parallel_uploads=True)
-        upload_manager.upload_file(
-            namespace_name=os_namespace,
-            bucket_name=bucket_name,
-            object_name=object_name,
-            file_path=file_path
-        )
-    print(f"File {object_name} uploaded to Object Storage")
-
 def list_instances_by_tag(compartment_id, tag_key, tag_value):
-    instances = compute_client.list_instances(compartment_id).data
-    filtered_instances = []
-    for instance in instances:
-        instance_tags = instance.freeform_tags
-        if tag_key in instance_tags and instance_tags[tag_key] == tag_value:
-            filtered_instances.append(instance)
-
-    return filtered_instances
+    return list(inventory.instances_by_tag(compartment_id, tag_key, tag_value))
 
 instances = list_instances_by_tag(compartment_id, tag_key, tag_value)
 
@@ -132,8 +120,8 @@ for instance in instances:
 
     # Step 1: Create Boot Volume and Block Volume Backups
     availability_domain = instance.availability_domain
-    boot_volume_info = compute_client.list_boot_volume_attachments(availability_domain, instance.compartment_id, instance_id=instance.id).data
-    block_volume_info = compute_client.list_volume_attachments(availability_domain=availability_domain, compartment_id=compartment_id, instance_id=instance.id).data
+    boot_volume_info = inventory.boot_volume_attachments(instance.compartment_id, availability_domain, instance.id)
+    block_volume_info = inventory.volume_attachments(compartment_id, instance.id)
     boot_volume_id = boot_volume_info[0].boot_volume_id
     attached_volume_ids = [vol_info.volume_id for vol_info in block_volume_info if vol_info.lifecycle_state == 'ATTACHED']
 
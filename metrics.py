@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NAMESPACE = "cra_backup"
+# Seconds; lifecycle stages of big volumes run for hours
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400, 28800)
+# Upper bounds of the size_bucket label, in GB
+SIZE_BUCKETS_GB = (50, 200, 1024, 4096, 16384)
+
+METRIC_HELP = {
+    "stage_duration_seconds": ("histogram", "Duration of a backup stage"),
+    "stages_total": ("counter", "Backup stages finished, by outcome"),
+    "uploaded_bytes_total": ("counter", "Bytes uploaded to Object Storage"),
+    "uploaded_files_total": ("counter", "Files uploaded to Object Storage"),
+    "api_calls_total": ("counter", "OCI API calls made"),
+    "api_retries_total": ("counter", "OCI API calls retried after throttling"),
+    "api_throttles_total": ("counter", "OCI API calls answered with 429"),
+}
+
+
+# Size label for a volume so that durations of similar volumes are compared
+def size_bucket(size_in_gbs):
+    if not size_in_gbs:
+        return "unknown"
+    for bound in SIZE_BUCKETS_GB:
+        if size_in_gbs <= bound:
+            return f"le{bound}gb"
+    return f"gt{SIZE_BUCKETS_GB[-1]}gb"
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in labels) + "}"
+
+
+# In-process counters and histograms in the Prometheus text format. They can
+# be written to a textfile (for node_exporter's textfile collector) and/or
+# served on a local HTTP port for scraping. Used by the orchestrator and the
+# worker upload script; stage durations are labelled with the stage name and
+# the size bucket of the volume.
+class Metrics:
+    def __init__(self, textfile_path=None, port=None, namespace=NAMESPACE, labels=None):
+        self.textfile_path = textfile_path
+        self.port = port
+        self.namespace = namespace
+        self.labels = labels or {}
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    # Metrics configured by metricsinfo: textfile path and local port (both optional)
+    @classmethod
+    def from_config(cls, metricsinfo, **kwargs):
+        metricsinfo = metricsinfo or {}
+        port = metricsinfo.get("port")
+        return cls(textfile_path=metricsinfo.get("textfile") or None, port=int(port) if port else None, **kwargs)
+
+    def _key(self, name, labels):
+        return name, tuple(sorted({**self.labels, **labels}.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    # Record how long a stage took and whether it failed
+    def stage_finished(self, stage, duration, size_in_gbs=None, failed=False):
+        outcome = "failed" if failed else "ok"
+        self.observe("stage_duration_seconds", duration, stage=stage, size_bucket=size_bucket(size_in_gbs))
+        self.inc("stages_total", stage=stage, outcome=outcome)
+
+    # Time the enclosed block as a stage, e.g. `with metrics.time_stage("ssh_bootstrap"):`
+    @contextmanager
+    def time_stage(self, stage, size_in_gbs=None):
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.stage_finished(stage, time.monotonic() - started, size_in_gbs, failed=True)
+            raise
+        self.stage_finished(stage, time.monotonic() - started, size_in_gbs)
+
+    # All metrics in the Prometheus text exposition format
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(value, counts=list(value["counts"]))) for key, value in self._histograms.items())
+        described = set()
+        for (name, labels), value in counters:
+            full_name = f"{self.namespace}_{name}"
+            if name not in described:
+                metric_type, help_text = METRIC_HELP.get(name, ("counter", name))
+                lines += [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {metric_type}"]
+                described.add(name)
+            lines.append(f"{full_name}{_label_text(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            full_name = f"{self.namespace}_{name}"
+            if name not in described:
+                metric_type, help_text = METRIC_HELP.get(name, ("histogram", name))
+                lines += [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {metric_type}"]
+                described.add(name)
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f"{full_name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+            lines.append(f"{full_name}_bucket{_label_text(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{full_name}_sum{_label_text(labels)} {histogram['sum']:.3f}")
+            lines.append(f"{full_name}_count{_label_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    # Write the textfile atomically so the collector never reads half a file
+    def write_textfile(self):
+        if not self.textfile_path:
+            return
+        directory = os.path.dirname(self.textfile_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.textfile_path}.tmp"
+        with open(temp_path, "w") as textfile:
+            textfile.write(self.render())
+        os.replace(temp_path, self.textfile_path)
+
+    # Serve /metrics on localhost:port from a daemon thread
+    def serve(self):
+        if not self.port or self._server:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+
+    def close(self):
+        self.write_textfile()
+        if self._server:
+            self._server.shutdown()
+            self._server = None
@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import asyncio
+from datetime import datetime
+
+# Runs the block volume orchestrator for every region in configuration.json's
+# regioninfo at the same time, one process per region, so each region has its
+# own clients, worker limits and worker subnet and the run takes as long as
+# the slowest region. The per-region reports are merged into run_report.json.
+
+CONFIG_PATH = os.environ.get('CRA_CONFIG_PATH', '/home/opc/configuration.json')
+ORCHESTRATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'block_volume_back_cloud_init.py')
+
+
+# Function to run the orchestrator for one region and return its report; the
+# previous run's report is removed first so a run that dies before writing
+# its own is reported as such instead of merging stale numbers
+async def run_region(region):
+    report_path = f"{region}_run_report.json"
+    try:
+        os.remove(report_path)
+    except FileNotFoundError:
+        pass
+    print(f"Starting backup run for region {region}")
+    process = await asyncio.create_subprocess_exec(sys.executable, ORCHESTRATOR, region)
+    exit_code = await process.wait()
+    try:
+        with open(report_path, 'r') as report_file:
+            report = json.load(report_file)
+    except (OSError, ValueError) as e:
+        report = {"region": region, "instances": 0, "volumes_exported": 0, "volume_failures": [],
+                  "instance_failures": [{"instance": None, "error": f"No run report: {str(e)}"}]}
+    report["exit_code"] = exit_code
+    print(f"Backup run for region {region} finished with exit code {exit_code}")
+    return report
+
+
+# Function to run all regions concurrently and merge their reports
+async def run_all_regions(regions):
+    reports = await asyncio.gather(*[run_region(region) for region in regions])
+    return {
+        "started": min((report.get("started") for report in reports if report.get("started")), default=None),
+        "finished": datetime.now().isoformat(),
+        "instances": sum(report["instances"] for report in reports),
+        "volumes_exported": sum(report["volumes_exported"] for report in reports),
+        "failures": sum(len(report["volume_failures"]) + len(report["instance_failures"]) for report in reports),
+        "regions": reports,
+    }
+
+
+if __name__ == "__main__":
+    with open(CONFIG_PATH, 'r') as config_file:
+        config_data = json.load(config_file)
+    regions = [entry["region"] for entry in config_data.get("regioninfo", [])] or [config_data["region"]]
+
+    run_report = asyncio.run(run_all_regions(regions))
+    with open('run_report.json', 'w') as report_file:
+        json.dump(run_report, report_file, indent=4)
+    print(f"Backed up {run_report['instances']} instances in {len(regions)} regions, "
+          f"{run_report['volumes_exported']} volumes exported, {run_report['failures']} failures")
+    if run_report["failures"]:
+        sys.exit(1)
@@ -0,0 +1,66 @@
+import threading
+import oci
+# The SDK ships its own copy of requests; adapters must come from it to mount on its sessions
+from oci._vendor.requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 18
+DEFAULT_TIMEOUT = (10, 120)
+
+
+# Factory for OCI service clients shared by the backup scripts. Clients are
+# built once per service and reused: each gets an HTTP connection pool sized
+# to the configured concurrency (so parallel calls reuse kept-alive
+# connections instead of opening and dropping new ones), the same retry
+# strategy and timeouts. Works with a config file or instance principals.
+class OciClientFactory:
+    def __init__(self, config, signer=None, pool_size=DEFAULT_POOL_SIZE, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY,
+                 timeout=DEFAULT_TIMEOUT):
+        self.config = config
+        self.signer = signer
+        self.pool_size = pool_size
+        self.retry_strategy = retry_strategy
+        self.timeout = timeout
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Clients authenticated with ~/.oci/config
+    @classmethod
+    def from_file(cls, file_location=oci.config.DEFAULT_LOCATION, profile_name=oci.config.DEFAULT_PROFILE, **kwargs):
+        return cls(oci.config.from_file(file_location, profile_name), **kwargs)
+
+    # Clients authenticated as the instance they run on; region defaults to the instance's region
+    @classmethod
+    def instance_principals(cls, region=None, **kwargs):
+        signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+        return cls({'region': region} if region else {}, signer=signer, **kwargs)
+
+    # Factory for another region sharing this one's credentials and settings
+    def with_region(self, region):
+        return OciClientFactory({**self.config, 'region': region}, signer=self.signer, pool_size=self.pool_size,
+                                retry_strategy=self.retry_strategy, timeout=self.timeout)
+
+    def _build(self, client_class):
+        kwargs = {"retry_strategy": self.retry_strategy, "timeout": self.timeout}
+        if self.signer is not None:
+            kwargs["signer"] = self.signer
+        client = client_class(self.config, **kwargs)
+        # Block for a free connection rather than opening throwaway ones above the pool size
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, pool_block=True)
+        client.base_client.session.mount("https://", adapter)
+        return client
+
+    # Client shared by every thread and coroutine of the process, e.g.
+    # oci_clients.client(oci.core.ComputeClient)
+    def client(self, client_class):
+        with self._lock:
+            if client_class not in self._clients:
+                self._clients[client_class] = self._build(client_class)
+            return self._clients[client_class]
+
+    # Client private to the calling thread, for code that drives one client from a single thread
+    def thread_client(self, client_class):
+        clients = self._local.__dict__.setdefault("clients", {})
+        if client_class not in clients:
+            clients[client_class] = self._build(client_class)
+        return clients[client_class]
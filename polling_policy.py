@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+DEFAULT_HISTORY_PATH = "stage_history.json"
+MAX_SAMPLES_PER_STAGE = 50
+# The first check is made at this fraction of the estimate. It moves down to
+# MIN_FIRST_CHECK as more of the last CENSORED_WINDOW samples of the stage
+# were already finished at their first check.
+FIRST_CHECK = 0.9
+MIN_FIRST_CHECK = 0.3
+CENSORED_WINDOW = 10
+
+# Default duration model per stage: (fixed overhead in seconds, seconds per GB).
+# Used until enough history has been recorded for the stage.
+DEFAULT_STAGE_MODELS = {
+    "volume_backup": (60, 5.0),
+    "boot_volume_backup": (60, 5.0),
+    "volume_restore": (30, 0.2),
+    "boot_volume_restore": (30, 0.2),
+    "volume_clone": (30, 0.2),
+    "instance_launch": (60, 0.0),
+    "volume_attach": (20, 0.0),
+    "volume_detach": (20, 0.0),
+    "image_create": (120, 10.0),
+    "image_export": (120, 15.0),
+    "instance_terminate": (60, 0.0),
+    "volume_upload": (30, 20.0),
+}
+
+
+# Size-aware polling policy. The first check is scheduled near the expected
+# completion time of the stage (from the volume size and the durations of
+# previous runs), later checks back off until the resource is ready.
+# A stage found finished at its first check only tells that it took at most
+# that long: such samples are recorded as censored, and while they keep
+# coming the first check moves earlier so over-estimated stages are learned
+# quickly instead of never being seen below the first check.
+class PollingPolicy:
+    def __init__(self, history_path=DEFAULT_HISTORY_PATH, min_interval=10, max_interval=300, backoff_factor=1.5):
+        self.history_path = history_path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self._lock = threading.Lock()
+        self.history = self._load_history()
+
+    def _load_history(self):
+        if self.history_path and os.path.exists(self.history_path):
+            with open(self.history_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_history(self):
+        if not self.history_path:
+            return
+        with open(self.history_path, 'w') as f:
+            json.dump(self.history, f, indent=4)
+
+    # Fit duration = overhead + seconds_per_gb * size over the recorded samples
+    def _model(self, stage):
+        overhead, seconds_per_gb = DEFAULT_STAGE_MODELS.get(stage, (60, 1.0))
+        samples = self.history.get(stage, [])
+        if len(samples) < 3:
+            return overhead, seconds_per_gb
+        sizes = [sample["size_in_gbs"] for sample in samples]
+        durations = [sample["duration"] for sample in samples]
+        mean_size = sum(sizes) / len(sizes)
+        mean_duration = sum(durations) / len(durations)
+        variance = sum((size - mean_size) ** 2 for size in sizes)
+        if variance == 0:
+            # All samples have the same size, keep the default slope and fit the overhead
+            return max(0.0, mean_duration - seconds_per_gb * mean_size), seconds_per_gb
+        slope = sum((size - mean_size) * (duration - mean_duration) for size, duration in zip(sizes, durations)) / variance
+        slope = max(0.0, slope)
+        return max(0.0, mean_duration - slope * mean_size), slope
+
+    # Expected duration of a stage in seconds
+    def estimate(self, stage, size_in_gbs=None):
+        with self._lock:
+            overhead, seconds_per_gb = self._model(stage)
+        return overhead + seconds_per_gb * (size_in_gbs or 0)
+
+    # Marginal seconds per GB of a stage, e.g. a worker's upload rate
+    def seconds_per_gb(self, stage):
+        with self._lock:
+            return self._model(stage)[1]
+
+    # Expected completion time of a stage that started at started_at (epoch seconds)
+    def eta(self, stage, size_in_gbs=None, started_at=None):
+        started_at = started_at if started_at is not None else time.time()
+        return datetime.fromtimestamp(started_at) + timedelta(seconds=self.estimate(stage, size_in_gbs))
+
+    # Fraction of the estimate at which to check a stage first
+    def first_check_fraction(self, stage):
+        with self._lock:
+            recent = self.history.get(stage, [])[-CENSORED_WINDOW:]
+        if not recent:
+            return FIRST_CHECK
+        censored = sum(1 for sample in recent if sample.get("censored")) / len(recent)
+        return FIRST_CHECK - (FIRST_CHECK - MIN_FIRST_CHECK) * censored
+
+    # Delay before the first check: slightly ahead of the expected completion,
+    # earlier while the stage keeps finishing before its first check
+    def first_delay(self, stage, size_in_gbs=None):
+        return max(self.min_interval, self.first_check_fraction(stage) * self.estimate(stage, size_in_gbs))
+
+    # Delay before the next check once the previous check found the stage unfinished.
+    # Before the ETA, check again at the ETA; after it, back off geometrically
+    # (each delay is a fixed fraction of how overdue the stage already is).
+    def next_delay(self, stage, size_in_gbs, elapsed):
+        remaining = self.estimate(stage, size_in_gbs) - elapsed
+        if remaining > 0:
+            delay = remaining
+        else:
+            delay = -remaining * (self.backoff_factor - 1)
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    # Record an observed stage duration so later runs can predict it better.
+    # censored: the stage was already finished at its first check, so it
+    # took at most duration.
+    def record(self, stage, size_in_gbs, duration, censored=False):
+        with self._lock:
+            samples = self.history.setdefault(stage, [])
+            sample = {"size_in_gbs": size_in_gbs or 0, "duration": round(duration, 1)}
+            if censored:
+                sample["censored"] = True
+            samples.append(sample)
+            del samples[:-MAX_SAMPLES_PER_STAGE]
+            self._save_history()
@@ -0,0 +1,157 @@
+import time
+import random
+import threading
+import logging
+import oci
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 10.0
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+MAX_THROTTLE_RETRIES = 8
+
+
+# SDK retry strategy for clients used behind a RateLimiter: 5xx, timeouts and
+# 409 conflicts are still retried by the SDK, but 429s are left to the limiter
+# so it can slow down instead of the SDK silently retrying
+def retry_strategy_without_throttles():
+    return oci.retry.RetryStrategyBuilder(
+        service_error_check=True,
+        service_error_retry_config={409: ["IncorrectState", "LockConflict"]},
+        service_error_retry_on_any_5xx=True,
+    ).get_retry_strategy()
+
+
+# Every record of a paginated list call, fetched page by page. Unlike
+# oci.pagination, which wraps each page request in the SDK's
+# DEFAULT_RETRY_STRATEGY whatever the client was built with (and so retries
+# 429s on top of the limiter), every page is requested once, through
+# limiter.call when a limiter is given.
+def paginate(list_func, *args, limiter=None, operation=None, **kwargs):
+    while True:
+        if limiter:
+            response = limiter.call(list_func, *args, operation=operation, **kwargs)
+        else:
+            response = list_func(*args, **kwargs)
+        if isinstance(response.data, oci.object_storage.models.ListObjects):
+            yield from response.data.objects
+            if response.data.next_start_with is None:
+                return
+            kwargs["start"] = response.data.next_start_with
+        else:
+            yield from response.data if isinstance(response.data, list) else response.data.items
+            if response.next_page is None:
+                return
+            kwargs["page"] = response.next_page
+
+
+def is_throttled(error):
+    return isinstance(error, oci.exceptions.ServiceError) and error.status == 429
+
+
+# Limits for one API operation: a token bucket for the request rate and a cap
+# on calls in flight. Both follow AIMD: they grow additively while calls
+# succeed and are halved when the service throttles.
+class _OperationLimit:
+    def __init__(self, rate, max_rate, concurrency):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.tokens = max(1.0, rate)
+        self.refilled = time.monotonic()
+        self.concurrency = float(concurrency)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                # The bucket holds at least one token so rates below 1/s still let calls through
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.refilled) * self.rate)
+                self.refilled = now
+                if self.tokens >= 1 and self.in_flight < int(self.concurrency):
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                self.condition.wait(wait)
+
+    def release(self, throttled):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.rate = max(0.5, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+            else:
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+            self.condition.notify_all()
+
+
+# Process-wide limiter for OCI API calls with one limit per operation (e.g.
+# "create_volume_backup", "attach_volume", "get_volume"). Calls that come back
+# 429 shrink the operation's rate and concurrency and are retried after a
+# jittered backoff, so throttling slows the run down instead of failing the
+# workflow; successful calls let the limits grow back to max_rates. With
+# Metrics, calls, throttles and retries are counted per operation.
+class RateLimiter:
+    def __init__(self, default_rate=DEFAULT_RATE, max_rates=None, concurrency=DEFAULT_CONCURRENCY,
+                 max_throttle_retries=MAX_THROTTLE_RETRIES, metrics=None):
+        self.default_rate = default_rate
+        self.max_rates = max_rates or {}
+        self.concurrency = concurrency
+        self.max_throttle_retries = max_throttle_retries
+        self.metrics = metrics
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ratelimitinfo, metrics=None):
+        ratelimitinfo = ratelimitinfo or {}
+        return cls(default_rate=float(ratelimitinfo.get("defaultrate") or DEFAULT_RATE),
+                   max_rates={operation: float(rate) for operation, rate in (ratelimitinfo.get("operationrates") or {}).items()},
+                   concurrency=int(ratelimitinfo.get("concurrency") or DEFAULT_CONCURRENCY),
+                   metrics=metrics)
+
+    def _limit(self, operation):
+        with self._lock:
+            if operation not in self._limits:
+                max_rate = self.max_rates.get(operation, self.default_rate)
+                self._limits[operation] = _OperationLimit(max_rate, max_rate, self.concurrency)
+            return self._limits[operation]
+
+    # Call func under the limit of its operation (func.__name__ unless given)
+    def call(self, func, *args, operation=None, **kwargs):
+        operation = operation or getattr(func, "__name__", "call")
+        limit = self._limit(operation)
+        attempt = 0
+        while True:
+            limit.acquire()
+            if self.metrics:
+                self.metrics.inc("api_calls_total", operation=operation)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttled(e)
+                limit.release(throttled)
+                if throttled and self.metrics:
+                    self.metrics.inc("api_throttles_total", operation=operation)
+                if not throttled or attempt >= self.max_throttle_retries:
+                    raise
+                if self.metrics:
+                    self.metrics.inc("api_retries_total", operation=operation)
+                attempt += 1
+                delay = min(60, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"{operation} throttled, retrying in {delay:.1f}s (attempt {attempt})")
+                time.sleep(delay)
+                continue
+            limit.release(False)
+            return result
+
+    # Current limits per operation, for progress logs
+    def snapshot(self):
+        with self._lock:
+            return {operation: {"rate": round(limit.rate, 2), "concurrency": round(limit.concurrency, 2)}
+                    for operation, limit in self._limits.items()}
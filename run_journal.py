@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+DEFAULT_JOURNAL_PATH = "run_journal.db"
+# Older unfinished runs are closed instead of resumed
+DEFAULT_MAX_RESUME_HOURS = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    datetime_string TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL,
+    workflow TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL,
+    resource_id TEXT,
+    data TEXT,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (run_id, workflow, stage)
+);
+"""
+
+
+# Crash-safe journal of a backup run, kept in SQLite. Each workflow (e.g. one
+# source volume) records its stages as "started" once the resource for the
+# stage has been requested, and as "done" once it is ready, together with the
+# resource's OCID. If the orchestrator dies, the next run resumes the same run
+# (same datetime_string, so names and object prefixes match) and every
+# workflow skips its done stages and only waits for the started ones. A run
+# that died more than max_resume_hours ago is closed instead: its snapshots
+# and restored volumes are too old to finish, and a new run starts afresh.
+class RunJournal:
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, max_resume_hours=DEFAULT_MAX_RESUME_HOURS):
+        self.path = path
+        self.max_resume_hours = max_resume_hours
+        self.run_id = None
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # Resume the last unfinished run if it started less than max_resume_hours
+    # ago, or close it and start a new one stamped with datetime_string.
+    # Returns the datetime_string the run uses.
+    def begin_run(self, datetime_string):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT run_id, datetime_string, started FROM runs WHERE finished IS NULL ORDER BY run_id DESC LIMIT 1").fetchone()
+            if row and datetime.now(timezone.utc) - datetime.fromisoformat(row[2]) < timedelta(hours=self.max_resume_hours):
+                self.run_id, datetime_string = row[:2]
+                self.resumed = True
+            else:
+                self._db.execute("UPDATE runs SET finished = ? WHERE finished IS NULL", (_now(),))
+                self.run_id = self._db.execute("INSERT INTO runs (datetime_string, started) VALUES (?, ?)",
+                                               (datetime_string, _now())).lastrowid
+                self.resumed = False
+        return datetime_string
+
+    def finish_run(self):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (_now(), self.run_id))
+
+    # The journal entry of a stage in this run (or in run_id):
+    # {"state", "resource_id", "data"}, or None
+    def stage(self, workflow, stage, run_id=None):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, resource_id, data FROM stages WHERE run_id = ? AND workflow = ? AND stage = ?",
+                (run_id or self.run_id, workflow, stage)).fetchone()
+        if row is None:
+            return None
+        return {"state": row[0], "resource_id": row[1], "data": json.loads(row[2]) if row[2] else {}}
+
+    def is_done(self, workflow, stage):
+        entry = self.stage(workflow, stage)
+        return entry is not None and entry["state"] == "done"
+
+    # Record that the resource for a stage has been requested
+    def started(self, workflow, stage, resource_id=None, **data):
+        self._write(workflow, stage, "started", resource_id, data)
+
+    # Record that a stage has completed; run_id closes a stage of an earlier
+    # run, as returned by unfinished()
+    def done(self, workflow, stage, resource_id=None, run_id=None, **data):
+        if resource_id is None:
+            entry = self.stage(workflow, stage, run_id)
+            resource_id = entry["resource_id"] if entry else None
+        self._write(workflow, stage, "done", resource_id, data, run_id)
+
+    def _write(self, workflow, stage, state, resource_id, data, run_id=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stages (run_id, workflow, stage, state, resource_id, data, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id or self.run_id, workflow, stage, state, resource_id, json.dumps(data) if data else None, _now()))
+
+    # Resources of a stage that were started but never finished, in any run
+    # (e.g. temporary workers of a run that died), as (run_id, workflow,
+    # resource_id); close them with done(workflow, stage, run_id=run_id)
+    def unfinished(self, stage):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT run_id, workflow, resource_id FROM stages WHERE stage = ? AND state = 'started'", (stage,)).fetchall()
+        return rows
+
+    # Resources of a stage in earlier runs whose cleanup stage never
+    # completed (e.g. export volumes kept for a retry by a run that was then
+    # closed instead of resumed), as (run_id, workflow, resource_id); close
+    # them with done(workflow, cleanup_stage, resource_id, run_id=run_id)
+    def leftovers(self, stage, cleanup_stage):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT run_id, workflow, resource_id FROM stages AS created WHERE stage = ? AND run_id != ? "
+                "AND resource_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM stages AS cleanup WHERE cleanup.run_id = created.run_id "
+                "AND cleanup.workflow = created.workflow AND cleanup.stage = ? AND cleanup.state = 'done')",
+                (stage, self.run_id, cleanup_stage)).fetchall()
+        return rows
+
+    def close(self):
+        self._db.close()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,129 @@
+import io
+import os
+import gzip
+import json
+import tarfile
+import hashlib
+import threading
+from chunk_store import restore_chunks
+
+SMALL_FILE_SIZE = 1024 * 1024
+SEGMENT_SIZE = 128 * 1024 * 1024
+MAX_PENDING_SEGMENTS = 2
+INDEX_NAME = "index.jsonl.gz"
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+# Packs the small files of a volume into tar segment objects of about
+# segment_size bytes, so a volume of tiny files costs one PUT per segment
+# instead of one per file. Files of small_file_size bytes or more are
+# uploaded as objects of their own, or split into deduplicated chunks when a
+# chunk_store is given. Every file is listed in a gzipped JSON-lines index
+# object next to the segments, which is the snapshot's manifest:
+#   [path, segment object, data offset, length, sha256] for packed files
+#   [path, object, null, length, null] for files uploaded on their own
+#   [path, null, null, length, null, [chunk ids]] for chunked files
+# so a single file can be restored with one ranged GET (see restore_file).
+# Segments are plain tar archives and can also be extracted with tar.
+class SegmentPacker:
+    def __init__(self, upload_engine, prefix, segment_size=SEGMENT_SIZE, small_file_size=SMALL_FILE_SIZE,
+                 max_pending_segments=MAX_PENDING_SEGMENTS, chunk_store=None):
+        self.upload_engine = upload_engine
+        self.chunk_store = chunk_store
+        self.prefix = prefix
+        self.segment_size = segment_size
+        self.small_file_size = small_file_size
+        self.files = 0
+        self.bytes = 0
+        self.segments = 0
+        self._segment = bytearray()
+        self._segment_name = None
+        # Segments are held in memory until uploaded; bound how many wait at once
+        self._pending = threading.Semaphore(max_pending_segments)
+        self._index = io.BytesIO()
+        self._index_writer = gzip.GzipFile(fileobj=self._index, mode="wb")
+
+    def _write_index(self, entry):
+        self._index_writer.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+
+    # Add one file of the volume; path is its path relative to the volume root
+    def add(self, file_path, path):
+        file_size = os.path.getsize(file_path)
+        self.files += 1
+        self.bytes += file_size
+        if file_size >= self.small_file_size and self.chunk_store:
+            self._write_index([path, None, None, file_size, None, self.chunk_store.add(file_path)])
+            return
+        if file_size >= self.small_file_size:
+            object_name = f"{self.prefix}/{path}"
+            self.upload_engine.submit(file_path, object_name)
+            self._write_index([path, object_name, None, file_size, None])
+            return
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        stat = os.stat(file_path)
+        tarinfo = tarfile.TarInfo(path)
+        tarinfo.size = len(data)
+        tarinfo.mtime = int(stat.st_mtime)
+        tarinfo.mode = stat.st_mode & 0o7777
+        header = tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        if self._segment_name is None:
+            self._segment_name = f"{self.prefix}/segments/{self.segments:06d}.tar"
+            self.segments += 1
+        offset = len(self._segment) + len(header)
+        self._segment += header
+        self._segment += data
+        self._segment += b"\0" * (-len(data) % BLOCK_SIZE)
+        self._write_index([path, self._segment_name, offset, len(data), hashlib.sha256(data).hexdigest()])
+        if len(self._segment) >= self.segment_size:
+            self._flush_segment()
+
+    def _flush_segment(self):
+        if self._segment_name is None:
+            return
+        # Two zero blocks end a tar archive
+        self._segment += b"\0" * (2 * BLOCK_SIZE)
+        self._pending.acquire()
+        self.upload_engine.submit_data(self._segment_name, bytes(self._segment), callback=lambda succeeded: self._pending.release())
+        self._segment = bytearray()
+        self._segment_name = None
+
+    # Upload the last segment and the index
+    def close(self):
+        self._flush_segment()
+        self._index_writer.close()
+        self.upload_engine.submit_data(f"{self.prefix}/{INDEX_NAME}", self._index.getvalue())
+
+
+# Index entry of one file of a packed volume, or None if it isn't in the index
+def find_entry(object_storage, namespace, bucket_name, prefix, path):
+    index = object_storage.get_object(namespace, bucket_name, f"{prefix}/{INDEX_NAME}").data.content
+    for line in gzip.decompress(index).splitlines():
+        entry = json.loads(line)
+        if entry[0] == path:
+            return entry
+    return None
+
+
+# Restore one file of a packed volume: a ranged GET of its bytes in the
+# segment (checked against the index checksum), a GET of its own object or
+# a GET of each of its chunks
+def restore_file(object_storage, namespace, bucket_name, prefix, path, destination):
+    entry = find_entry(object_storage, namespace, bucket_name, prefix, path)
+    if entry is None:
+        raise FileNotFoundError(f"{path} is not in the index of {prefix}")
+    if len(entry) > 5:
+        return restore_chunks(object_storage, namespace, bucket_name, entry[5], destination)
+    path, object_name, offset, length, checksum = entry
+    if offset is None:
+        data = object_storage.get_object(namespace, bucket_name, object_name).data.content
+    elif length == 0:
+        data = b""
+    else:
+        data = object_storage.get_object(namespace, bucket_name, object_name,
+                                         range=f"bytes={offset}-{offset + length - 1}").data.content
+        if hashlib.sha256(data).hexdigest() != checksum:
+            raise ValueError(f"Checksum mismatch restoring {path} from {object_name}")
+    with open(destination, 'wb') as file:
+        file.write(data)
+    return destination
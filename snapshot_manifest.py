@@ -0,0 +1,93 @@
+import gzip
+import json
+from datetime import datetime, timezone, timedelta
+import segment_packer
+from rate_limiter import paginate
+
+MANIFEST_NAME = "manifest.json.gz"
+LATEST_PREFIX = "latest/"
+
+
+# Manifests make file-level exports a synthetic-full chain. Every snapshot
+# prefix gets a gzipped JSON manifest:
+#   {"prefix": ..., "previous": prefix of the prior snapshot or null,
+#    "created": ..., "verified": time of the last export that hashed every file,
+#    "files": {path: {"timestamp", "size", "mtime_ns", "inode", "ctime_ns",
+#                     "xxhash", "snapshot"}},
+#    "tombstones": [paths deleted since the prior snapshot]}
+# "files" lists every file on the volume at that point, with "snapshot" the
+# prefix whose index holds its data, so an incremental export only uploads
+# new and changed files yet any snapshot restores like a full one. Every
+# saved manifest adds a latest/<volume OCID>/<UTC time> pointer object
+# holding its prefix; the bucket is immutable, so pointers are never
+# overwritten and the newest one by name is the baseline of the volume's
+# next export. The stat fields let that export skip hashing files that have
+# not been touched (see get_file_metadata).
+def build_manifest(prefix, previous, current_metadata, modified_files, deleted_files, verified=False):
+    previous_files = previous["files"] if previous else {}
+    modified = set(modified_files)
+    files = {}
+    for path, metadata in current_metadata.items():
+        snapshot = prefix if path in modified else previous_files[path]["snapshot"]
+        files[path] = {**metadata, "snapshot": snapshot}
+    created = datetime.now(timezone.utc).isoformat()
+    return {
+        "prefix": prefix,
+        "previous": previous["prefix"] if previous else None,
+        "created": created,
+        "verified": created if verified or not previous else previous.get("verified"),
+        "files": files,
+        "tombstones": sorted(deleted_files),
+    }
+
+
+def load_manifest(object_storage, namespace, bucket_name, prefix):
+    content = object_storage.get_object(namespace, bucket_name, f"{prefix}/{MANIFEST_NAME}").data.content
+    return json.loads(gzip.decompress(content))
+
+
+# Whether the next export of a volume should hash every file: its chain has
+# not been fully verified for verify_days days (never when verify_days is 0)
+def needs_full_verify(previous, verify_days):
+    if not previous or not verify_days:
+        return False
+    if not previous.get("verified"):
+        return True
+    return datetime.now(timezone.utc) - datetime.fromisoformat(previous["verified"]) > timedelta(days=verify_days)
+
+
+# Newest manifest of a volume, or None before its first export
+def load_latest_manifest(object_storage, namespace, bucket_name, volume_key):
+    pointers = [summary.name for summary in paginate(object_storage.list_objects, namespace, bucket_name,
+                                                     prefix=f"{LATEST_PREFIX}{volume_key}/", fields="name")]
+    if not pointers:
+        return None
+    prefix = object_storage.get_object(namespace, bucket_name, max(pointers)).data.content.decode("utf-8")
+    return load_manifest(object_storage, namespace, bucket_name, prefix)
+
+
+# Store the manifest, then add a latest pointer to it for the volume; call
+# only once every file of the snapshot is uploaded
+def save_manifest(object_storage, namespace, bucket_name, manifest, volume_key):
+    content = gzip.compress(json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+    object_storage.put_object(namespace, bucket_name, f"{manifest['prefix']}/{MANIFEST_NAME}", content)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    object_storage.put_object(namespace, bucket_name, f"{LATEST_PREFIX}{volume_key}/{stamp}", manifest["prefix"].encode("utf-8"))
+
+
+# Manifests of the chain ending at prefix, newest first
+def manifest_chain(object_storage, namespace, bucket_name, prefix):
+    while prefix:
+        manifest = load_manifest(object_storage, namespace, bucket_name, prefix)
+        yield manifest
+        prefix = manifest["previous"]
+
+
+# Restore a file as it was in the snapshot at prefix
+def restore_file(object_storage, namespace, bucket_name, prefix, path, destination):
+    manifest = load_manifest(object_storage, namespace, bucket_name, prefix)
+    entry = manifest["files"].get(path)
+    if entry is None:
+        state = "was deleted before" if path in manifest["tombstones"] else "is not in"
+        raise FileNotFoundError(f"{path} {state} snapshot {prefix}")
+    return segment_packer.restore_file(object_storage, namespace, bucket_name, entry["snapshot"], path, destination)
@@ -0,0 +1,66 @@
+import io
+import tarfile
+import pytest
+import fake_oci
+from archive_stream import (MEBIBYTE, PART_SIZE, PARALLEL_PARTS, MAX_BUFFERED_PARTS, MEMORY_BUDGET, MAX_PARTS,
+                            stream_layout, upload_stream, upload_directory_archive)
+
+GB = 1024 ** 3
+
+
+@pytest.fixture
+def storage():
+    cloud = fake_oci.FakeCloud(api_latency=0)
+    return cloud, fake_oci.FakeObjectStorageClient(cloud)
+
+
+def test_part_size_grows_with_the_volume_within_the_memory_budget():
+    assert stream_layout() == (PART_SIZE, PARALLEL_PARTS, MAX_BUFFERED_PARTS)
+    assert stream_layout(100 * GB) == (PART_SIZE, PARALLEL_PARTS, MAX_BUFFERED_PARTS)
+    part_size, parallel_parts, buffered_parts = stream_layout(2048 * GB)
+    assert part_size * MAX_PARTS >= 2048 * GB
+    assert part_size * (parallel_parts + buffered_parts + 1) <= MEMORY_BUDGET
+
+
+def test_largest_object_fits_with_fewer_parts_in_memory():
+    part_size, parallel_parts, buffered_parts = stream_layout(10 * 1024 * GB)
+    assert part_size * MAX_PARTS >= 10 * 1024 * GB and part_size % MEBIBYTE == 0
+    assert parallel_parts >= 1 and part_size * (parallel_parts + buffered_parts + 1) <= MEMORY_BUDGET
+
+
+def test_volume_too_large_for_the_memory_budget_is_refused():
+    with pytest.raises(ValueError):
+        stream_layout(10 * 1024 * GB, memory_budget=2 * GB)
+    part_size, parallel_parts, buffered_parts = stream_layout(32 * 1024 * GB, memory_budget=16 * GB)
+    assert part_size * (parallel_parts + buffered_parts + 1) <= 16 * GB
+
+
+def test_stream_is_uploaded_in_parts_and_committed(storage):
+    cloud, client = storage
+    data = bytes(range(256)) * 20000
+    uploaded = upload_stream(client, "ns", "bucket", "stream", io.BytesIO(data), part_size=1000 * 1000)
+    assert uploaded == len(data)
+    assert cloud.objects[("bucket", "stream")] == data
+    assert cloud.calls["upload_part"] == 6
+
+
+def test_failed_producer_aborts_the_upload(storage):
+    cloud, client = storage
+
+    def check():
+        raise RuntimeError("tar exited with status 2")
+
+    with pytest.raises(RuntimeError):
+        upload_stream(client, "ns", "bucket", "stream", io.BytesIO(b"partial archive"), check=check)
+    assert ("bucket", "stream") not in cloud.objects
+    assert cloud.calls["abort_multipart_upload"] == 1 and "commit_multipart_upload" not in cloud.calls
+    assert cloud.multipart_uploads == {}
+
+
+def test_directory_is_uploaded_as_a_gzipped_tar(tmp_path, storage):
+    cloud, client = storage
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc" / "hosts").write_bytes(b"127.0.0.1 localhost\n")
+    upload_directory_archive(client, "ns", "bucket", "volume.tar.gz", str(tmp_path))
+    with tarfile.open(fileobj=io.BytesIO(cloud.objects[("bucket", "volume.tar.gz")]), mode="r:gz") as archive:
+        assert archive.extractfile("etc/hosts").read() == b"127.0.0.1 localhost\n"
@@ -0,0 +1,66 @@
+import json
+import benchmark
+from backup_catalog import BackupCatalog
+
+
+def test_full_mode_always_takes_full_backups():
+    catalog = BackupCatalog(path=None, mode="full")
+    catalog.record("vol", "b1", "FULL")
+    assert catalog.backup_type("vol") == "FULL"
+
+
+def test_incremental_chain_restarts_after_full_every():
+    catalog = BackupCatalog(path=None, mode="incremental", full_every=3)
+    assert catalog.backup_type("vol") == "FULL"
+    catalog.record("vol", "b1", "FULL")
+    assert catalog.backup_type("vol") == "INCREMENTAL"
+    catalog.record("vol", "b2", "INCREMENTAL")
+    catalog.record("vol", "b3", "INCREMENTAL")
+    assert catalog.backup_type("vol") == "FULL"
+
+
+def test_record_expires_chains_beyond_retention():
+    catalog = BackupCatalog(path=None, mode="incremental", retained_chains=1)
+    assert catalog.record("vol", "b1", "FULL") == []
+    catalog.record("vol", "b2", "INCREMENTAL")
+    assert catalog.record("vol", "b3", "FULL") == []
+    assert catalog.in_chain("vol", "b1") and catalog.in_chain("vol", "b2")
+    assert catalog.record("vol", "b4", "FULL") == ["b1", "b2"]
+    assert not catalog.in_chain("vol", "b1")
+    assert catalog.in_chain("vol", "b3")
+
+
+def test_catalog_is_persisted(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    BackupCatalog(path=path, mode="incremental").record("vol", "b1", "FULL")
+    assert BackupCatalog(path=path, mode="incremental").in_chain("vol", "b1")
+
+
+def run_boot_backup(monkeypatch, backupmode):
+    config = benchmark.benchmark_config
+
+    def with_backupmode(work_dir, time_scale):
+        config_data, config_path = config(work_dir, time_scale)
+        config_data["backupinfo"]["backupmode"] = backupmode
+        with open(config_path, "w") as config_file:
+            json.dump(config_data, config_file)
+        return config_data, config_path
+
+    recorded = []
+    record = BackupCatalog.record
+    monkeypatch.setattr(benchmark, "benchmark_config", with_backupmode)
+    monkeypatch.setattr(BackupCatalog, "record", lambda self, *args: recorded.append(args) or record(self, *args))
+    result = benchmark.run_once("boot", 2, benchmark.parse_args(["--no-tracemalloc"]))
+    assert result["error"] is None
+    return result, recorded
+
+
+def test_boot_backups_are_not_recorded_or_deleted_in_full_mode(monkeypatch):
+    result, recorded = run_boot_backup(monkeypatch, "full")
+    assert recorded == []
+    assert "delete_boot_volume_backup" not in result["calls_by_operation"]
+
+
+def test_boot_backups_are_recorded_in_incremental_mode(monkeypatch):
+    result, recorded = run_boot_backup(monkeypatch, "incremental")
+    assert len(recorded) == 2
@@ -0,0 +1,63 @@
+import sqlite3
+import benchmark
+
+OPTIONS = ["--no-tracemalloc", "--volumes", "1,2", "--sizes", "50,60"]
+
+
+def run_block(*options):
+    return benchmark.run_once("block", 2, benchmark.parse_args([*OPTIONS, *options]))
+
+
+# A run whose worker uploads all fail, then a second run in the same tenancy
+# and working directory, prepared by between_runs(cloud, work_dir)
+def run_block_twice(between_runs):
+    args = benchmark.parse_args([*OPTIONS, "--worker-failure-rate", "1"])
+    cloud = benchmark.make_cloud(args)
+    with benchmark.tempfile.TemporaryDirectory(prefix="cra-benchmark-") as work_dir:
+        config_data, config_path = benchmark.benchmark_config(work_dir, args.time_scale)
+        volume_count = benchmark.add_fleet(cloud, config_data, 2, args)
+        first = benchmark.run_script("block", cloud, work_dir, config_data, config_path, 2, volume_count, args)
+        assert first["error"] is None and first["failures"] == volume_count
+        between_runs(cloud, benchmark.os.path.join(work_dir, f"{config_data['region']}_run_journal.db"))
+        second = benchmark.run_script("block", cloud, work_dir, config_data, config_path, 2, volume_count, args)
+    return first, second
+
+
+def test_failed_worker_upload_fails_the_volume_and_keeps_its_resources():
+    result = run_block("--worker-failure-rate", "1")
+    assert result["error"] is None
+    assert result["failures"] == result["volumes"]
+    assert "delete_volume" not in result["calls_by_operation"]
+    assert "delete_volume_backup" not in result["calls_by_operation"]
+
+
+def test_next_run_resumes_failed_volumes_on_their_kept_resources():
+    def worker_recovers(cloud, journal_path):
+        cloud.failure_rates["backup_script"] = 0
+
+    first, second = run_block_twice(worker_recovers)
+    assert second["error"] is None and second["failures"] == 0
+    # The export volumes and backups kept by the first run are reused, then deleted
+    assert second["calls_by_operation"]["create_volume"] == first["volumes"]
+    assert second["calls_by_operation"]["delete_volume"] == first["volumes"]
+    assert second["calls_by_operation"]["delete_volume_backup"] == first["volumes"]
+
+
+def test_next_run_deletes_resources_kept_by_a_run_too_old_to_resume():
+    def run_goes_stale(cloud, journal_path):
+        cloud.failure_rates["backup_script"] = 0
+        with sqlite3.connect(journal_path) as db:
+            db.execute("UPDATE runs SET started = '2000-01-01T00:00:00+00:00'")
+
+    first, second = run_block_twice(run_goes_stale)
+    assert second["error"] is None and second["failures"] == 0
+    # A fresh run exports every volume again and deletes the first run's leftovers too
+    assert second["calls_by_operation"]["create_volume"] == 2 * first["volumes"]
+    assert second["calls_by_operation"]["delete_volume"] == 2 * first["volumes"]
+    assert second["calls_by_operation"]["delete_volume_backup"] == 2 * first["volumes"]
+
+
+def test_successful_upload_cleans_up():
+    result = run_block()
+    assert result["error"] is None and result["failures"] == 0
+    assert result["calls_by_operation"]["delete_volume"] == result["volumes"]
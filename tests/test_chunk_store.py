@@ -0,0 +1,85 @@
+import io
+import random
+import pytest
+import fake_oci
+import chunk_store
+from chunk_store import ChunkStore, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE, chunks, restore_chunks
+from upload_engine import UploadEngine
+
+
+def random_bytes(size, seed):
+    return random.Random(seed).randbytes(size)
+
+
+def test_chunks_cover_the_stream_within_size_bounds():
+    data = random_bytes(12 * 1024 * 1024, 1)
+    pieces = list(chunks(io.BytesIO(data)))
+    assert b"".join(pieces) == data
+    assert all(MIN_CHUNK_SIZE <= len(piece) <= MAX_CHUNK_SIZE for piece in pieces[:-1])
+    assert len(pieces[-1]) <= MAX_CHUNK_SIZE
+
+
+def test_boundaries_follow_content_not_offsets():
+    data = random_bytes(8 * 1024 * 1024, 2)
+    before = [chunk_store.chunk_id(piece) for piece in chunks(io.BytesIO(data))]
+    after = [chunk_store.chunk_id(piece) for piece in chunks(io.BytesIO(b"inserted" + data))]
+    # Only the chunk holding the insertion changes; the ones after it line up again
+    assert before[0] != after[0]
+    assert before[1:] == after[1:]
+
+
+def test_data_without_boundaries_is_cut_at_max_chunk_size():
+    pieces = list(chunks(io.BytesIO(b"\0" * (MAX_CHUNK_SIZE * 2 + 10))))
+    assert [len(piece) for piece in pieces] == [MAX_CHUNK_SIZE, MAX_CHUNK_SIZE, 10]
+    assert b"".join(pieces) == b"\0" * (MAX_CHUNK_SIZE * 2 + 10)
+
+
+@pytest.fixture
+def storage():
+    cloud = fake_oci.FakeCloud(api_latency=0, immutable_buckets=["bucket"])
+    return cloud, fake_oci.FakeObjectStorageClient(cloud)
+
+
+def export(client, volume_key, file_path):
+    engine = UploadEngine(client, "ns", "bucket", concurrency=4)
+    store = ChunkStore(engine)
+    store.load(volume_key)
+    chunk_ids = store.add(file_path)
+    engine.wait()
+    store.save(volume_key)
+    engine.close()
+    assert engine.failures == []
+    return store, chunk_ids
+
+
+def test_volume_index_skips_known_chunks_without_listing_the_chunk_store(tmp_path, storage):
+    cloud, client = storage
+    file_path = tmp_path / "disk.img"
+    file_path.write_bytes(random_bytes(6 * 1024 * 1024, 3))
+
+    first, chunk_ids = export(client, "ocid1.volume.oc1.fake.1", str(file_path))
+    assert first.new_chunks == len(set(chunk_ids)) and cloud.calls["put_object"] == len(set(chunk_ids)) + 1
+
+    cloud.calls.clear()
+    second, _ = export(client, "ocid1.volume.oc1.fake.1", str(file_path))
+    assert second.new_chunks == 0
+    assert "put_object" not in cloud.calls
+    assert cloud.calls["list_objects"] == 1 and cloud.calls["get_object"] == 1
+
+    restore_chunks(client, "ns", "bucket", chunk_ids, str(tmp_path / "restored.img"))
+    assert (tmp_path / "restored.img").read_bytes() == file_path.read_bytes()
+
+
+def test_chunks_of_another_volume_are_not_overwritten(tmp_path, storage):
+    cloud, client = storage
+    file_path = tmp_path / "disk.img"
+    file_path.write_bytes(random_bytes(3 * 1024 * 1024, 4))
+    _, chunk_ids = export(client, "ocid1.volume.oc1.fake.1", str(file_path))
+    uploaded_bytes = cloud.uploaded_bytes
+
+    # The immutable bucket would reject an overwrite; If-None-Match skips the existing chunks instead
+    other, _ = export(client, "ocid1.volume.oc1.fake.2", str(file_path))
+    assert other.new_chunks == len(set(chunk_ids))
+    index_names = [name for _, name in cloud.objects if name.startswith("chunk-index/ocid1.volume.oc1.fake.2/")]
+    assert len(index_names) == 1
+    assert cloud.uploaded_bytes - uploaded_bytes == len(cloud.objects[("bucket", index_names[0])])
@@ -0,0 +1,71 @@
+import os
+import detect_block_changes
+from detect_block_changes import get_file_metadata, find_modified_files, find_deleted_files
+
+
+def scan(path, monkeypatch, **kwargs):
+    hashed = []
+    calculate_xxhash = detect_block_changes.calculate_xxhash
+
+    def counting(file_path):
+        hashed.append(os.path.relpath(file_path, path))
+        return calculate_xxhash(file_path)
+
+    monkeypatch.setattr(detect_block_changes, "calculate_xxhash", counting)
+    metadata = get_file_metadata(str(path), ignore_extensions=[".tmp"], ignore_folders=["cache"], **kwargs)[0]
+    monkeypatch.setattr(detect_block_changes, "calculate_xxhash", calculate_xxhash)
+    return {os.path.relpath(file_path, path): data for file_path, data in metadata.items()}, sorted(hashed)
+
+
+def absolute(path, metadata):
+    return {os.path.join(str(path), name): data for name, data in metadata.items()}
+
+
+def make_volume(tmp_path):
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / "skipped").write_bytes(b"ignored folder")
+    (tmp_path / "scratch.tmp").write_bytes(b"ignored extension")
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_bytes(name.encode() * 10)
+
+
+def test_only_files_with_changed_stat_are_hashed(tmp_path, monkeypatch):
+    make_volume(tmp_path)
+    baseline, hashed = scan(tmp_path, monkeypatch)
+    assert sorted(baseline) == ["a", "b", "c"] and hashed == ["a", "b", "c"]
+
+    (tmp_path / "b").write_bytes(b"changed content")
+    (tmp_path / "d").write_bytes(b"new")
+    (tmp_path / "c").unlink()
+    current, hashed = scan(tmp_path, monkeypatch, baseline=absolute(tmp_path, baseline))
+
+    assert hashed == ["b", "d"]
+    assert sorted(find_modified_files(baseline, current)) == ["b", "d"]
+    assert find_deleted_files(baseline, current) == ["c"]
+
+
+def test_touched_but_identical_file_is_not_reported(tmp_path, monkeypatch):
+    make_volume(tmp_path)
+    baseline, _ = scan(tmp_path, monkeypatch)
+    (tmp_path / "a").write_bytes(b"a" * 10)
+    current, hashed = scan(tmp_path, monkeypatch, baseline=absolute(tmp_path, baseline))
+    assert "a" in hashed
+    assert find_modified_files(baseline, current) == []
+
+
+def test_verify_catches_changes_that_keep_the_stat_fields(tmp_path, monkeypatch):
+    make_volume(tmp_path)
+    baseline, _ = scan(tmp_path, monkeypatch)
+    # Same size, mtime and inode; only ctime moves, which some tools can hide (e.g. restored snapshots)
+    stat = os.stat(tmp_path / "a")
+    with open(tmp_path / "a", "r+b") as file:
+        file.write(b"A")
+    os.utime(tmp_path / "a", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    faked = absolute(tmp_path, baseline)
+    faked[os.path.join(str(tmp_path), "a")]["ctime_ns"] = os.stat(tmp_path / "a").st_ctime_ns
+
+    current, hashed = scan(tmp_path, monkeypatch, baseline=faked)
+    assert hashed == [] and find_modified_files(baseline, current) == []
+
+    current, hashed = scan(tmp_path, monkeypatch, baseline=faked, verify=True)
+    assert hashed == ["a", "b", "c"] and find_modified_files(baseline, current) == ["a"]
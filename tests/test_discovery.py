@@ -0,0 +1,77 @@
+import oci
+from fake_oci import FakeCloud, FakeComputeClient, FakeIdentityClient, FakeResourceSearchClient
+from inventory import Inventory
+from discovery import SearchDiscovery, CompartmentScanDiscovery, FallbackDiscovery, subtree_compartments
+
+TENANCY = "ocid1.tenancy.oc1..fake"
+
+
+# A tenancy with compartments root > child > grandchild and a sibling of
+# root, each with one instance tagged the freeform way, one tagged the defined
+# way and one untagged
+def make_cloud():
+    cloud = FakeCloud(api_latency=0, page_size=2)
+    cloud.add_compartment(TENANCY, "root")
+    cloud.add_compartment("root", "child")
+    cloud.add_compartment("child", "grandchild")
+    cloud.add_compartment(TENANCY, "sibling")
+    for compartment_id in ("root", "child", "grandchild", "sibling"):
+        cloud.add_fleet(1, compartment_id, volumes_per_instance=(0, 0), freeform_tags={"CRA-Backup": "True"})
+        cloud.add_fleet(1, compartment_id, volumes_per_instance=(0, 0))[0].defined_tags = {"crabackup": {"enabled": "true"}}
+        cloud.add_fleet(1, compartment_id, volumes_per_instance=(0, 0))
+    return cloud
+
+
+def discovered_compartments(discovery):
+    return sorted(instance.compartment_id for instance in discovery.discover())
+
+
+def search_discovery(cloud, tenancy_id=TENANCY, tag_namespace="crabackup", tag_name="enabled"):
+    return SearchDiscovery(FakeResourceSearchClient(cloud), FakeIdentityClient(cloud), ["root"], "CRA-Backup", "True",
+                           tag_namespace, tag_name, tenancy_id=tenancy_id)
+
+
+def scan_discovery(cloud):
+    return CompartmentScanDiscovery(Inventory(FakeComputeClient(cloud)), FakeIdentityClient(cloud), ["root"],
+                                    "CRA-Backup", "True", "crabackup", "enabled", tenancy_id=TENANCY)
+
+
+def test_subtree_is_listed_in_one_call_with_the_tenancy():
+    cloud = make_cloud()
+    assert sorted(subtree_compartments(FakeIdentityClient(cloud), ["root"], tenancy_id=TENANCY)) == ["child", "grandchild", "root"]
+    # page_size 2: the four compartments of the tenancy take two pages of a single list
+    assert cloud.calls["list_compartments"] == 2
+
+
+def test_subtree_walk_without_the_tenancy_finds_the_same_compartments():
+    cloud = make_cloud()
+    assert sorted(subtree_compartments(FakeIdentityClient(cloud), ["root"])) == ["child", "grandchild", "root"]
+
+
+def test_search_discovery_matches_freeform_and_defined_tags_in_the_subtree():
+    cloud = make_cloud()
+    assert discovered_compartments(search_discovery(cloud)) == ["child", "child", "grandchild", "grandchild", "root", "root"]
+
+
+def test_search_discovery_without_a_defined_tag_matches_freeform_tags_only():
+    cloud = make_cloud()
+    assert discovered_compartments(search_discovery(cloud, tag_namespace=None, tag_name=None)) == ["child", "grandchild", "root"]
+
+
+def test_compartment_scan_finds_the_same_instances():
+    cloud = make_cloud()
+    assert discovered_compartments(scan_discovery(cloud)) == discovered_compartments(search_discovery(cloud))
+
+
+# Resource Search client of a principal without the permission to use it
+class ForbiddenSearchClient:
+    def search_resources(self, search_details, **kwargs):
+        raise oci.exceptions.ServiceError(404, "NotAuthorizedOrNotFound", {}, "search not allowed")
+
+
+def test_fallback_discovery_scans_compartments_when_search_fails():
+    cloud = make_cloud()
+    search = SearchDiscovery(ForbiddenSearchClient(), FakeIdentityClient(cloud), ["root"], "CRA-Backup", "True",
+                             "crabackup", "enabled", tenancy_id=TENANCY)
+    assert discovered_compartments(FallbackDiscovery(search, scan_discovery(cloud))) == \
+        ["child", "child", "grandchild", "grandchild", "root", "root"]
@@ -0,0 +1,63 @@
+import oci
+import pytest
+import fake_oci
+from polling_policy import DEFAULT_STAGE_MODELS
+
+
+def test_durations_are_jittered_and_independent_of_the_polling_priors():
+    cloud = fake_oci.FakeCloud()
+    durations = [cloud.duration("volume_backup", 100) for _ in range(200)]
+    fixed, per_gb = DEFAULT_STAGE_MODELS["volume_backup"]
+    assert len(set(durations)) == len(durations)
+    assert not any(duration == fixed + per_gb * 100 for duration in durations)
+    assert min(durations) < sorted(durations)[100] < max(durations)
+
+
+def test_large_volumes_take_longer_per_gb():
+    cloud = fake_oci.FakeCloud(jitter=0)
+    fixed, _ = cloud.latencies["volume_upload"]
+    assert (cloud.duration("volume_upload", 1000) - fixed) / 1000 > (cloud.duration("volume_upload", 10) - fixed) / 10
+
+
+def test_without_jitter_or_skew_durations_follow_the_table():
+    cloud = fake_oci.FakeCloud(jitter=0, size_skew=0, latencies={"volume_backup": (10, 2.0)})
+    assert cloud.duration("volume_backup", 50) == 110
+
+
+def test_object_storage_keeps_objects():
+    cloud = fake_oci.FakeCloud(api_latency=0, page_size=2)
+    client = fake_oci.FakeObjectStorageClient(cloud)
+    for name in ("a/1", "a/2", "a/3", "b/1"):
+        client.put_object("ns", "bucket", name, name.encode())
+
+    assert client.get_object("ns", "bucket", "a/2").data.content == b"a/2"
+    assert client.get_object("ns", "bucket", "a/3", range="bytes=1-2").data.content == b"/3"
+    first = client.list_objects("ns", "bucket", prefix="a/").data
+    assert [summary.name for summary in first.objects] == ["a/1", "a/2"] and first.next_start_with == "a/3"
+    with pytest.raises(oci.exceptions.ServiceError) as error:
+        client.head_object("ns", "bucket", "c/1")
+    assert error.value.status == 404
+
+
+def test_immutable_bucket_rejects_overwrites_and_deletes():
+    cloud = fake_oci.FakeCloud(api_latency=0, immutable_buckets=["bucket"])
+    client = fake_oci.FakeObjectStorageClient(cloud)
+    client.put_object("ns", "bucket", "latest/volume", b"one")
+    for call in (lambda: client.put_object("ns", "bucket", "latest/volume", b"two"),
+                 lambda: client.delete_object("ns", "bucket", "latest/volume")):
+        with pytest.raises(oci.exceptions.ServiceError) as error:
+            call()
+        assert error.value.status == 409
+    assert client.get_object("ns", "bucket", "latest/volume").data.content == b"one"
+
+
+def test_multipart_upload_is_assembled_on_commit():
+    cloud = fake_oci.FakeCloud(api_latency=0)
+    client = fake_oci.FakeObjectStorageClient(cloud)
+    models = oci.object_storage.models
+    upload_id = client.create_multipart_upload("ns", "bucket", models.CreateMultipartUploadDetails(object="big")).data.upload_id
+    etags = {part_num: client.upload_part("ns", "bucket", "big", upload_id, part_num, data).headers["etag"]
+             for part_num, data in ((2, b"world"), (1, b"hello "))}
+    client.commit_multipart_upload("ns", "bucket", "big", upload_id, models.CommitMultipartUploadDetails(parts_to_commit=[
+        models.CommitMultipartUploadPartDetails(part_num=part_num, etag=etag) for part_num, etag in etags.items()]))
+    assert client.get_object("ns", "bucket", "big").data.content == b"hello world"
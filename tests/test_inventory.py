@@ -0,0 +1,55 @@
+import copy
+import fake_oci
+from inventory import Inventory
+
+COMPARTMENT = "ocid1.compartment.oc1..fake"
+
+
+def make_inventory():
+    cloud = fake_oci.FakeCloud(api_latency=0)
+    instances = cloud.add_fleet(3, COMPARTMENT, volumes_per_instance=(2, 2))
+    return cloud, instances, Inventory(fake_oci.FakeComputeClient(cloud))
+
+
+def test_attachment_event_updates_only_the_affected_entry():
+    cloud, instances, inventory = make_inventory()
+    attachments = inventory.volume_attachments(COMPARTMENT)
+    detached = copy.copy(attachments[0])
+    detached.lifecycle_state = "DETACHED"
+
+    inventory.on_lifecycle_event("volume_attachment", detached)
+    updated = inventory.volume_attachments(COMPARTMENT)
+
+    assert cloud.calls["list_volume_attachments"] == 1
+    assert len(updated) == len(attachments)
+    assert [attachment for attachment in updated if attachment.id == detached.id] == [detached]
+    assert {attachment.id for attachment in updated} == {attachment.id for attachment in attachments}
+
+
+def test_new_attachment_is_added_to_the_cached_list():
+    cloud, instances, inventory = make_inventory()
+    inventory.volume_attachments(COMPARTMENT)
+    attachment = copy.copy(inventory.volume_attachments(COMPARTMENT, instances[0].id)[0])
+    attachment.id = "ocid1.volumeattachment.oc1.fake.new"
+
+    inventory.on_lifecycle_event("volume_attachment", attachment)
+
+    assert cloud.calls["list_volume_attachments"] == 1
+    assert attachment in inventory.volume_attachments(COMPARTMENT, instances[0].id)
+
+
+def test_instance_event_keeps_attachment_lists_cached():
+    cloud, instances, inventory = make_inventory()
+    inventory.volume_attachments(COMPARTMENT)
+    list(inventory.iter_instances(COMPARTMENT))
+    stopped = copy.copy(instances[1])
+    stopped.lifecycle_state = "STOPPED"
+
+    inventory.on_lifecycle_event("instance", stopped)
+
+    assert inventory.instance(stopped.id) is stopped
+    assert stopped in inventory.instances(COMPARTMENT)
+    inventory.volume_attachments(COMPARTMENT)
+    assert cloud.calls["list_volume_attachments"] == 1
+    assert cloud.calls["list_instances"] == 1
+    assert "get_instance" not in cloud.calls
@@ -0,0 +1,57 @@
+import oci
+import pytest
+from fake_oci import FakeCloud, FakeBlockstorageClient
+from lifecycle_waiter import LifecycleWaiter
+
+
+def make_waiter(cloud, blockstorage=None):
+    return LifecycleWaiter(None, blockstorage or FakeBlockstorageClient(cloud), poll_interval=0.01)
+
+
+def test_wait_resolves_when_the_target_state_is_reached():
+    cloud = FakeCloud(api_latency=0)
+    cloud.add("volume", oci.core.models.Volume(id="restoring", compartment_id="compartment", lifecycle_state="RESTORING"))
+    cloud.transition("restoring", ("AVAILABLE", 20))
+    waiter = make_waiter(cloud)
+    try:
+        assert waiter.wait("volume", "restoring", "AVAILABLE", "compartment", timeout=5).lifecycle_state == "AVAILABLE"
+    finally:
+        waiter.stop()
+
+
+def test_wait_fails_at_once_when_the_resource_turns_faulty():
+    cloud = FakeCloud(api_latency=0)
+    cloud.add("volume_backup", oci.core.models.VolumeBackup(id="backup", compartment_id="compartment", lifecycle_state="CREATING"))
+    cloud.transition("backup", ("FAULTY", 20))
+    waiter = make_waiter(cloud)
+    try:
+        with pytest.raises(RuntimeError, match="FAULTY"):
+            waiter.wait("volume_backup", "backup", "AVAILABLE", "compartment", timeout=60)
+    finally:
+        waiter.stop()
+
+
+def test_waiting_for_termination_is_not_a_failure():
+    cloud = FakeCloud(api_latency=0)
+    cloud.add("volume", oci.core.models.Volume(id="volume", compartment_id="compartment", lifecycle_state="TERMINATING"))
+    cloud.transition("volume", ("TERMINATED", 20))
+    waiter = make_waiter(cloud)
+    try:
+        assert waiter.wait("volume", "volume", "TERMINATED", "compartment", timeout=5).lifecycle_state == "TERMINATED"
+    finally:
+        waiter.stop()
+
+
+# A blockstorage client whose list call always fails
+class FailingBlockstorageClient:
+    def list_volumes(self, compartment_id=None, **kwargs):
+        raise oci.exceptions.ServiceError(500, "InternalServerError", {}, "list failed")
+
+
+def test_wait_times_out_when_the_list_call_keeps_failing():
+    waiter = make_waiter(None, FailingBlockstorageClient())
+    try:
+        with pytest.raises(TimeoutError, match="list failed"):
+            waiter.wait("volume", "volume", "AVAILABLE", "compartment", timeout=0.1)
+    finally:
+        waiter.stop()
@@ -0,0 +1,24 @@
+import os
+import json
+import asyncio
+import multi_region_backup
+
+
+def test_orchestrator_is_resolved_next_to_the_script():
+    assert os.path.isfile(multi_region_backup.ORCHESTRATOR)
+
+
+def test_stale_region_report_is_not_merged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crashing = tmp_path / "crashing_orchestrator.py"
+    crashing.write_text("import sys\nsys.exit(3)\n")
+    monkeypatch.setattr(multi_region_backup, "ORCHESTRATOR", str(crashing))
+    with open("us-ashburn-1_run_report.json", "w") as report_file:
+        json.dump({"region": "us-ashburn-1", "instances": 7, "volumes_exported": 9, "volume_failures": [],
+                   "instance_failures": [], "started": "2026-01-01T00:00:00"}, report_file)
+
+    run_report = asyncio.run(multi_region_backup.run_all_regions(["us-ashburn-1"]))
+
+    assert run_report["instances"] == 0 and run_report["volumes_exported"] == 0
+    assert run_report["failures"] == 1
+    assert run_report["regions"][0]["exit_code"] == 3
@@ -0,0 +1,76 @@
+import time
+import oci
+import pytest
+from fake_oci import FakeCloud, FakeBlockstorageClient
+from polling_policy import PollingPolicy, DEFAULT_STAGE_MODELS, FIRST_CHECK, MIN_FIRST_CHECK
+from lifecycle_waiter import LifecycleWaiter
+
+
+def test_estimate_uses_default_model_without_history():
+    policy = PollingPolicy(history_path=None)
+    overhead, seconds_per_gb = DEFAULT_STAGE_MODELS["volume_backup"]
+    assert policy.estimate("volume_backup", 100) == overhead + 100 * seconds_per_gb
+
+
+def test_estimate_fits_recorded_durations():
+    policy = PollingPolicy(history_path=None)
+    for size in (10, 20, 40):
+        policy.record("volume_backup", size, 30 + 2 * size)
+    assert round(policy.estimate("volume_backup", 100)) == 230
+    assert round(policy.seconds_per_gb("volume_backup"), 3) == 2.0
+
+
+def test_next_delay_waits_for_eta_then_backs_off():
+    policy = PollingPolicy(history_path=None, min_interval=1, max_interval=1000)
+    estimate = policy.estimate("volume_attach")
+    assert policy.next_delay("volume_attach", None, estimate - 5) == 5
+    assert policy.next_delay("volume_attach", None, estimate + 100) == 50
+
+
+def test_first_check_moves_earlier_while_samples_are_censored():
+    policy = PollingPolicy(history_path=None, min_interval=0)
+    assert policy.first_check_fraction("volume_attach") == FIRST_CHECK
+    for _ in range(10):
+        policy.record("volume_attach", None, 18, censored=True)
+    assert policy.first_check_fraction("volume_attach") == pytest.approx(MIN_FIRST_CHECK)
+    assert policy.first_delay("volume_attach") == pytest.approx(MIN_FIRST_CHECK * policy.estimate("volume_attach"))
+    for _ in range(10):
+        policy.record("volume_attach", None, 5)
+    assert policy.first_check_fraction("volume_attach") == FIRST_CHECK
+
+
+def test_history_round_trips(tmp_path):
+    path = str(tmp_path / "history.json")
+    PollingPolicy(history_path=path).record("volume_detach", None, 12, censored=True)
+    assert PollingPolicy(history_path=path).history["volume_detach"] == [{"size_in_gbs": 0, "duration": 12, "censored": True}]
+
+
+def wait_and_record(cloud, policy, volume_id):
+    waiter = LifecycleWaiter(None, FakeBlockstorageClient(cloud), policy=policy)
+    try:
+        waiter.wait("volume", volume_id, "AVAILABLE", "compartment", timeout=5, stage="volume_restore")
+    finally:
+        waiter.stop()
+    # The waiter records the sample right after resolving the wait
+    for _ in range(100):
+        if policy.history.get("volume_restore"):
+            break
+        time.sleep(0.01)
+    return policy.history["volume_restore"][-1]
+
+
+def test_waiter_records_first_check_hits_as_censored():
+    policy = PollingPolicy(history_path=None, min_interval=0, max_interval=0.01)
+    policy.first_delay = lambda stage, size_in_gbs=None: 0
+    cloud = FakeCloud(api_latency=0)
+    cloud.add("volume", oci.core.models.Volume(id="ready", compartment_id="compartment", lifecycle_state="AVAILABLE"))
+    assert wait_and_record(cloud, policy, "ready").get("censored") is True
+
+
+def test_waiter_records_later_hits_as_exact():
+    policy = PollingPolicy(history_path=None, min_interval=0, max_interval=0.01)
+    policy.first_delay = lambda stage, size_in_gbs=None: 0
+    cloud = FakeCloud(api_latency=0)
+    cloud.add("volume", oci.core.models.Volume(id="restoring", compartment_id="compartment", lifecycle_state="RESTORING"))
+    cloud.transition("restoring", ("AVAILABLE", 50))
+    assert "censored" not in wait_and_record(cloud, policy, "restoring")
@@ -0,0 +1,129 @@
+import threading
+import types
+import oci
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, paginate, _OperationLimit
+
+
+def throttled():
+    return oci.exceptions.ServiceError(429, "TooManyRequests", {}, "throttled")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+
+
+# One finished call, without waiting for the token bucket
+def finish_call(limit, throttled):
+    limit.in_flight += 1
+    limit.release(throttled)
+
+
+def test_throttle_halves_rate_and_concurrency():
+    limit = _OperationLimit(8.0, 8.0, 8)
+    finish_call(limit, True)
+    assert (limit.rate, limit.concurrency) == (4.0, 4.0)
+    finish_call(limit, True)
+    assert (limit.rate, limit.concurrency) == (2.0, 2.0)
+
+
+def test_success_grows_limits_additively_up_to_max_rate():
+    limit = _OperationLimit(2.0, 3.0, 2)
+    finish_call(limit, False)
+    assert limit.rate == pytest.approx(2.5) and limit.concurrency == pytest.approx(2.5)
+    for _ in range(20):
+        finish_call(limit, False)
+    assert limit.rate == 3.0
+    assert 2.5 < limit.concurrency <= rate_limiter.MAX_CONCURRENCY
+
+
+def test_throttled_call_is_retried_and_shrinks_the_limit():
+    limiter = RateLimiter(default_rate=100, concurrency=4)
+    outcomes = [throttled(), throttled(), "ok"]
+
+    def get_volume():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(get_volume) == "ok"
+    assert limiter.snapshot()["get_volume"]["rate"] < 100
+
+
+def test_throttled_call_at_rate_one_still_succeeds():
+    # A throttle halves the rate below 1/s; the bucket must still fill up to a whole token
+    limiter = RateLimiter(default_rate=100, max_rates={"launch_instance": 1})
+    outcomes = [throttled(), "ok"]
+    results = []
+
+    def launch_instance():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    caller = threading.Thread(target=lambda: results.append(limiter.call(launch_instance)), daemon=True)
+    caller.start()
+    caller.join(timeout=10)
+    assert results == ["ok"]
+
+
+def test_gives_up_after_max_throttle_retries():
+    limiter = RateLimiter(default_rate=100, max_throttle_retries=2)
+    calls = []
+
+    def get_volume():
+        calls.append(1)
+        raise throttled()
+
+    with pytest.raises(oci.exceptions.ServiceError):
+        limiter.call(get_volume)
+    assert len(calls) == 3
+
+
+def pages(throttle_page="never"):
+    calls = []
+
+    def list_volumes(compartment_id, page=None):
+        calls.append(page)
+        if page == throttle_page and calls.count(page) == 1:
+            raise throttled()
+        start = int(page or 0)
+        return types.SimpleNamespace(data=[f"{compartment_id}-{start}", f"{compartment_id}-{start + 1}"],
+                                     next_page=str(start + 2) if start < 4 else None)
+    return list_volumes, calls
+
+
+def test_paginate_follows_pages():
+    list_volumes, calls = pages()
+    assert list(paginate(list_volumes, "c")) == [f"c-{index}" for index in range(6)]
+    assert calls == [None, "2", "4"]
+
+
+def test_paginate_leaves_throttles_to_the_limiter_alone():
+    list_volumes, calls = pages(throttle_page="2")
+    with pytest.raises(oci.exceptions.ServiceError):
+        list(paginate(list_volumes, "c"))
+    assert calls == [None, "2"]
+
+    list_volumes, calls = pages(throttle_page="2")
+    assert len(list(paginate(list_volumes, "c", limiter=RateLimiter(default_rate=100)))) == 6
+    assert calls == [None, "2", "2", "4"]
+
+
+def test_paginate_lists_objects_by_start():
+    starts = []
+
+    def list_objects(namespace, bucket_name, prefix=None, start=None):
+        starts.append(start)
+        names = ["chunks/a", "chunks/b"] if start is None else ["chunks/c"]
+        return types.SimpleNamespace(data=oci.object_storage.models.ListObjects(
+            objects=[oci.object_storage.models.ObjectSummary(name=name) for name in names],
+            next_start_with="chunks/c" if start is None else None))
+
+    assert [summary.name for summary in paginate(list_objects, "ns", "bucket", prefix="chunks/")] == \
+        ["chunks/a", "chunks/b", "chunks/c"]
+    assert starts == [None, "chunks/c"]
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone, timedelta
+from run_journal import RunJournal
+
+
+def test_recent_unfinished_run_is_resumed(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.db"))
+    assert journal.begin_run("2026-01-01_00-00-00") == "2026-01-01_00-00-00"
+    journal.done("vol-1", "volume_backup", "backup-1")
+    journal.close()
+
+    journal = RunJournal(str(tmp_path / "journal.db"))
+    assert journal.begin_run("2026-01-01_06-00-00") == "2026-01-01_00-00-00"
+    assert journal.resumed
+    assert journal.is_done("vol-1", "volume_backup")
+
+
+def test_stale_unfinished_run_is_closed_not_resumed(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.db"), max_resume_hours=24)
+    journal.begin_run("2026-01-01_00-00-00")
+    journal.done("vol-1", "volume_backup", "backup-1")
+    stale = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+    journal._db.execute("UPDATE runs SET started = ?", (stale,))
+    stale_run = journal.run_id
+
+    assert journal.begin_run("2026-01-02_00-00-00") == "2026-01-02_00-00-00"
+    assert not journal.resumed and journal.run_id != stale_run
+    assert not journal.is_done("vol-1", "volume_backup")
+    assert journal._db.execute("SELECT COUNT(*) FROM runs WHERE finished IS NULL").fetchone()[0] == 1
+
+
+def test_orphaned_workers_are_closed_under_their_own_run(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.db"), max_resume_hours=0)
+    journal.begin_run("2026-01-01_00-00-00")
+    journal.started("worker-1", "worker", "worker-1")
+    journal.begin_run("2026-01-02_00-00-00")
+
+    orphans = journal.unfinished("worker")
+    assert [(workflow, resource_id) for _, workflow, resource_id in orphans] == [("worker-1", "worker-1")]
+    for run_id, workflow, _ in orphans:
+        journal.done(workflow, "worker", run_id=run_id)
+    assert journal.unfinished("worker") == []
+    assert journal.stage("worker-1", "worker") is None
+
+
+def test_leftovers_are_resources_of_earlier_runs_never_cleaned_up(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.db"), max_resume_hours=0)
+    journal.begin_run("2026-01-01_00-00-00")
+    journal.done("vol-1", "export_volume", "export-1")
+    journal.done("vol-1", "delete_export_volume", "export-1")
+    journal.done("vol-2", "export_volume", "export-2")
+    journal.begin_run("2026-01-02_00-00-00")
+    journal.done("vol-3", "export_volume", "export-3")
+
+    leftovers = journal.leftovers("export_volume", "delete_export_volume")
+    assert [(workflow, resource_id) for _, workflow, resource_id in leftovers] == [("vol-2", "export-2")]
+    for run_id, workflow, resource_id in leftovers:
+        journal.done(workflow, "delete_export_volume", resource_id, run_id=run_id)
+    assert journal.leftovers("export_volume", "delete_export_volume") == []
@@ -0,0 +1,90 @@
+import io
+import gzip
+import json
+import tarfile
+import pytest
+import fake_oci
+import segment_packer
+from upload_engine import UploadEngine
+from segment_packer import SegmentPacker
+
+PREFIX = "instance_2026-01-01/ocid1.volume.oc1.fake.1"
+
+
+@pytest.fixture
+def storage():
+    cloud = fake_oci.FakeCloud(api_latency=0)
+    return cloud, fake_oci.FakeObjectStorageClient(cloud)
+
+
+def pack(tmp_path, client, files, **kwargs):
+    engine = UploadEngine(client, "ns", "bucket", concurrency=2)
+    packer = SegmentPacker(engine, PREFIX, **kwargs)
+    for path, data in files.items():
+        file_path = tmp_path / "volume" / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(data)
+        packer.add(str(file_path), path)
+    packer.close()
+    engine.close()
+    assert not engine.failures
+    return packer
+
+
+def index(cloud):
+    return [json.loads(line) for line in gzip.decompress(cloud.objects[("bucket", f"{PREFIX}/index.jsonl.gz")]).splitlines()]
+
+
+def test_small_files_are_packed_and_indexed_by_offset(tmp_path, storage):
+    cloud, client = storage
+    files = {"etc/a.conf": b"alpha", "etc/b.conf": b"b" * 700, "empty": b""}
+    packer = pack(tmp_path, client, files)
+
+    assert packer.segments == 1 and packer.files == 3
+    segment = cloud.objects[("bucket", f"{PREFIX}/segments/000000.tar")]
+    for path, object_name, offset, length, checksum in index(cloud):
+        assert object_name == f"{PREFIX}/segments/000000.tar"
+        assert segment[offset:offset + length] == files[path] and length == len(files[path])
+    with tarfile.open(fileobj=io.BytesIO(segment)) as archive:
+        assert {member.name: archive.extractfile(member).read() for member in archive} == files
+
+
+def test_segments_roll_over_at_segment_size(tmp_path, storage):
+    cloud, client = storage
+    packer = pack(tmp_path, client, {f"file{number}": bytes([number]) * 3000 for number in range(6)}, segment_size=7000)
+    assert packer.segments == 3
+    assert sorted({entry[1] for entry in index(cloud)}) == [f"{PREFIX}/segments/{number:06d}.tar" for number in range(3)]
+
+
+def test_file_is_restored_with_one_ranged_get(tmp_path, storage):
+    cloud, client = storage
+    pack(tmp_path, client, {"a": b"first", "b": b"second file"})
+    cloud.calls.clear()
+
+    segment_packer.restore_file(client, "ns", "bucket", PREFIX, "b", str(tmp_path / "b"))
+
+    assert (tmp_path / "b").read_bytes() == b"second file"
+    # One GET for the index, one ranged GET for the file's bytes
+    assert cloud.calls["get_object"] == 2
+
+
+def test_large_files_are_stored_as_their_own_objects(tmp_path, storage):
+    cloud, client = storage
+    pack(tmp_path, client, {"big.bin": b"x" * 4096, "small": b"y"}, small_file_size=1024)
+    assert cloud.objects[("bucket", f"{PREFIX}/big.bin")] == b"x" * 4096
+    assert [entry for entry in index(cloud) if entry[0] == "big.bin"] == [["big.bin", f"{PREFIX}/big.bin", None, 4096, None]]
+
+    segment_packer.restore_file(client, "ns", "bucket", PREFIX, "big.bin", str(tmp_path / "big.bin"))
+    assert (tmp_path / "big.bin").read_bytes() == b"x" * 4096
+
+
+def test_corrupt_segment_is_detected(tmp_path, storage):
+    cloud, client = storage
+    pack(tmp_path, client, {"a": b"payload"})
+    key = ("bucket", f"{PREFIX}/segments/000000.tar")
+    cloud.objects[key] = cloud.objects[key].replace(b"payload", b"paYload")
+
+    with pytest.raises(ValueError):
+        segment_packer.restore_file(client, "ns", "bucket", PREFIX, "a", str(tmp_path / "a"))
+    with pytest.raises(FileNotFoundError):
+        segment_packer.restore_file(client, "ns", "bucket", PREFIX, "missing", str(tmp_path / "missing"))
@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timezone, timedelta
+import pytest
+import fake_oci
+import snapshot_manifest
+from detect_block_changes import get_file_metadata, find_modified_files, find_deleted_files
+from segment_packer import SegmentPacker
+from upload_engine import UploadEngine
+
+VOLUME = "ocid1.volume.oc1.fake.1"
+
+
+@pytest.fixture
+def storage():
+    cloud = fake_oci.FakeCloud(api_latency=0, immutable_buckets=["bucket"])
+    return cloud, fake_oci.FakeObjectStorageClient(cloud)
+
+
+# One incremental export of volume_dir, as the worker script runs it
+def export(client, volume_dir, prefix, volume_key=VOLUME):
+    previous = snapshot_manifest.load_latest_manifest(client, "ns", "bucket", volume_key)
+    previous_metadata = previous["files"] if previous else {}
+    baseline = {os.path.join(volume_dir, path): data for path, data in previous_metadata.items()}
+    metadata = get_file_metadata(str(volume_dir), ignore_extensions=[], ignore_folders=[], baseline=baseline)[0]
+    current = {os.path.relpath(file_path, volume_dir): data for file_path, data in metadata.items()}
+    modified = find_modified_files(previous_metadata, current)
+    engine = UploadEngine(client, "ns", "bucket", concurrency=2)
+    packer = SegmentPacker(engine, prefix)
+    for path in modified:
+        packer.add(os.path.join(volume_dir, path), path)
+    packer.close()
+    engine.close()
+    manifest = snapshot_manifest.build_manifest(prefix, previous, current, modified, find_deleted_files(previous_metadata, current))
+    snapshot_manifest.save_manifest(client, "ns", "bucket", manifest, volume_key)
+    return manifest
+
+
+def test_chain_links_snapshots_and_records_tombstones(tmp_path, storage):
+    cloud, client = storage
+    volume = tmp_path / "volume"
+    volume.mkdir()
+    (volume / "kept").write_bytes(b"unchanged")
+    (volume / "changed").write_bytes(b"version 1")
+    (volume / "removed").write_bytes(b"soon gone")
+    export(client, volume, "run1/vol")
+
+    (volume / "changed").write_bytes(b"version 2!")
+    (volume / "removed").unlink()
+    (volume / "added").write_bytes(b"new file")
+    second = export(client, volume, "run2/vol")
+
+    assert second["previous"] == "run1/vol"
+    assert second["tombstones"] == ["removed"]
+    assert {path: entry["snapshot"] for path, entry in second["files"].items()} == \
+        {"kept": "run1/vol", "changed": "run2/vol", "added": "run2/vol"}
+    assert [manifest["prefix"] for manifest in snapshot_manifest.manifest_chain(client, "ns", "bucket", "run2/vol")] == \
+        ["run2/vol", "run1/vol"]
+
+    # An unchanged file is restored from the snapshot that uploaded it
+    snapshot_manifest.restore_file(client, "ns", "bucket", "run2/vol", "kept", str(tmp_path / "kept"))
+    snapshot_manifest.restore_file(client, "ns", "bucket", "run2/vol", "changed", str(tmp_path / "changed"))
+    assert (tmp_path / "kept").read_bytes() == b"unchanged"
+    assert (tmp_path / "changed").read_bytes() == b"version 2!"
+    with pytest.raises(FileNotFoundError, match="was deleted before"):
+        snapshot_manifest.restore_file(client, "ns", "bucket", "run2/vol", "removed", str(tmp_path / "removed"))
+    snapshot_manifest.restore_file(client, "ns", "bucket", "run1/vol", "removed", str(tmp_path / "removed"))
+    assert (tmp_path / "removed").read_bytes() == b"soon gone"
+
+
+def test_latest_pointer_is_never_overwritten_and_keyed_per_volume(tmp_path, storage):
+    cloud, client = storage
+    volume = tmp_path / "volume"
+    volume.mkdir()
+    (volume / "file").write_bytes(b"data")
+    for run in range(3):
+        export(client, volume, f"run{run}/vol")
+    assert snapshot_manifest.load_latest_manifest(client, "ns", "bucket", VOLUME)["prefix"] == "run2/vol"
+    assert len([name for _, name in cloud.objects if name.startswith(f"latest/{VOLUME}/")]) == 3
+
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "file").write_bytes(b"other data")
+    assert snapshot_manifest.load_latest_manifest(client, "ns", "bucket", "ocid1.volume.oc1.fake.2") is None
+    assert export(client, other, "run2/other", "ocid1.volume.oc1.fake.2")["previous"] is None
+
+
+def test_full_verify_is_due_after_verify_days():
+    now = datetime.now(timezone.utc)
+    assert not snapshot_manifest.needs_full_verify(None, 30)
+    assert not snapshot_manifest.needs_full_verify({"verified": (now - timedelta(days=40)).isoformat()}, 0)
+    assert not snapshot_manifest.needs_full_verify({"verified": (now - timedelta(days=10)).isoformat()}, 30)
+    assert snapshot_manifest.needs_full_verify({"verified": (now - timedelta(days=40)).isoformat()}, 30)
+    assert snapshot_manifest.needs_full_verify({"verified": None}, 30)
@@ -0,0 +1,22 @@
+import fake_oci
+from rate_limiter import RateLimiter
+from upload_engine import UploadEngine
+
+
+def upload(tmp_path, limiter):
+    cloud = fake_oci.FakeCloud(api_latency=0)
+    engine = UploadEngine(fake_oci.FakeObjectStorageClient(cloud), "ns", "bucket", concurrency=2, limiter=limiter)
+    (tmp_path / "file").write_bytes(b"file contents")
+    engine.submit(str(tmp_path / "file"), "objects/file")
+    engine.submit_data("objects/data", b"in memory")
+    engine.close()
+    return cloud, engine
+
+
+def test_uploads_with_and_without_a_limiter(tmp_path):
+    for limiter in (None, RateLimiter(default_rate=100)):
+        cloud, engine = upload(tmp_path, limiter)
+        assert engine.failures == []
+        assert cloud.objects[("bucket", "objects/file")] == b"file contents"
+        assert cloud.objects[("bucket", "objects/data")] == b"in memory"
+    assert set(limiter.snapshot()) == {"put_object"}
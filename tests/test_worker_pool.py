@@ -0,0 +1,87 @@
+import asyncio
+import types
+import benchmark
+import fake_oci
+from worker_pool import WorkerPool
+from worker_scheduler import WorkerScheduler
+
+DEVICES = ["/dev/oracleoci/oraclevdc", "/dev/oracleoci/oraclevdb"]
+
+
+def make_pool(max_workers=1, max_tasks_per_worker=1):
+    scheduler = WorkerScheduler(max_workers, max_tasks_per_worker)
+    launched = []
+
+    async def launch_worker(availability_domain, total_bytes=0, file_count=0):
+        instance = types.SimpleNamespace(id=f"worker-{len(launched)}")
+        scheduler.register_worker(instance.id)
+        launched.append(instance)
+        return instance, None
+
+    async def terminate_worker(instance):
+        scheduler.release_worker(instance.id)
+
+    async def list_free_devices(instance):
+        return list(DEVICES)
+
+    pool = WorkerPool(scheduler, launch_worker, terminate_worker, list_free_devices=list_free_devices)
+    return pool, launched
+
+
+def test_released_devices_are_handed_out_again():
+    async def scenario():
+        pool, launched = make_pool(max_tasks_per_worker=2)
+        first, first_device = await pool.acquire("AD-1", 10)
+        second, second_device = await pool.acquire("AD-1", 10)
+        await pool.release(first, first_device, 10)
+        third, third_device = await pool.acquire("AD-1", 10)
+        await pool.close()
+        return launched, first_device, second_device, third_device
+
+    launched, first_device, second_device, third_device = asyncio.run(scenario())
+    assert len(launched) == 1
+    assert first_device == "/dev/oracleoci/oraclevdb" and second_device == "/dev/oracleoci/oraclevdc"
+    # A later volume gets the same device path, so device names must not name exported objects
+    assert third_device == first_device
+
+
+def test_largest_waiting_volume_is_placed_first():
+    async def scenario():
+        pool, launched = make_pool()
+        worker, device = await pool.acquire("AD-1", 50)
+        order = []
+
+        async def place(size_in_gbs):
+            placed_worker, placed_device = await pool.acquire("AD-1", size_in_gbs)
+            order.append(size_in_gbs)
+            await pool.release(placed_worker, placed_device, size_in_gbs)
+
+        tasks = [asyncio.create_task(place(10))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(place(500)))
+        await asyncio.sleep(0)
+        await pool.release(worker, device, 50)
+        await asyncio.gather(*tasks)
+        await pool.close()
+        return order
+
+    assert asyncio.run(scenario()) == [500, 10]
+
+
+def test_exports_of_one_instance_never_share_an_object_prefix(monkeypatch):
+    commands = []
+    exec_command = fake_oci._FakeChannel.exec_command
+
+    def record(channel, command):
+        if command.startswith("sudo python"):
+            commands.append(command.split())
+        return exec_command(channel, command)
+
+    monkeypatch.setattr(fake_oci._FakeChannel, "exec_command", record)
+    result = benchmark.run_once("block", 4, benchmark.parse_args(["--no-tracemalloc", "--volumes", "2,3", "--sizes", "50,60"]))
+    assert result["error"] is None and result["failures"] == 0
+    # sudo python backup_script.py <bucket> <instance> <log id> <device> <volume OCID> <mode> <verify days>
+    prefixes = [(arguments[4], arguments[7]) for arguments in commands]
+    assert len(prefixes) == result["volumes"]
+    assert len(set(prefixes)) == len(prefixes)
+    assert all(volume_id.startswith("ocid1.volume.") for _, volume_id in prefixes)
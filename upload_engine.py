@@ -0,0 +1,174 @@
+import io
+import os
+import math
+import time
+import threading
+import concurrent.futures
+import oci
+from oci.object_storage import UploadManager
+# The SDK ships its own copy of requests; adapters must come from it to mount on its sessions
+from oci._vendor.requests.adapters import HTTPAdapter
+from oci.object_storage.transfer.constants import MEBIBYTE, OBJECT_USE_MULTIPART_SIZE
+
+MIN_PART_SIZE = 10 * MEBIBYTE
+MAX_PART_SIZE = 512 * MEBIBYTE
+MAX_PARTS = 10000
+MAX_CONCURRENCY = 128
+# Concurrency is re-tuned after every window of this many seconds
+TUNING_WINDOW = 5.0
+TUNING_THRESHOLD = 0.05
+
+
+# Part size for a multipart upload: enough parts to keep part_concurrency
+# streams busy, within the service's part size and part count limits
+def part_size_for(file_size, part_concurrency):
+    part_size = math.ceil(file_size / (part_concurrency * 4))
+    part_size = min(MAX_PART_SIZE, max(MIN_PART_SIZE, part_size))
+    part_size = max(part_size, math.ceil(file_size / MAX_PARTS))
+    return math.ceil(part_size / MEBIBYTE) * MEBIBYTE
+
+
+# Uploads many files to Object Storage at once from a bounded thread pool.
+# Small files go up with one put_object each, files of multipart_threshold
+# bytes or more go through UploadManager as multipart uploads with parts
+# sent in parallel. The number of files in flight starts at the pool's
+# initial concurrency and is tuned by hill climbing on the measured
+# throughput, so it settles near the worker's network limit. submit() blocks
+# while the pool is full, so walking a volume never queues more than the
+# pool can work on. With a RateLimiter every upload goes through it, so a
+# throttled upload backs off and is retried instead of failing the file.
+class UploadEngine:
+    def __init__(self, object_storage, namespace, bucket_name, concurrency=None, max_concurrency=None,
+                 part_concurrency=None, multipart_threshold=OBJECT_USE_MULTIPART_SIZE, on_uploaded=None, on_failed=None,
+                 limiter=None):
+        cpus = os.cpu_count() or 2
+        self.object_storage = object_storage
+        self.namespace = namespace
+        self.bucket_name = bucket_name
+        self.max_concurrency = max_concurrency or min(MAX_CONCURRENCY, 16 * cpus)
+        self.concurrency = min(self.max_concurrency, concurrency or 4 * cpus)
+        self.part_concurrency = part_concurrency or max(3, cpus)
+        self.multipart_threshold = multipart_threshold
+        self.on_uploaded = on_uploaded
+        self.on_failed = on_failed
+        self.limiter = limiter
+        self.upload_manager = UploadManager(object_storage, allow_multipart_uploads=True, allow_parallel_uploads=True,
+                                            parallel_process_count=self.part_concurrency)
+        # Keep one connection alive per upload thread and part stream instead of UploadManager's smaller pool
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency * self.part_concurrency)
+        object_storage.base_client.session.mount("https://", adapter)
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.failures = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="upload")
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._window_started = time.monotonic()
+        self._window_bytes = 0
+        self._last_throughput = None
+        self._step = max(1, self.concurrency // 4)
+
+    def _call(self, func, *args, operation=None, **kwargs):
+        if self.limiter:
+            return self.limiter.call(func, *args, operation=operation, **kwargs)
+        return func(*args, **kwargs)
+
+    # Upload a file (file_path) or an in-memory object (data); callback(succeeded) runs when it is done.
+    # With if_absent an object that already exists is left as it is and counts as uploaded.
+    def _upload(self, object_name, file_size, file_path=None, data=None, callback=None, if_absent=False):
+        started = time.monotonic()
+        succeeded = False
+        try:
+            if file_size >= self.multipart_threshold:
+                part_size = part_size_for(file_size, self.part_concurrency)
+                if data is not None:
+                    self._call(lambda: self.upload_manager.upload_stream(
+                        self.namespace, self.bucket_name, object_name, io.BytesIO(data), part_size=part_size),
+                               operation="multipart_upload")
+                else:
+                    self._call(self.upload_manager.upload_file, self.namespace, self.bucket_name, object_name, file_path,
+                               part_size=part_size, operation="multipart_upload")
+            elif if_absent:
+                try:
+                    self._call(self.object_storage.put_object, self.namespace, self.bucket_name, object_name, data,
+                               if_none_match="*")
+                except oci.exceptions.ServiceError as e:
+                    if e.status != 412:
+                        raise
+                    file_size = 0
+            elif data is not None:
+                self._call(self.object_storage.put_object, self.namespace, self.bucket_name, object_name, data)
+            else:
+                self._call(self._put_file, object_name, file_path, operation="put_object")
+            succeeded = True
+        except Exception as e:
+            with self._condition:
+                self.failures.append((file_path or object_name, str(e)))
+            if self.on_failed:
+                self.on_failed(file_path, object_name, e)
+        else:
+            seconds = time.monotonic() - started
+            with self._condition:
+                self.uploaded_files += 1
+                self.uploaded_bytes += file_size
+                self._window_bytes += file_size
+            if self.on_uploaded:
+                self.on_uploaded(file_path, object_name, file_size, seconds)
+        finally:
+            if callback:
+                callback(succeeded)
+            with self._condition:
+                self._in_flight -= 1
+                self._tune()
+                self._condition.notify_all()
+
+    # Files are reopened for every attempt so a retried put_object sends the whole file
+    def _put_file(self, object_name, file_path):
+        with open(file_path, 'rb') as file:
+            return self.object_storage.put_object(self.namespace, self.bucket_name, object_name, file)
+
+    # Hill climbing on throughput: keep moving concurrency in the direction
+    # that raised bytes per second in the last window, turn around when it fell
+    def _tune(self):
+        now = time.monotonic()
+        elapsed = now - self._window_started
+        if elapsed < TUNING_WINDOW:
+            return
+        throughput = self._window_bytes / elapsed
+        if self._last_throughput is not None:
+            if throughput < self._last_throughput * (1 - TUNING_THRESHOLD):
+                self._step = -self._step
+            elif throughput <= self._last_throughput * (1 + TUNING_THRESHOLD):
+                self._step = 0 if self._step else max(1, self.concurrency // 4)
+        self.concurrency = min(self.max_concurrency, max(1, self.concurrency + self._step))
+        self._last_throughput = throughput
+        self._window_started = now
+        self._window_bytes = 0
+
+    def _reserve(self):
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+
+    # Queue a file for upload, waiting while the current concurrency is in use
+    def submit(self, file_path, object_name, callback=None):
+        file_size = os.path.getsize(file_path)
+        self._reserve()
+        self._executor.submit(self._upload, object_name, file_size, file_path=file_path, callback=callback)
+
+    # Queue bytes built in memory (e.g. a packed segment) for upload as one object;
+    # if_absent (objects below multipart_threshold only) never overwrites an existing object
+    def submit_data(self, object_name, data, callback=None, if_absent=False):
+        self._reserve()
+        self._executor.submit(self._upload, object_name, len(data), data=data, callback=callback, if_absent=if_absent)
+
+    # Wait for every submitted upload to finish
+    def wait(self):
+        with self._condition:
+            while self._in_flight:
+                self._condition.wait()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
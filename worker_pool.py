@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SECONDS_PER_GB = 20.0
+DEFAULT_LAUNCH_SECONDS = 180.0
+
+
+# A long-lived worker instance in the pool
+class PooledWorker:
+    def __init__(self, instance, ssh, availability_domain, free_devices=None):
+        self.instance = instance
+        self.ssh = ssh
+        self.availability_domain = availability_domain
+        self.active_tasks = 0
+        self.idle_since = time.monotonic()
+        # Device paths still free for attachments; None when they are not tracked
+        self.free_devices = free_devices
+        # GB of restored volumes currently placed on this worker
+        self.assigned_gbs = 0
+        # Measured aggregate upload rate of this worker, None until its first upload
+        self.seconds_per_gb = None
+
+    # Can this worker take another volume right now
+    def has_attachment_slot(self):
+        return self.free_devices is None or len(self.free_devices) > 0
+
+    # Projected time at which this worker finishes everything placed on it,
+    # including a new volume of size_in_gbs
+    def projected_finish(self, size_in_gbs, default_seconds_per_gb):
+        seconds_per_gb = self.seconds_per_gb or default_seconds_per_gb
+        return (self.assigned_gbs + size_in_gbs) * seconds_per_gb
+
+    # Fold an observed upload into the worker's rate. A task that shared the
+    # worker with others saw only part of its bandwidth, so the observed rate
+    # is scaled by the number of tasks that were running.
+    def record_upload(self, size_in_gbs, seconds, concurrent_tasks):
+        if not size_in_gbs or seconds <= 0:
+            return
+        observed = seconds / size_in_gbs / max(1, concurrent_tasks)
+        if self.seconds_per_gb is None:
+            self.seconds_per_gb = observed
+        else:
+            self.seconds_per_gb = 0.7 * self.seconds_per_gb + 0.3 * observed
+
+
+# Pool of warm worker instances shared by all source instances. Restored
+# volumes are attached to a pooled worker, exported and detached again, so
+# the worker's launch, bootstrap and termination are paid once per pool
+# member rather than once per source instance. The pool never grows beyond
+# the scheduler's worker limit, keeps at least min_workers alive and
+# terminates workers that have been idle for idle_timeout seconds.
+#
+# Placement is longest-processing-time first: volumes waiting in an
+# availability domain are admitted largest first, and each goes to the
+# worker with a free task slot and a free attachment slot that would finish
+# its placed bytes earliest. A new worker is launched instead when that
+# finishes sooner than queueing behind the existing ones.
+class WorkerPool:
+    def __init__(self, scheduler, launch_worker, terminate_worker, min_workers=0, idle_timeout=300,
+                 list_free_devices=None, policy=None):
+        self.scheduler = scheduler
+        self.launch_worker = launch_worker
+        self.terminate_worker = terminate_worker
+        self.list_free_devices = list_free_devices
+        self.policy = policy
+        self.min_workers = min_workers
+        self.idle_timeout = idle_timeout
+        self.workers = []
+        self._launching = {}
+        self._waiting = {}
+        self._sequence = itertools.count()
+        self._changed = None
+        self._reaper = None
+
+    @classmethod
+    def from_workerinfo(cls, scheduler, launch_worker, terminate_worker, workerinfo, list_free_devices=None, policy=None):
+        return cls(scheduler, launch_worker, terminate_worker,
+                   min_workers=int(workerinfo.get("minworkerpoolsize") or 0),
+                   idle_timeout=int(workerinfo.get("workeridletimeout") or 300),
+                   list_free_devices=list_free_devices, policy=policy)
+
+    def _default_seconds_per_gb(self):
+        if self.policy:
+            return self.policy.seconds_per_gb("volume_upload")
+        return DEFAULT_SECONDS_PER_GB
+
+    def _launch_seconds(self):
+        if self.policy:
+            return self.policy.estimate("instance_launch")
+        return DEFAULT_LAUNCH_SECONDS
+
+    def _best_worker(self, availability_domain, size_in_gbs):
+        default_rate = self._default_seconds_per_gb()
+        candidates = [worker for worker in self.workers
+                      if worker.availability_domain == availability_domain
+                      and worker.has_attachment_slot()
+                      and not self.scheduler.task_slot(worker.instance.id).locked()]
+        return min(candidates, key=lambda worker: worker.projected_finish(size_in_gbs, default_rate), default=None)
+
+    def _can_launch(self, availability_domain):
+        in_flight = len(self.workers) + sum(self._launching.values())
+        launching_here = self._launching.get(availability_domain, 0)
+        # Only launch another worker for this AD if the launches already in
+        # progress cannot absorb the volumes waiting for it
+        return (in_flight < self.scheduler.max_workers and
+                launching_here * self.scheduler.max_tasks_per_worker < len(self._waiting.get(availability_domain, [])))
+
+    def _is_largest_waiting(self, availability_domain, entry):
+        return self._waiting[availability_domain][0] == entry
+
+    # Bytes and files a worker launched now is expected to upload: its share
+    # of the volumes waiting in the availability domain
+    def _launch_workload(self, availability_domain):
+        waiting = self._waiting.get(availability_domain, [])
+        share = self._launching.get(availability_domain, 0) + 1
+        total_bytes = sum(entry[2] for entry in waiting)
+        file_count = sum(entry[3] for entry in waiting)
+        return total_bytes // share, file_count // share
+
+    # Place a volume of size_in_gbs on a worker in the given availability
+    # domain. expected_bytes and file_count (what the export will upload, if
+    # known) size newly launched workers. Returns (worker, device); device is
+    # None when device paths are not tracked. Pass both back to release()
+    # once the volume is detached.
+    async def acquire(self, availability_domain, size_in_gbs=0, expected_bytes=None, file_count=0):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle_workers())
+        if expected_bytes is None:
+            expected_bytes = (size_in_gbs or 0) * 1024 ** 3
+        entry = (-(size_in_gbs or 0), next(self._sequence), expected_bytes, file_count or 0)
+        heapq.heappush(self._waiting.setdefault(availability_domain, []), entry)
+        try:
+            while True:
+                retired = None
+                async with self._changed:
+                    worker = self._best_worker(availability_domain, size_in_gbs or 0)
+                    can_launch = self._can_launch(availability_domain)
+                    if can_launch and worker is not None:
+                        # Launching only pays off if the best worker would
+                        # still be busy when a new one is up and done
+                        launch_finish = self._launch_seconds() + (size_in_gbs or 0) * self._default_seconds_per_gb()
+                        can_launch = launch_finish < worker.projected_finish(size_in_gbs or 0, self._default_seconds_per_gb())
+                    if worker is not None and not can_launch:
+                        if not self._is_largest_waiting(availability_domain, entry):
+                            await self._changed.wait()
+                            continue
+                        await self.scheduler.task_slot(worker.instance.id).acquire()
+                        worker.active_tasks += 1
+                        worker.assigned_gbs += size_in_gbs or 0
+                        device = worker.free_devices.pop(0) if worker.free_devices is not None else None
+                        return worker, device
+                    if not can_launch:
+                        retired = self._idle_worker_elsewhere(availability_domain)
+                        if retired is None:
+                            await self._changed.wait()
+                            continue
+                        self.workers.remove(retired)
+                if retired is not None:
+                    # The pool is at its ceiling: free a slot by retiring an
+                    # idle worker that sits in another availability domain
+                    await self._terminate(retired)
+                else:
+                    await self._launch(availability_domain)
+        finally:
+            waiting = self._waiting[availability_domain]
+            waiting.remove(entry)
+            heapq.heapify(waiting)
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def _launch(self, availability_domain):
+        total_bytes, file_count = self._launch_workload(availability_domain)
+        self._launching[availability_domain] = self._launching.get(availability_domain, 0) + 1
+        try:
+            instance, ssh = await self.launch_worker(availability_domain, total_bytes, file_count)
+            free_devices = None
+            if self.list_free_devices:
+                free_devices = sorted(await self.list_free_devices(instance))
+            self.workers.append(PooledWorker(instance, ssh, availability_domain, free_devices))
+        finally:
+            self._launching[availability_domain] -= 1
+            async with self._changed:
+                self._changed.notify_all()
+
+    # Give the task slot and the device path back; the worker stays warm for
+    # the next volume. upload_seconds, when given, refines the worker's rate.
+    async def release(self, worker, device=None, size_in_gbs=0, upload_seconds=None):
+        if upload_seconds is not None:
+            worker.record_upload(size_in_gbs, upload_seconds, worker.active_tasks)
+        worker.active_tasks -= 1
+        worker.assigned_gbs -= size_in_gbs or 0
+        if device is not None and worker.free_devices is not None:
+            worker.free_devices.append(device)
+            worker.free_devices.sort()
+        self.scheduler.task_slot(worker.instance.id).release()
+        if worker.active_tasks == 0:
+            worker.idle_since = time.monotonic()
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _idle_worker_elsewhere(self, availability_domain):
+        if len(self.workers) + sum(self._launching.values()) < self.scheduler.max_workers:
+            return None
+        return next((worker for worker in self.workers
+                     if worker.active_tasks == 0 and worker.availability_domain != availability_domain), None)
+
+    # Terminate a worker that has already been taken out of self.workers
+    async def _terminate(self, worker):
+        try:
+            worker.ssh.close()
+            await self.terminate_worker(worker.instance)
+        except Exception as e:
+            logger.error(f"Error terminating pooled worker {worker.instance.id}: {str(e)}")
+
+    async def _reap_idle_workers(self):
+        while True:
+            await asyncio.sleep(max(1, self.idle_timeout / 4))
+            retired = []
+            now = time.monotonic()
+            for worker in list(self.workers):
+                if len(self.workers) <= self.min_workers:
+                    break
+                if worker.active_tasks == 0 and now - worker.idle_since >= self.idle_timeout:
+                    self.workers.remove(worker)
+                    retired.append(worker)
+            for worker in retired:
+                logger.info(f"Terminating idle pooled worker {worker.instance.id}")
+            await asyncio.gather(*[self._terminate(worker) for worker in retired])
+            if retired:
+                async with self._changed:
+                    self._changed.notify_all()
+
+    # Terminate every worker at the end of the run
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+        workers, self.workers = self.workers, []
+        await asyncio.gather(*[self._terminate(worker) for worker in workers])
@@ -0,0 +1,36 @@
+import asyncio
+
+
+# Two-level scheduler for temporary worker instances. The first level caps
+# how many workers exist at once (workerinfo.maxconcurrentworkerslimit), the
+# second caps how many volume-export tasks run on each worker
+# (workerinfo.maxconcurrenttaskslimit). Workflows that find no free slot wait
+# and are admitted in arrival order as slots free up.
+class WorkerScheduler:
+    def __init__(self, max_workers, max_tasks_per_worker):
+        self.max_workers = max_workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._worker_slots = asyncio.Semaphore(max_workers)
+        self._task_slots = {}
+
+    @classmethod
+    def from_workerinfo(cls, workerinfo):
+        return cls(int(workerinfo.get("maxconcurrentworkerslimit") or 10),
+                   int(workerinfo.get("maxconcurrenttaskslimit") or 2))
+
+    # Wait for a worker slot before launching a worker
+    async def acquire_worker(self):
+        await self._worker_slots.acquire()
+
+    # Give a launched worker its own pool of task slots
+    def register_worker(self, worker_id):
+        self._task_slots[worker_id] = asyncio.Semaphore(self.max_tasks_per_worker)
+
+    # Free the worker slot once the worker is terminated (or failed to launch)
+    def release_worker(self, worker_id=None):
+        self._task_slots.pop(worker_id, None)
+        self._worker_slots.release()
+
+    # Async context manager holding one task slot on the given worker
+    def task_slot(self, worker_id):
+        return self._task_slots[worker_id]
@@ -0,0 +1,113 @@
+import os
+import json
+import math
+import threading
+import oci
+
+DEFAULT_SHAPE = "VM.Standard.E4.Flex"
+DEFAULT_HISTORY_PATH = "worker_throughput.json"
+MAX_SAMPLES = 100
+
+# Upload model used until throughput has been recorded: MB/s one OCPU
+# sustains for large files, and fixed seconds per file (one put_object each)
+DEFAULT_MB_PER_SECOND_PER_OCPU = 60.0
+DEFAULT_SECONDS_PER_FILE = 0.05
+
+
+# Picks the flex shape size for a worker from the data it is about to export.
+# Network bandwidth on flex shapes scales with the OCPU count, so a worker
+# gets enough OCPUs to upload its bytes and files within the target upload
+# time, between the baseline (linuxworkershapeinfo.ocpus/mem) and the limits
+# (linuxworkershapeinfo.maxocpus/maxmem). Achieved throughput is recorded
+# after each upload so the model follows what the workers really sustain.
+class WorkerShapeSelector:
+    def __init__(self, shape=DEFAULT_SHAPE, min_ocpus=2, max_ocpus=2, memory_per_ocpu=4, max_memory_in_gbs=None,
+                 target_upload_seconds=3600, history_path=DEFAULT_HISTORY_PATH):
+        self.shape = shape
+        self.min_ocpus = min_ocpus
+        self.max_ocpus = max(min_ocpus, max_ocpus)
+        self.memory_per_ocpu = memory_per_ocpu
+        self.max_memory_in_gbs = max_memory_in_gbs
+        self.target_upload_seconds = target_upload_seconds
+        self.history_path = history_path
+        self._lock = threading.Lock()
+        self.history = self._load_history()
+
+    @classmethod
+    def from_workerinfo(cls, workerinfo, history_path=DEFAULT_HISTORY_PATH):
+        shapeinfo = workerinfo.get("linuxworkershapeinfo") or {}
+        min_ocpus = float(shapeinfo.get("ocpus") or 2)
+        min_memory = float(shapeinfo.get("mem") or 8)
+        return cls(shape=shapeinfo.get("shape") or DEFAULT_SHAPE,
+                   min_ocpus=min_ocpus,
+                   max_ocpus=float(shapeinfo.get("maxocpus") or min_ocpus),
+                   memory_per_ocpu=min_memory / min_ocpus,
+                   max_memory_in_gbs=float(shapeinfo.get("maxmem") or 0) or None,
+                   target_upload_seconds=int(shapeinfo.get("targetuploadminutes") or 60) * 60,
+                   history_path=history_path)
+
+    def _load_history(self):
+        if self.history_path and os.path.exists(self.history_path):
+            with open(self.history_path, 'r') as f:
+                return json.load(f)
+        return {"samples": [], "volumes": {}}
+
+    def _save_history(self):
+        if not self.history_path:
+            return
+        with open(self.history_path, 'w') as f:
+            json.dump(self.history, f, indent=4)
+
+    # Current model: (MB/s per OCPU, seconds per file per OCPU)
+    def _model(self):
+        samples = self.history["samples"]
+        if not samples:
+            return DEFAULT_MB_PER_SECOND_PER_OCPU, DEFAULT_SECONDS_PER_FILE
+        # Take the per-file cost off each sample and use the median of what remains
+        rates = []
+        for sample in samples:
+            data_seconds = sample["seconds"] - sample["files"] * DEFAULT_SECONDS_PER_FILE / sample["ocpus"]
+            if data_seconds > 0 and sample["bytes"] > 0:
+                rates.append(sample["bytes"] / 1024 / 1024 / data_seconds / sample["ocpus"])
+        if not rates:
+            return DEFAULT_MB_PER_SECOND_PER_OCPU, DEFAULT_SECONDS_PER_FILE
+        rates.sort()
+        return rates[len(rates) // 2], DEFAULT_SECONDS_PER_FILE
+
+    # Expected upload time in seconds for the given data on a worker with ocpus
+    def estimate_upload_seconds(self, total_bytes, file_count, ocpus):
+        mb_per_second_per_ocpu, seconds_per_file = self._model()
+        return (total_bytes / 1024 / 1024 / (mb_per_second_per_ocpu * ocpus) +
+                file_count * seconds_per_file / ocpus)
+
+    # Shape config for a worker that will upload total_bytes in file_count files
+    def select(self, total_bytes=0, file_count=0):
+        with self._lock:
+            mb_per_second_per_ocpu, seconds_per_file = self._model()
+        needed = (total_bytes / 1024 / 1024 / mb_per_second_per_ocpu +
+                  file_count * seconds_per_file) / self.target_upload_seconds
+        ocpus = min(self.max_ocpus, max(self.min_ocpus, math.ceil(needed)))
+        memory_in_gbs = ocpus * self.memory_per_ocpu
+        if self.max_memory_in_gbs:
+            memory_in_gbs = min(self.max_memory_in_gbs, memory_in_gbs)
+        return oci.core.models.LaunchInstanceShapeConfigDetails(ocpus=ocpus, memory_in_gbs=memory_in_gbs)
+
+    # Bytes and files a volume held the last time it was exported, or (None, None)
+    def last_export(self, volume_id):
+        volume = self.history["volumes"].get(volume_id)
+        if not volume:
+            return None, None
+        return volume["bytes"], volume["files"]
+
+    # Record an upload: the worker's OCPUs, how many uploads shared it, and what was moved
+    def record(self, ocpus, total_bytes, file_count, seconds, concurrent_tasks=1, volume_id=None):
+        with self._lock:
+            if seconds > 0 and total_bytes > 0:
+                samples = self.history["samples"]
+                # A worker shared by several uploads gives each a fraction of its OCPUs
+                samples.append({"ocpus": ocpus / max(1, concurrent_tasks), "bytes": total_bytes,
+                                "files": file_count, "seconds": round(seconds, 1)})
+                del samples[:-MAX_SAMPLES]
+            if volume_id:
+                self.history["volumes"][volume_id] = {"bytes": total_bytes, "files": file_count}
+            self._save_history()